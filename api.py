@@ -0,0 +1,173 @@
+"""Read-only JSON API for venues, artists and shows.
+
+    GET /api/v1/venues?after=<cursor>&limit=<n>     one page as JSON
+    GET /api/v1/venues?format=ndjson[&after=...]    full export as NDJSON
+
+The same for ``/artists`` and ``/shows``; NDJSON is also chosen by
+``Accept: application/x-ndjson``. Bodies are produced by a generator fed
+from a ``yield_per`` cursor, so response memory stays flat however many
+rows are exported.
+
+Each response carries a weak ETag derived from an aggregate over the rows
+it covers: ids and, for venues and artists, their version stamps, for
+shows their venues, artists and times. A request whose ``If-None-Match``
+matches gets a 304 without the rows being read or serialized.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from sqlalchemy import extract, func, select
+from sqlalchemy.orm import selectinload
+
+from models import db, Venue, Artist, Show
+from pagination import after_key, encode_cursor
+from replicas import read_replica
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+NDJSON = "application/x-ndjson"
+
+Resource = namedtuple("Resource", "query key stamp scalars serialize")
+
+
+def _venue(venue):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.type for genre in venue.genres],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talents,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+    }
+
+
+def _artist(artist):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": [genre.type for genre in artist.genres],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+    }
+
+
+def _show(show):
+    return {
+        "id": show.id,
+        "venue_id": show.venue_id,
+        "artist_id": show.artist_id,
+        "start_time": show.time.isoformat(),
+        "end_time": show.end_time.isoformat(),
+    }
+
+
+RESOURCES = {
+    "venues": Resource(
+        lambda: select(Venue).options(selectinload(Venue.genres)),
+        (Venue.id,), (Venue.id, Venue.version), True, _venue
+    ),
+    "artists": Resource(
+        lambda: select(Artist).options(selectinload(Artist.genres)),
+        (Artist.id,), (Artist.id, Artist.version), True, _artist
+    ),
+    "shows": Resource(
+        lambda: select(Show.id, Show.venue_id, Show.artist_id, Show.time, Show.end_time),
+        (Show.time, Show.id),
+        (Show.id, Show.venue_id, Show.artist_id,
+         extract("epoch", Show.time).label("time"), extract("epoch", Show.end_time).label("end_time")),
+        False, _show
+    ),
+}
+
+
+def _etag(name, resource, cursor, limit, fmt):
+    """Weak validator for the rows a response covers."""
+    window = after_key(select(*resource.stamp), resource.key, cursor)
+    if limit:
+        window = window.limit(limit + 1)
+    window = window.subquery()
+    stamp = db.session.execute(
+        select(func.count(), *(func.coalesce(func.sum(column), 0) for column in window.c))
+    ).one()
+    return hashlib.md5(repr((name, fmt, cursor, limit, *stamp)).encode()).hexdigest()
+
+
+def _rows(resource, cursor, limit):
+    stmt = after_key(resource.query(), resource.key, cursor)
+    if limit:
+        stmt = stmt.limit(limit + 1)
+    result = db.session.execute(
+        stmt.execution_options(yield_per=current_app.config["API_YIELD_PER"])
+    )
+    return result.scalars() if resource.scalars else result
+
+
+def _ndjson(resource, cursor):
+    # Queried from inside the body: the request's session is closed by the
+    # time a streamed response is iterated, and the context pushed again by
+    # stream_with_context comes with a new one.
+    for row in _rows(resource, cursor, None):
+        yield json.dumps(resource.serialize(row)) + "\n"
+
+
+def _json_page(resource, cursor, limit):
+    yield '{"data":['
+    last = None
+    for count, row in enumerate(_rows(resource, cursor, limit)):
+        if count == limit:
+            cursor = encode_cursor([getattr(last, column.key) for column in resource.key])
+            yield f'],"next_cursor":{json.dumps(cursor)}}}'
+            return
+        yield ("," if count else "") + json.dumps(resource.serialize(row))
+        last = row
+    yield '],"next_cursor":null}'
+
+
+@api.route("/<any(venues, artists, shows):name>")
+@read_replica
+def listing(name):
+    resource = RESOURCES[name]
+    cursor = request.args.get("after")
+    fmt = request.args.get("format")
+    if fmt is None:
+        fmt = "ndjson" if request.accept_mimetypes.best == NDJSON else "json"
+    if fmt not in ("json", "ndjson"):
+        abort(400)
+
+    limit = None
+    if fmt == "json":
+        limit = request.args.get("limit", current_app.config["LISTING_PAGE_SIZE"], type=int)
+        if not 0 < limit <= current_app.config["API_MAX_PAGE_SIZE"]:
+            abort(400)
+
+    etag = _etag(name, resource, cursor, limit, fmt)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        # The format follows Accept when not asked for in the URL.
+        response.vary.add("Accept")
+        return response
+
+    if fmt == "ndjson":
+        body, mimetype = _ndjson(resource, cursor), NDJSON
+    else:
+        body, mimetype = _json_page(resource, cursor, limit), "application/json"
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept")
+    return response
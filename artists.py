@@ -0,0 +1,245 @@
+"""Artist pages: the listing, search, detail pages and the forms."""
+import re
+from functools import partial
+
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy.orm import load_only, selectinload
+
+from asyncdb import async_db
+from cache import cached_page
+from forms import ArtistForm
+from genres import genre_registry
+from httpcache import conditional_page
+from models import db, Artist, Show
+from pagination import keyset_page
+from queries import entity, entity_genres, show_counts, stored_show_counts, entity_shows
+from replicas import read_replica
+from search import search_names
+
+artists = Blueprint("artists", __name__, url_prefix="/artists")
+
+
+@artists.route("")
+@read_replica
+async def listing():
+    data = []
+    page_artists, next_cursor = await async_db.run(partial(
+        keyset_page,
+        db.select(Artist).options(load_only(Artist.id, Artist.name)),
+        (Artist.id,),
+        request.args.get("after"),
+        current_app.config["LISTING_PAGE_SIZE"],
+        scalars=True
+    ))
+
+    for artist in page_artists:
+        formatted_data = {
+            "id": artist.id,
+            "name": artist.name
+        }
+        data.append(formatted_data)
+
+    return render_template("pages/artists.html", artists=data, next_cursor=next_cursor)
+
+
+@artists.route("/search", methods=["POST"])
+@read_replica
+async def search_artists():
+    search_term = request.form.get("search_term", "")
+    found_artists = await async_db.run(
+        partial(search_names, Artist, search_term, current_app.config["SEARCH_RESULT_LIMIT"])
+    )
+    counts = await async_db.run(
+        partial(stored_show_counts, Artist, [artist_id for artist_id, _ in found_artists])
+    )
+
+    data = []
+    for artist_id, name in found_artists:
+        data.append({
+            "id": artist_id,
+            "name": name,
+            "num_upcoming_shows": counts[artist_id]["upcoming"]
+        })
+
+    response = {
+        "count": len(data),
+        "data": data
+    }
+
+    return render_template(
+        "pages/search_artists.html",
+        results=response,
+        search_term=search_term,
+    )
+
+
+@artists.route("/<int:artist_id>")
+@read_replica
+@conditional_page(Artist)
+@cached_page(Artist)
+async def show_artist(artist_id):
+    limit = current_app.config["DETAIL_SHOWS_LIMIT"]
+    artist, genres, (upcoming_shows, upcoming_next), (past_shows, past_next), counts = await async_db.gather(
+        partial(entity, Artist, artist_id),
+        partial(entity_genres, Artist, artist_id),
+        partial(entity_shows, Show.artist_id, artist_id, True, limit=limit),
+        partial(entity_shows, Show.artist_id, artist_id, False, limit=limit),
+        partial(show_counts, Show.artist_id, [artist_id]),
+    )
+    if not artist:
+        abort(404)
+    counts = counts[artist_id]
+
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "facebook_link": artist.facebook_link,
+        "website": artist.website_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": counts["past"],
+        "upcoming_shows_count": counts["upcoming"],
+        "past_shows_next": past_next and url_for(
+            "artists.artist_shows", artist_id=artist_id, when="past", after=past_next),
+        "upcoming_shows_next": upcoming_next and url_for(
+            "artists.artist_shows", artist_id=artist_id, when="upcoming", after=upcoming_next),
+    }
+
+    return render_template("pages/show_artist.html", artist=data)
+
+
+@artists.route("/<int:artist_id>/shows/<any(upcoming, past):when>")
+@read_replica
+@conditional_page(Artist)
+async def artist_shows(artist_id, when):
+    shows, next_cursor = await async_db.run(partial(
+        entity_shows, Show.artist_id, artist_id, when == "upcoming",
+        request.args.get("after"), current_app.config["DETAIL_SHOWS_LIMIT"]
+    ))
+    next_url = next_cursor and url_for("artists.artist_shows", artist_id=artist_id, when=when, after=next_cursor)
+
+    return render_template("pages/show_tiles.html", shows=shows, partner="venue", next_url=next_url)
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@artists.route("/<int:artist_id>/edit", methods=["GET"])
+def edit_artist(artist_id):
+    artist = Artist.query.options(selectinload(Artist.genres)).filter_by(id=artist_id).first()
+    if not artist:
+        abort(404)
+
+    form = ArtistForm(obj=artist)
+    # The genres relationship holds Genre rows, the field their names.
+    form.genres.data = [genre.type for genre in artist.genres]
+
+    artist = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": [genre.type for genre in artist.genres],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "image_link": artist.image_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description
+    }
+
+    return render_template("forms/edit_artist.html", form=form, artist=artist)
+
+
+@artists.route("/<int:artist_id>/edit", methods=["POST"])
+def edit_artist_submission(artist_id):
+    form = ArtistForm()
+    if not form.validate():
+        flash(form.errors)
+        return redirect(url_for("index"))
+
+    flag = False
+    try:
+        genres = genre_registry.genres(form.genres.data)
+        artist = Artist.query.options(selectinload(Artist.genres)).filter_by(id=artist_id).one()
+
+        artist.name = form.name.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.phone = re.sub('\D', '', form.phone.data)
+        artist.seeking_venue = form.seeking_venue.data
+        artist.seeking_description = form.seeking_description.data
+        artist.facebook_link = form.facebook_link.data
+        artist.website_link = form.website_link.data
+        artist.image_link = form.image_link.data
+        artist.genres = genres
+
+        db.session.commit()
+    except:
+        flag = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if not flag:
+        flash("Artist has been updated!")
+        return redirect(url_for("artists.show_artist", artist_id=artist_id))
+    else:
+        flash("Error while updating artist!")
+        return redirect(url_for("index"))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@artists.route("/create", methods=["GET"])
+def create_artist_form():
+    form = ArtistForm()
+    return render_template("forms/new_artist.html", form=form)
+
+
+@artists.route("/create", methods=["POST"])
+def create_artist_submission():
+    form = ArtistForm()
+    flag = False
+
+    if not form.validate():
+        flash(form.errors)
+        return redirect(url_for("index"))
+
+    try:
+        artist = Artist(
+            name=form.name.data,
+            city=form.city.data,
+            state=form.state.data,
+            phone=re.sub('\D', '', form.phone.data),
+            image_link=form.image_link.data.strip(),
+            facebook_link=form.facebook_link.data.strip(),
+            seeking_venue=form.seeking_venue.data,
+            seeking_description=form.seeking_description.data.strip(),
+            website_link=form.website_link.data.strip(),
+            genres=genre_registry.genres(form.genres.data)
+        )
+        db.session.add(artist)
+        db.session.commit()
+    except:
+        flag = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if not flag:
+        flash("Artist " + request.form["name"] + " was successfully listed!")
+        return render_template("pages/home.html")
+    else:
+        flash("Error Occurred while creating artist!")
+        return redirect(url_for("index"))
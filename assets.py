@@ -0,0 +1,261 @@
+"""Static asset pipeline: bundling, minification, precompression and WebP.
+
+Templates name their bundles with ``bundle_urls(name, *sources)`` and their
+responsive images with ``image_srcset(source)``. ``flask assets build``
+finds those calls in every template and writes to ``static/dist/``:
+
+* every bundle, its sources minified (rcssmin, rjsmin) and concatenated,
+  with the relative ``url()``s of stylesheets rewritten for the new
+  location, plus ``.gz`` and ``.br`` copies that the static view serves
+  to clients accepting them (see httpcache.py);
+* WebP copies of every image at each of ``IMAGE_WIDTHS`` below its own
+  width, for ``srcset``;
+* ``manifest.json``, recording the outputs and the digests of the sources
+  they were built from.
+
+Until a bundle or image is built, or once one of its sources changes,
+templates get the source files, so development needs no build step. The
+build ends with the bytes of static assets each page pulls in, before and
+after.
+
+Needs rcssmin and rjsmin; without brotli or Pillow the ``.br`` copies or
+WebP images are skipped.
+"""
+import gzip
+import json
+import os
+import posixpath
+import re
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from jinja2 import meta, nodes
+
+DIST = "dist"
+MANIFEST = f"{DIST}/manifest.json"
+IMAGE_WIDTHS = (480, 960, 1440)
+WEBP_QUALITY = 80
+# Relative url() references; absolute, scheme and data: URLs are left alone.
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)(?![a-z][a-z0-9+.-]*:|/|#)([^'")]+)\1\s*\)""", re.IGNORECASE)
+
+
+class Assets:
+    """Flask extension providing the template helpers for built assets."""
+
+    def __init__(self, app=None):
+        self._manifest = (None, {})
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["assets"] = self
+        app.jinja_env.globals.update(bundle_urls=self.bundle_urls, image_srcset=self.image_srcset)
+
+    def manifest(self):
+        """Contents of ``static/dist/manifest.json``, re-read when rebuilt."""
+        path = os.path.join(current_app.static_folder, MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        if self._manifest[0] != mtime:
+            with open(path) as f:
+                self._manifest = (mtime, json.load(f))
+        return self._manifest[1]
+
+    def _fresh(self, sources):
+        digest = current_app.extensions["http_cache"].digest
+        static = current_app.static_folder
+        return all(digest(os.path.join(static, source)) == expected for source, expected in sources)
+
+    def bundle_urls(self, name, *sources):
+        """URLs to load for bundle ``name``: the built bundle, or its sources."""
+        entry = self.manifest().get("bundles", {}).get(name)
+        if entry and [source for source, _ in entry["sources"]] == list(sources) and self._fresh(entry["sources"]):
+            return [url_for("static", filename=entry["file"])]
+        return [url_for("static", filename=source) for source in sources]
+
+    def image_srcset(self, source):
+        """``srcset`` of the WebP copies of ``source``, empty until built."""
+        entry = self.manifest().get("images", {}).get(source)
+        if not entry or not self._fresh([(source, entry["digest"])]):
+            return ""
+        return ", ".join(f"{url_for('static', filename=file)} {width}w" for width, file in entry["variants"])
+
+
+assets = Assets()
+
+
+def template_references(env):
+    """Static assets named by each template.
+
+    Returns ``{template: {"bundles": {name: sources}, "images": [...],
+    "files": [...], "parents": [...]}}``, ``parents`` being the templates
+    it extends or includes.
+    """
+    references = {}
+    for name in env.list_templates(extensions=["html"]):
+        ast = env.parse(env.loader.get_source(env, name)[0])
+        found = references[name] = {
+            "bundles": {}, "images": [], "files": [],
+            "parents": [parent for parent in meta.find_referenced_templates(ast) if parent],
+        }
+        for call in ast.find_all(nodes.Call):
+            if not isinstance(call.node, nodes.Name):
+                continue
+            args = [arg.value for arg in call.args if isinstance(arg, nodes.Const)]
+            kwargs = {kwarg.key: kwarg.value.value for kwarg in call.kwargs if isinstance(kwarg.value, nodes.Const)}
+            if call.node.name == "bundle_urls" and args:
+                found["bundles"][args[0]] = args[1:]
+            elif call.node.name == "image_srcset" and args:
+                found["images"].append(args[0])
+            elif call.node.name == "url_for" and args[:1] == ["static"] and "filename" in kwargs:
+                found["files"].append(kwargs["filename"])
+    return references
+
+
+def _rebase_css(text, source):
+    """Rewrite the relative ``url()``s of ``source`` for a file in ``DIST``."""
+    def rebase(match):
+        quote, target = match.groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+        return f"url({quote}{posixpath.relpath(resolved, DIST)}{quote})"
+
+    return _CSS_URL.sub(rebase, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build_bundle(static, name, sources):
+    """Write bundle ``name`` and its compressed copies; return their sizes."""
+    import rcssmin
+    import rjsmin
+
+    stylesheet = name.endswith(".css")
+    parts = []
+    for source in sources:
+        with open(os.path.join(static, source), encoding="utf-8") as f:
+            text = f.read()
+        parts.append(rcssmin.cssmin(_rebase_css(text, source)) if stylesheet else rjsmin.jsmin(text))
+    # A statement left open at the end of one script must not run into the next.
+    data = ("\n" if stylesheet else ";\n").join(parts).encode()
+
+    path = os.path.join(static, DIST, name)
+    _write(path, data)
+    sizes = {"min": len(data)}
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    _write(path + ".gz", compressed)
+    sizes["gz"] = len(compressed)
+    try:
+        import brotli
+    except ImportError:
+        if os.path.exists(path + ".br"):
+            os.remove(path + ".br")
+    else:
+        compressed = brotli.compress(data, quality=11)
+        _write(path + ".br", compressed)
+        sizes["br"] = len(compressed)
+    return f"{DIST}/{name}", sizes
+
+
+def build_image(static, source):
+    """Write the WebP copies of ``source``; return ``[(width, file, size)]``."""
+    from PIL import Image
+
+    stem = posixpath.splitext(source)[0]
+    variants = []
+    with Image.open(os.path.join(static, source)) as image:
+        widths = [width for width in IMAGE_WIDTHS if width < image.width] or [image.width]
+        for width in widths:
+            height = round(image.height * width / image.width)
+            file = f"{DIST}/{stem}-{width}.webp"
+            path = os.path.join(static, file)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.resize((width, height), Image.LANCZOS).save(path, "WEBP", quality=WEBP_QUALITY, method=6)
+            variants.append((width, file, os.path.getsize(path)))
+    return variants
+
+
+def _page_assets(references, template, seen=None):
+    """Bundles, images and files a template pulls in, through its parents."""
+    seen = seen if seen is not None else set()
+    bundles, images, files = {}, set(), set()
+    if template in seen or template not in references:
+        return bundles, images, files
+    seen.add(template)
+    found = references[template]
+    bundles.update(found["bundles"])
+    images.update(found["images"])
+    files.update(found["files"])
+    for parent in found["parents"]:
+        parent_bundles, parent_images, parent_files = _page_assets(references, parent, seen)
+        bundles.update(parent_bundles)
+        images |= parent_images
+        files |= parent_files
+    return bundles, images, files
+
+
+def _size(static, filename):
+    path = os.path.join(static, filename)
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+assets_cli = AppGroup("assets", help="Build the static asset bundles.")
+
+
+@assets_cli.command("build", help="Bundle, minify and precompress assets and resize images.")
+def build_command():
+    app = current_app
+    static = app.static_folder
+    digest = app.extensions["http_cache"].digest
+    references = template_references(app.jinja_env)
+
+    manifest = {"bundles": {}, "images": {}}
+    built = {}
+    for found in references.values():
+        for name, sources in found["bundles"].items():
+            if name in manifest["bundles"]:
+                continue
+            file, sizes = build_bundle(static, name, sources)
+            manifest["bundles"][name] = {
+                "file": file,
+                "sources": [(source, digest(os.path.join(static, source))) for source in sources],
+            }
+            built[name] = min(sizes.values())
+            raw = sum(_size(static, source) for source in sources)
+            click.echo(f"{name:<12} {len(sources)} files {raw:>9,} B -> "
+                       + ", ".join(f"{kind} {size:,} B" for kind, size in sizes.items()))
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        click.echo("Pillow is not installed, skipping images.")
+    else:
+        for source in sorted({image for found in references.values() for image in found["images"]}):
+            variants = build_image(static, source)
+            manifest["images"][source] = {
+                "digest": digest(os.path.join(static, source)),
+                "variants": [(width, file) for width, file, _ in variants],
+            }
+            # Report the largest copy, the one a wide or high density screen picks.
+            built[source] = variants[-1][2]
+            click.echo(f"{source:<12} {_size(static, source):>9,} B -> "
+                       + ", ".join(f"{width}w {size:,} B" for width, _, size in variants))
+
+    _write(os.path.join(static, MANIFEST), json.dumps(manifest, indent=2).encode())
+
+    click.echo(f"\n{'page':<28} {'before':>11} {'after':>11} {'saved':>11}")
+    for template in sorted(name for name in references if name.startswith("pages/")):
+        bundles, images, files = _page_assets(references, template)
+        files -= images  # The fallback <img> of a <picture> is not fetched.
+        before = sum(_size(static, source) for sources in bundles.values() for source in sources)
+        before += sum(_size(static, image) for image in images) + sum(_size(static, file) for file in files)
+        after = sum(built.get(name, 0) for name in bundles)
+        after += sum(built.get(image, _size(static, image)) for image in images)
+        after += sum(_size(static, file) for file in files)
+        click.echo(f"{template:<28} {before:>11,} {after:>11,} {before - after:>11,}")
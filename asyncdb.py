@@ -0,0 +1,205 @@
+"""Async execution mode for the read views.
+
+The read views of venues.py, artists.py and shows.py are ``async def`` and
+fetch their data through ``async_db.run`` and ``async_db.gather``, which
+call query functions with a ``session`` keyword. What that session is
+depends on ``ASYNC_VIEWS``:
+
+* off (the default): the functions run in turn on ``db.session``, so the
+  view behaves exactly like a sync view.
+* on: ``gather`` runs its functions concurrently, each under
+  ``AsyncSession.run_sync`` on SQLAlchemy's asyncio engine (asyncpg on
+  PostgreSQL, aiosqlite on SQLite) and its own pooled connection. A detail
+  page then waits for its slowest query instead of the sum of all.
+
+``run`` always uses ``db.session``, in either mode: the request thread
+waits for a lone query either way, and handing it to the event loop only
+adds the hop. The listings, searches and calendar use ``run`` and keep
+the sync path; async mode is for the detail pages, which ``gather`` five
+independent queries. With 20 ms per statement and 8 request threads
+(``benchmarks/async_views.py``) those serve about 1.3x the requests, and
+the listings are unchanged. Row-heavy queries gain little from being
+gathered, since they all decode their rows on the one loop thread.
+
+Views run in the request thread on an event loop of that thread's own,
+so they may await anything asyncio can. In async mode every worker
+process also runs one event loop in a background thread, shared by its
+request threads and owning the async engines and their pools. Only the
+queries run there, with the request's context; the view, and template
+rendering, stay in the request thread, which waits until its queries are
+done. Queries run concurrently do not share a transaction, so they may
+see different snapshots.
+
+Needs ``greenlet`` and ``asyncpg`` or ``aiosqlite``, see
+``requirements-async.txt``. SQLAlchemy's asyncio extension is only
+imported once async mode is used.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future
+from functools import wraps
+
+from flask import current_app
+from sqlalchemy.engine import make_url
+
+from dbpool import engine_options
+from models import db
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_url(url):
+    """``url`` with its driver replaced by the asyncio one."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def async_engine_options(config):
+    """``create_async_engine`` options for the ``DB_*`` settings in ``config``.
+
+    The same pool settings as ``engine_options``, with asyncpg's spelling
+    of the statement timeout and pgbouncer compatibility.
+    """
+    options = engine_options(config)
+    options.pop("poolclass", None)
+    options.pop("connect_args", None)
+    if make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() != "postgresql":
+        return options
+
+    timeout = config.get("DB_STATEMENT_TIMEOUT", 0)
+    if config.get("DB_POOLER") == "pgbouncer":
+        options["connect_args"] = {"statement_cache_size": 0}
+    elif timeout:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(int(timeout))}}
+    return options
+
+
+class _ViewRunner(threading.local):
+    """Event loop of the current thread, running its async views."""
+
+    pid = runner = None
+
+    def run(self, coro):
+        # A loop inherited through fork shares its selector with the parent.
+        if self.pid != os.getpid():
+            self.pid, self.runner = os.getpid(), asyncio.Runner()
+        # Without a context of its own, Runner reuses the one it was created in.
+        return self.runner.run(coro, context=contextvars.copy_context())
+
+
+_views = _ViewRunner()
+
+
+class _LoopThread:
+    """An event loop running forever in a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="async-db", daemon=True).start()
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop in the caller's context."""
+        context = contextvars.copy_context()
+        future = Future()
+
+        def settle(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start():
+            self.loop.create_task(coro, context=context).add_done_callback(settle)
+
+        self.loop.call_soon_threadsafe(start)
+        return future
+
+
+class AsyncDatabase:
+    """Flask extension running the async views and their queries."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._engines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get("ASYNC_VIEWS"):
+            url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+            if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+                raise RuntimeError("ASYNC_VIEWS needs a database file or server, not in-memory SQLite.")
+        app.extensions["async_db"] = self
+        app.async_to_sync = self.async_to_sync
+
+    def async_to_sync(self, func):
+        """Replacement for ``Flask.async_to_sync`` running views as described above."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return _views.run(func(*args, **kwargs))
+
+        return wrapper
+
+    def _process_state(self):
+        # The loop and the pools cannot be shared with forked workers.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._loop = _LoopThread()
+                self._engines = {}
+            return self._loop, self._engines
+
+    def engine(self):
+        """Async engine of the bind this request reads from."""
+        key = db.session.info.get("replica")
+        engines = self._process_state()[1]
+        with self._lock:
+            engine = engines.get(key)
+            if engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+
+                config = current_app.config
+                if key is not None:
+                    uri = config["SQLALCHEMY_BINDS"][key]["url"]
+                else:
+                    uri = config.get("ASYNC_DATABASE_URL") or config["SQLALCHEMY_DATABASE_URI"]
+                url = async_url(uri)
+                if config.get("DB_POOLER") == "pgbouncer" and url.get_backend_name() == "postgresql":
+                    url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+                engine = engines[key] = create_async_engine(
+                    url, **async_engine_options({**config, "SQLALCHEMY_DATABASE_URI": uri})
+                )
+        return engine
+
+    async def run(self, query):
+        """Return ``query(session=db.session)``."""
+        return query(session=db.session)
+
+    async def gather(self, *queries):
+        """Return ``[query(session=...) for query in queries]``, concurrently in async mode."""
+        if not current_app.config.get("ASYNC_VIEWS") or len(queries) < 2:
+            return [query(session=db.session) for query in queries]
+        loop, engine = self._process_state()[0], self.engine()
+        return await asyncio.wrap_future(loop.submit(self._gather(engine, queries)))
+
+    @staticmethod
+    async def _run(engine, query):
+        from sqlalchemy.ext.asyncio import AsyncSession
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            return await session.run_sync(lambda sync_session: query(session=sync_session))
+
+    async def _gather(self, engine, queries):
+        return await asyncio.gather(*(self._run(engine, query) for query in queries))
+
+
+async_db = AsyncDatabase()
@@ -0,0 +1,60 @@
+"""Peak Python memory while exporting the Show table as NDJSON.
+
+Seeds an in-memory SQLite database with growing numbers of shows and
+consumes ``/api/v1/shows?format=ndjson`` chunk by chunk, reporting the
+tracemalloc peak. A streaming export keeps the peak flat as rows grow.
+
+    python benchmarks/api_export.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from app import create_app
+from models import db, Venue, Artist, Show
+
+app = create_app()
+
+SIZES = (10000, 50000, 200000)
+
+
+def seed(size):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Venue), [{"id": 1, "name": "venue", "city": "City", "state": "NY"}])
+    db.session.execute(insert(Artist), [{"id": 1, "name": "artist", "city": "City", "state": "NY"}])
+    start = datetime(2020, 1, 1)
+    for offset in range(0, size, 50000):
+        db.session.execute(insert(Show), [
+            {"venue_id": 1, "artist_id": 1, "time": start + timedelta(hours=i)}
+            for i in range(offset, min(offset + 50000, size))
+        ])
+    db.session.commit()
+
+
+def main():
+    client = app.test_client()
+    print(f"{'shows':>8} {'lines':>8} {'peak KiB':>9} {'s':>6}")
+    with app.app_context():
+        for size in SIZES:
+            seed(size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get("/api/v1/shows?format=ndjson", buffered=False)
+            lines = sum(chunk.count(b"\n") for chunk in response.response)
+            response.close()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:>8} {lines:>8} {peak / 1024:>9.0f} {elapsed:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
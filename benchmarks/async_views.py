@@ -0,0 +1,103 @@
+"""Throughput of one worker with and without ASYNC_VIEWS under slow SQL.
+
+Seeds the synthetic dataset from ``dataset.py`` into a SQLite file, adds a
+simulated round trip of ``--latency`` milliseconds to every statement and
+drives the read routes from ``--threads`` threads - one worker process
+with that many request threads - first with the sync path, then with the
+async one. The page cache is off so that every request reaches the
+database.
+
+    python benchmarks/async_views.py --scale 10k --latency 100 --threads 8
+
+The delay is a ``time.sleep`` on the sync engine and an ``asyncio.sleep``
+on the async one, so it occupies a request thread or only its coroutine,
+as a real round trip would.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async.db')}")
+os.environ.setdefault("PAGE_CACHE_BACKEND", "none")
+# Up to five concurrent queries per request in async mode.
+os.environ.setdefault("DB_POOL_SIZE", "40")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.util import await_only
+
+from app import create_app
+from dataset import seed
+
+app = create_app()
+
+ROUTES = (
+    ("show_venue", lambda rng, counts: f"/venues/{rng.randint(1, counts['venues'])}"),
+    ("show_artist", lambda rng, counts: f"/artists/{rng.randint(1, counts['artists'])}"),
+    ("venues", lambda rng, counts: "/venues"),
+    ("artists", lambda rng, counts: "/artists"),
+    ("shows", lambda rng, counts: "/shows"),
+)
+
+
+def simulate_latency(seconds):
+    @event.listens_for(Engine, "before_cursor_execute")
+    def delay(conn, cursor, statement, parameters, context, executemany):
+        if conn.dialect.is_async:
+            await_only(asyncio.sleep(seconds))
+        else:
+            time.sleep(seconds)
+
+
+def throughput(name, path, counts, requests, threads):
+    client = app.test_client()
+    rng = random.Random(name)
+    urls = [path(rng, counts) for _ in range(requests)]
+
+    def get(url):
+        response = client.get(url)
+        response.close()
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        statuses = list(pool.map(get, urls))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, sum(status != 200 for status in statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k")
+    parser.add_argument("--latency", type=float, default=100, help="milliseconds per statement")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="per route and mode")
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.CRITICAL)
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    with app.app_context():
+        counts = seed(args.scale)
+    simulate_latency(args.latency / 1000)
+
+    print(f"{args.latency:g} ms per statement, {args.threads} threads")
+    print(f"{'route':<14} {'sync rps':>9} {'async rps':>10} {'speedup':>8} {'errors':>7}")
+    for name, path in ROUTES:
+        results = {}
+        for mode in (False, True):
+            app.config["ASYNC_VIEWS"] = mode
+            results[mode] = throughput(name, path, counts, args.requests, args.threads)
+        (sync_rps, sync_errors), (async_rps, async_errors) = results[False], results[True]
+        print(f"{name:<14} {sync_rps:9.1f} {async_rps:10.1f} {async_rps / sync_rps:7.2f}x "
+              f"{sync_errors + async_errors:7d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Time of the double-booking check of a new show, against a full scan.
+
+Seeds the synthetic dataset from ``dataset.py`` into a temporary SQLite
+database, packs ``--history`` extra back-to-back shows into one venue and
+then checks ``--requests`` candidate bookings of that venue, first by
+reading all of its shows and testing each one, as a check without the
+bounded show duration would have to, then with ``bookings.find_conflicts``.
+Also reports the time of ``flask bookings report`` over the whole table.
+
+    python benchmarks/booking_check.py --scale 10k --history 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bookings.db')}")
+os.environ.setdefault("PAGE_CACHE_BACKEND", "none")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+
+from app import create_app
+from bookings import find_conflicts, overlaps
+from dataset import NOW, seed
+from models import db, Show
+
+app = create_app()
+VENUE_ID = 1
+
+
+def naive(booking):
+    rows = db.session.execute(select(Show.time, Show.end_time).where(Show.venue_id == VENUE_ID))
+    return [start for start, end in rows if start < booking["end_time"] and end > booking["time"]]
+
+
+def timed(check, bookings):
+    times, found = [], 0
+    for booking in bookings:
+        start = time.perf_counter()
+        found += bool(check(booking))
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k")
+    parser.add_argument("--history", type=int, default=20000, help="extra shows of the checked venue")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with app.app_context():
+        counts = seed(args.scale)
+        # Back-to-back two-hour shows, ending well before the seeded ones start.
+        first = NOW - timedelta(days=3 * 365)
+        db.session.execute(insert(Show), [
+            {"venue_id": VENUE_ID, "artist_id": rng.randint(1, counts["artists"]),
+             "time": first - timedelta(hours=2 * (i + 1)), "end_time": first - timedelta(hours=2 * i)}
+            for i in range(args.history)
+        ])
+        db.session.commit()
+        shows = db.session.scalar(select(db.func.count()).where(Show.venue_id == VENUE_ID))
+
+        bookings = []
+        for _ in range(args.requests):
+            # Half of them before the packed shows, in free time.
+            start = first - timedelta(hours=rng.randint(1, 4 * args.history))
+            bookings.append({"venue_id": VENUE_ID, "artist_id": counts["artists"] + 1,
+                             "time": start, "end_time": start + timedelta(hours=2)})
+
+        scan, scan_found = timed(naive, bookings)
+        bounded, bounded_found = timed(lambda booking: find_conflicts(db.session, [booking]), bookings)
+        assert scan_found == bounded_found, (scan_found, bounded_found)
+
+        start = time.perf_counter()
+        conflicts = sum(1 for _ in overlaps())
+        report = time.perf_counter() - start
+
+    print(f"venue {VENUE_ID}: {shows:,} shows, {bounded_found}/{len(bookings)} candidates conflicting")
+    print(f"{'full scan':<16} {scan * 1000:9.3f} ms per check")
+    print(f"{'bounded range':<16} {bounded * 1000:9.3f} ms per check  ({scan / bounded:.0f}x)")
+    print(f"report: {conflicts} overlaps in {report:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
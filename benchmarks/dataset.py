@@ -0,0 +1,126 @@
+"""Deterministic synthetic catalogue for the benchmarks.
+
+A scale is a number of shows; there is one venue and one artist for every
+ten shows, each with one to three genres, and shows spread over two years
+either side of ``NOW`` so that detail pages have both upcoming and past
+shows, and no venue or artist has two shows at once. The same scale and
+seed always produce the same rows.
+
+    python benchmarks/dataset.py 100k      # seed DATABASE_URL
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+
+from counters import rebuild
+from genres import DEFAULT_GENRES, genre_registry
+from models import db, Genre, Venue, Artist, Show, venue_genre, artist_genre
+from search import reset_index
+
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+GENRES = list(DEFAULT_GENRES)
+STATES = ("CA", "NY", "TX", "WA", "IL", "LA", "TN", "GA")
+CITIES = ("San Francisco", "New York", "Austin", "Seattle", "Chicago", "New Orleans", "Nashville", "Atlanta")
+WORDS = ("blue", "note", "hall", "jazz", "club", "velvet", "union", "tavern", "lounge", "stage",
+         "cellar", "electric", "ballroom", "arena", "corner", "lantern", "harbor", "crescent")
+# Fixed so that runs on different days see the same upcoming/past split.
+NOW = datetime(2026, 1, 1, 20, 0)
+CHUNK = 10000
+SHOW_HOURS = 2
+
+
+def size_of(scale):
+    return SCALES[scale] if scale in SCALES else int(scale)
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _entities(rng, count, prefix):
+    for i in range(1, count + 1):
+        city = rng.randrange(len(CITIES))
+        yield {
+            "id": i,
+            "name": f"{' '.join(rng.sample(WORDS, 2)).title()} {prefix} {i}",
+            "city": CITIES[city],
+            "state": STATES[city],
+            "phone": f"555{i:07d}",
+            "image_link": f"https://img.example.com/{prefix}/{i}.jpg",
+            "facebook_link": f"https://www.facebook.com/{prefix}{i}",
+        }
+
+
+def _genre_links(rng, count, key):
+    for i in range(1, count + 1):
+        for genre_id in rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 3)):
+            yield {key: i, "genre_id": genre_id}
+
+
+def _shows(rng, count, entities, now):
+    # Two-hour shows starting on the hour. A venue or artist drawn for an
+    # hour within two hours of one of its shows is drawn again, so nothing
+    # is double-booked; bookings are kept as ints to fit a million shows.
+    span = 2 * 365 * 24
+    hours = 2 * span + 1
+    booked = set()
+    for _ in range(count):
+        while True:
+            venue_id, artist_id = rng.randint(1, entities), rng.randint(1, entities)
+            hour = rng.randint(-span, span)
+            keys = [owner * hours + hour + span for owner in (2 * venue_id, 2 * artist_id + 1)]
+            if not any(key + offset in booked for key in keys for offset in range(1 - SHOW_HOURS, SHOW_HOURS)):
+                break
+        booked.update(keys)
+        time = now + timedelta(hours=hour)
+        yield {"venue_id": venue_id, "artist_id": artist_id, "time": time,
+               "end_time": time + timedelta(hours=SHOW_HOURS)}
+
+
+def seed(scale, seed=42, now=NOW):
+    """Replace the database contents with the dataset for ``scale``."""
+    shows = size_of(scale)
+    entities = max(shows // 10, 10)
+    rng = random.Random(seed)
+
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Genre), [{"id": i, "type": name} for i, name in enumerate(GENRES, 1)])
+    for model, prefix in ((Venue, "venue"), (Artist, "artist")):
+        for chunk in _chunks(_entities(rng, entities, prefix)):
+            db.session.execute(insert(model), chunk)
+    for table, key in ((venue_genre, "venue_id"), (artist_genre, "artist_id")):
+        for chunk in _chunks(_genre_links(rng, entities, key)):
+            db.session.execute(insert(table), chunk)
+    for chunk in _chunks(_shows(rng, shows, entities, now)):
+        db.session.execute(insert(Show), chunk)
+    if db.session.get_bind().dialect.name == "postgresql":
+        for model in (Genre, Venue, Artist):
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT max(id) FROM \"{table}\"))"
+            ))
+    rebuild()
+
+    genre_registry.reset()
+    reset_index()
+    return {"genres": len(GENRES), "venues": entities, "artists": entities, "shows": shows}
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    with create_app().app_context():
+        print(seed(sys.argv[1] if len(sys.argv) > 1 else "1k"))
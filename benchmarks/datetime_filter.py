@@ -0,0 +1,56 @@
+"""Cost of the ``datetime`` template filter over 100k show times.
+
+Compares the previous filter (``str()`` the timestamp, parse it back with
+dateutil, format with ``babel.dates.format_datetime``) with
+``filters.format_datetime`` on native datetimes, and with the batch
+``filters.format_datetimes``. Half of the times repeat, as show times do
+on busy listings, so the memoized filter gets some hits.
+
+    python benchmarks/datetime_filter.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+
+from filters import format_datetime, format_datetimes
+
+SHOWS = 100000
+
+
+def previous_filter(value, format="medium"):
+    date = dateutil.parser.parse(value)
+    if format == "full":
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == "medium":
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale="en")
+
+
+def timed(label, function, baseline=None):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    speedup = f"{baseline / elapsed:>6.1f}x" if baseline else ""
+    print(f"{label:<34} {elapsed:>7.2f}s {speedup}")
+    return result, elapsed
+
+
+def main():
+    start = datetime(2020, 1, 1, 19, 30)
+    times = [start + timedelta(hours=(i % (SHOWS // 2)) * 7) for i in range(SHOWS)]
+
+    expected, baseline = timed("previous (str + dateutil + babel)",
+                               lambda: [previous_filter(str(value), "full") for value in times])
+    single, _ = timed("format_datetime", lambda: [format_datetime(value, "full") for value in times], baseline)
+    batch, _ = timed("format_datetimes", lambda: format_datetimes(times, "full"), baseline)
+    assert single == expected and batch == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Fail if any route's SQL needs a full table scan.
+
+Seeds the synthetic dataset, requests every route from ``routes.py`` a few
+times while recording the statements it sends, and runs ``EXPLAIN`` on each
+distinct one with the parameters it was sent with:
+
+* on PostgreSQL with ``enable_seqscan`` off, so that a ``Seq Scan`` left in
+  the plan means no index can serve the query at all, not just that the
+  table is small;
+* on SQLite with ``EXPLAIN QUERY PLAN``, where ``SCAN <table>`` without an
+  index is a full scan - unless the statement has a LIMIT and needs no
+  sort, which is how SQLite walks the integer primary key.
+
+Scans of subqueries are not counted, only of tables.
+
+Exits non-zero when a scan is found on a table outside ``ALLOWED``.
+
+    DATABASE_URL=postgresql://... python benchmarks/explain_check.py [scale]
+"""
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'explain.db')}")
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS, os.path.dirname(BENCHMARKS)]
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from dataset import seed
+from models import db
+from routes import app, routes
+
+# Tables read whole on purpose: the genre registry loads every genre.
+ALLOWED = {"Genre"}
+# Statements that read a table whole on purpose: off PostgreSQL, the
+# in-process name index loads every name once.
+ALLOWED_STATEMENTS = re.compile(r'^SELECT "(Venue|Artist)"\.id, "\1"\.name FROM "\1"$')
+REQUESTS_PER_ROUTE = 3
+EXPLAINED = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def _postgresql_scans(cursor, statement, parameters):
+    cursor.execute("SET enable_seqscan = off")
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    plan = cursor.fetchone()[0][0]["Plan"]
+    scans, nodes = [], [plan]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", ()))
+    return scans
+
+
+def _sqlite_scans(cursor, statement, parameters):
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    details = [row[-1] for row in cursor.fetchall()]
+    if " LIMIT " in statement and not any("TEMP B-TREE" in detail for detail in details):
+        return []
+    return [match.group(1) for match in map(SQLITE_SCAN.match, details) if match]
+
+
+def explain(statement, parameters):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if db.engine.dialect.name == "postgresql":
+            return _postgresql_scans(cursor, statement, parameters)
+        return _sqlite_scans(cursor, statement, parameters)
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def main():
+    scale = sys.argv[1] if len(sys.argv) > 1 else "10k"
+    app.logger.setLevel(logging.CRITICAL)
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    with app.app_context():
+        counts = seed(scale)
+
+    recorded = {}
+    current = [None]
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if current[0] and not executemany and EXPLAINED.match(statement):
+            recorded.setdefault(statement, (current[0], parameters))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    client = app.test_client()
+    try:
+        for route in routes(counts):
+            current[0] = route.name
+            rng = random.Random(route.name)
+            for i in range(REQUESTS_PER_ROUTE):
+                client.open(route.path(rng, i), method=route.method,
+                            data=route.data(rng, i) if route.data else None).close()
+    finally:
+        current[0] = None
+        event.remove(Engine, "before_cursor_execute", record)
+
+    failures = 0
+    with app.app_context():
+        for statement, (route, parameters) in recorded.items():
+            if ALLOWED_STATEMENTS.match(" ".join(statement.split())):
+                continue
+            scans = [table for table in explain(statement, parameters)
+                     if table in db.metadata.tables and table not in ALLOWED]
+            if scans:
+                failures += 1
+                print(f"FAIL {route}: full scan of {', '.join(sorted(set(scans)))}\n  {' '.join(statement.split())}\n")
+
+    print(f"{len(recorded)} statements explained, {failures} with full scans")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
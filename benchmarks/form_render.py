@@ -0,0 +1,86 @@
+"""Render time of the form pages with and without the cached <select>s.
+
+Seeds the synthetic dataset from ``dataset.py`` into an in-memory SQLite
+database and GETs each form page ``--requests`` times, first with the
+rendered-select cache of forms.py disabled, so every page walks the state
+and genre choices as before, then with it. The edit pages cycle through
+``--entities`` venues or artists, as many distinct selections. Also
+reports the time of rendering the state and genre fields alone.
+
+    python benchmarks/form_render.py --requests 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("PAGE_CACHE_BACKEND", "none")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forms
+from app import create_app
+from cache import LRUCache
+from dataset import seed
+from testing import count_queries
+
+app = create_app()
+
+PAGES = (
+    ("create_venue_form", lambda i, n: "/venues/create"),
+    ("create_artist_form", lambda i, n: "/artists/create"),
+    ("edit_venue", lambda i, n: f"/venues/{i % n + 1}/edit"),
+    ("edit_artist", lambda i, n: f"/artists/{i % n + 1}/edit"),
+)
+
+
+def page_times(client, path, requests, entities):
+    times, queries = [], 0
+    for i in range(requests):
+        with count_queries() as statements:
+            start = time.perf_counter()
+            response = client.get(path(i, entities))
+            times.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        queries = len(statements)
+    return statistics.median(times), queries
+
+
+def field_time(requests):
+    with app.test_request_context():
+        form = forms.VenueForm()
+        start = time.perf_counter()
+        for _ in range(requests):
+            form.state(class_="form-control")
+            form.genres(class_="form-control")
+        return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300, help="per page and mode")
+    parser.add_argument("--entities", type=int, default=20, help="venues and artists cycled by the edit pages")
+    args = parser.parse_args()
+
+    client = app.test_client()
+    cached = forms._rendered_selects
+    results = {}
+    with app.app_context():
+        seed("1k")
+        for mode in ("uncached", "cached"):
+            # A cache that keeps nothing renders every select from its choices.
+            forms._rendered_selects = cached if mode == "cached" else LRUCache(maxsize=0)
+            results[mode] = [page_times(client, path, args.requests, args.entities) for _, path in PAGES]
+            results[mode].append((field_time(args.requests), None))
+
+    print(f"{'page':<20} {'uncached ms':>12} {'cached ms':>10} {'speedup':>8} {'queries':>8}")
+    names = [name for name, _ in PAGES] + ["state+genres fields"]
+    for name, (before, _), (after, queries) in zip(names, results["uncached"], results["cached"]):
+        print(f"{name:<20} {before * 1000:12.3f} {after * 1000:10.3f} {before / after:7.2f}x "
+              f"{queries if queries is not None else '-':>8}")
+    print(f"select cache: {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
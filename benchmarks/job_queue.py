@@ -0,0 +1,118 @@
+"""Time of renaming a venue, with its counterpart pages invalidated by a job.
+
+Seeds the synthetic dataset from ``dataset.py`` into a temporary SQLite
+database, books ``--history`` extra shows of one venue with as many of the
+artists as there are, then POSTs ``--requests`` renames of that venue. The
+form POST only queues the invalidation of the artists' pages; the job
+itself is timed separately, as run by ``flask worker``, and their sum is
+what the POST took when the invalidation ran inline. Also reports how
+fast ``--threads`` workers drain ``--jobs`` queued no-op jobs.
+
+    python benchmarks/job_queue.py --scale 10k --history 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'jobs.db')}")
+os.environ.setdefault("PAGE_CACHE_BACKEND", "none")
+os.environ["JOBS_EAGER"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+
+from app import create_app
+from dataset import NOW, seed
+from jobs import job_queue
+from models import db, Job, Show
+
+app = create_app()
+app.config["WTF_CSRF_ENABLED"] = False
+VENUE_ID = 1
+
+
+@job_queue.job("bench.noop")
+def noop(i):
+    pass
+
+
+def rename(i):
+    return {
+        "name": f"Renamed Venue {i}", "city": "Austin", "state": "TX", "address": "1 Main St",
+        "phone": "5125550100", "genres": ["Jazz"], "facebook_link": "https://www.facebook.com/bench",
+        "image_link": "", "website_link": "", "seeking_description": "",
+    }
+
+
+def drain(threads):
+    stop = threading.Event()
+
+    def work():
+        with app.app_context():
+            job_queue.work(stop, burst=True)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k")
+    parser.add_argument("--history", type=int, default=5000, help="extra shows of the renamed venue")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with app.app_context():
+        counts = seed(args.scale)
+        # Back-to-back two-hour shows, ending well before the seeded ones start.
+        first = NOW - timedelta(days=3 * 365)
+        db.session.execute(insert(Show), [
+            {"venue_id": VENUE_ID, "artist_id": i % counts["artists"] + 1,
+             "time": first - timedelta(hours=2 * (i + 1)), "end_time": first - timedelta(hours=2 * i)}
+            for i in range(args.history)
+        ])
+        db.session.commit()
+        artists = db.session.scalar(
+            select(db.func.count(Show.artist_id.distinct())).where(Show.venue_id == VENUE_ID)
+        )
+
+        posts, jobs = [], []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            response = client.post(f"/venues/{VENUE_ID}/edit", data=rename(i))
+            posts.append(time.perf_counter() - start)
+            assert response.status_code == 302, response.status_code
+            jobs.append(drain(1))
+        assert not db.session.scalar(select(db.func.count()).select_from(Job))
+
+        db.session.execute(insert(Job), [
+            {"name": "bench.noop", "args": {"i": i}, "state": "queued", "run_at": NOW}
+            for i in range(args.jobs)
+        ])
+        db.session.commit()
+        drained = drain(args.threads)
+
+    post, job = statistics.median(posts), statistics.median(jobs)
+    print(f"venue {VENUE_ID}: shows with {artists:,} artists")
+    print(f"{'rename POST':<16} {post * 1000:9.3f} ms")
+    print(f"{'queued job':<16} {job * 1000:9.3f} ms")
+    print(f"{'inline':<16} {(post + job) * 1000:9.3f} ms  ({(post + job) / post:.1f}x)")
+    print(f"drained {args.jobs} jobs with {args.threads} threads in {drained:.2f}s "
+          f"({args.jobs / drained:,.0f} jobs/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Name search over synthetic catalogues (default 1M names).
+
+Times building the in-process ``NameIndex`` and answering a handful of
+queries, against a linear scan equivalent to the old ``ILIKE '%term%'``.
+When DATABASE_URL points at PostgreSQL the names are also loaded into the
+Venue table and the indexed SQL search is timed.
+
+    python benchmarks/name_search.py [size]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from app import create_app
+from models import db, Venue
+from search import NameIndex, search_names
+
+app = create_app()
+
+WORDS = (
+    "blue", "note", "hall", "room", "jazz", "club", "rock", "garden", "park",
+    "red", "velvet", "union", "pool", "tavern", "lounge", "stage", "house",
+    "cellar", "electric", "ballroom", "theatre", "arena", "corner", "social",
+    "dueling", "pianos", "musical", "hop", "lantern", "crescent", "harbor",
+)
+QUERIES = ("blue note", "velv", "jazz club", "ball", "ock hal", "zz", "nothing here")
+LIMIT = 50
+
+
+def synthetic_names(size, seed=42):
+    rng = random.Random(seed)
+    for i in range(size):
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        yield f"The {' '.join(words).title()} {i % 997}"
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def linear_scan(names, term):
+    term = term.lower()
+    return [name for name in names if term in name.lower()][:LIMIT]
+
+
+def main(size):
+    names = list(synthetic_names(size))
+
+    start = time.perf_counter()
+    index = NameIndex(enumerate(names, 1))
+    print(f"built index over {len(index):,} names in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'query':<14} {'matches':>7} {'index ms':>9} {'scan ms':>9}")
+    for term in QUERIES:
+        result, index_ms = timed(lambda: index.search(term, LIMIT))
+        _, scan_ms = timed(lambda: linear_scan(names, term), repeat=1)
+        print(f"{term:<14} {len(result):>7} {index_ms:>9.2f} {scan_ms:>9.1f}")
+
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            return
+        db.create_all()
+        db.session.execute(Venue.__table__.delete())
+        for offset in range(0, size, 50000):
+            db.session.execute(insert(Venue), [
+                {"name": name, "city": "City", "state": "NY"} for name in names[offset:offset + 50000]
+            ])
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE "Venue"'))
+
+        print(f"{'query':<14} {'matches':>7} {'sql ms':>9}")
+        for term in QUERIES:
+            result, sql_ms = timed(lambda: search_names(Venue, term, LIMIT))
+            print(f"{term:<14} {len(result):>7} {sql_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
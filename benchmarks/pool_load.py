@@ -0,0 +1,90 @@
+"""Connection pool behaviour at one and two times the pool size.
+
+Runs ``THREADS`` workers that each check out a connection, run a query and
+hold it for ``HOLD`` seconds, as a request doing some work would. Reports
+request latency, checkout waits, timeouts and peak saturation from
+``db_pool.stats()`` for each concurrency level, with and without overflow.
+At twice the pool size without overflow, half the workers queue for a
+connection; the pool's queue is not fair, so a few of them can be starved
+past ``DB_POOL_TIMEOUT`` and fail.
+
+Uses a SQLite file unless ``DATABASE_URL`` is set; against PostgreSQL
+(``DB_POOLER=pgbouncer`` for a pooler) the numbers include real connects.
+
+    python benchmarks/pool_load.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, exc, text
+
+from app import create_app
+from dbpool import engine_options
+
+app = create_app()
+
+POOL_SIZE = 4
+HOLD = 0.05
+REQUESTS_PER_THREAD = 20
+POOL_TIMEOUT = 0.5
+
+
+def run(engine, threads):
+    latencies, failures = [], []
+
+    def worker():
+        for _ in range(REQUESTS_PER_THREAD):
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    time.sleep(HOLD)
+            except exc.TimeoutError:
+                failures.append(time.perf_counter() - start)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, failures
+
+
+def main():
+    print(f"pool_size={POOL_SIZE} hold={HOLD * 1000:.0f}ms pool_timeout={POOL_TIMEOUT}s")
+    print(f"{'overflow':>8} {'threads':>7} {'p50 ms':>7} {'p95 ms':>7} {'wait avg':>8} "
+          f"{'wait max':>8} {'timeouts':>8} {'peak sat':>8}")
+    for overflow in (0, POOL_SIZE):
+        for threads in (POOL_SIZE, POOL_SIZE * 2):
+            config = {
+                **app.config,
+                "DB_POOL_SIZE": POOL_SIZE,
+                "DB_MAX_OVERFLOW": overflow,
+                "DB_POOL_TIMEOUT": POOL_TIMEOUT,
+            }
+            options = engine_options(config)
+            engine = create_engine(config["SQLALCHEMY_DATABASE_URI"], **options)
+            latencies, failures = run(engine, threads)
+            stats = engine.pool.stats()
+            engine.dispose()
+
+            waits = stats["checkouts"] + stats["timeouts"]
+            p50 = statistics.median(latencies) * 1000 if latencies else 0
+            p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else 0
+            print(f"{overflow:>8} {threads:>7} {p50:>7.1f} {p95:>7.1f} "
+                  f"{stats['wait_seconds_total'] / waits * 1000:>6.1f}ms "
+                  f"{stats['wait_seconds_max'] * 1000:>6.1f}ms {len(failures):>8} "
+                  f"{stats['peak_saturation']:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Latency, throughput and SQL statements of every route.
+
+Seeds the synthetic dataset from ``dataset.py`` and drives each route
+through two drivers:
+
+* ``client`` - the Flask test client, one request at a time, which
+  measures the application alone;
+* ``http`` - ``--concurrency`` threads issuing real HTTP requests against
+  a threaded server started on a free port (or ``--url``).
+
+For each route and driver it reports p50/p95/p99 latency, throughput and
+SQL statements per request (read from the ``Server-Timing`` header, so
+replica binds are included) and writes everything to a JSON file. Two such
+files can be compared to spot regressions between commits:
+
+    python benchmarks/routes.py run --scale 100k
+    python benchmarks/routes.py compare results/abc123-100k.json results/def456-100k.json
+
+Read routes run first, then the write routes, and deleting venues last.
+Request parameters come from a seeded RNG, so runs are repeatable. Without
+DATABASE_URL a temporary SQLite file is used.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from dataset import CITIES, GENRES, NOW, seed
+from models import db
+
+app = create_app()
+# The write routes post forms without a session to hold a CSRF token.
+app.config["WTF_CSRF_ENABLED"] = False
+
+Route = namedtuple("Route", "name method path data")
+Sample = namedtuple("Sample", "elapsed status queries")
+
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def _venue_form(rng, i):
+    return {
+        "name": f"Bench Venue {i}", "city": "Austin", "state": "TX", "address": f"{i} Main St",
+        "phone": "5125550100", "genres": rng.sample(GENRES, 2),
+        "facebook_link": "https://www.facebook.com/bench", "image_link": "", "website_link": "",
+        "seeking_description": "",
+    }
+
+
+def _artist_form(rng, i):
+    return {
+        "name": f"Bench Artist {i}", "city": "Austin", "state": "TX", "phone": "5125550100",
+        "genres": rng.sample(GENRES, 2), "facebook_link": "https://www.facebook.com/bench",
+        "image_link": "", "website_link": "", "seeking_description": "",
+    }
+
+
+def routes(counts):
+    """Every route of the app, with parameters drawn from the seeded rows."""
+    n = counts["venues"]
+
+    def any_id(rng, i):
+        return rng.randint(1, n)
+
+    def search(rng, i):
+        return {"search_term": rng.choice(["hall", "jazz", "blue note", "ve", "nothing at all"])}
+
+    def calendar(rng, i):
+        # Upcoming shows, a month, or a weekend in a city, of a genre or not.
+        day = NOW.date() + timedelta(days=rng.randint(-300, 300))
+        return "/shows?" + rng.choice([
+            "",
+            f"from={day.replace(day=1)}&to={day.replace(day=28)}",
+            f"from={day}&to={day + timedelta(days=2)}&city={urllib.parse.quote(rng.choice(CITIES))}",
+            f"from={day}&city={urllib.parse.quote(rng.choice(CITIES))}&genre={urllib.parse.quote(rng.choice(GENRES))}",
+        ])
+
+    reads = [
+        Route("index", "GET", lambda rng, i: "/", None),
+        Route("venues.listing", "GET", lambda rng, i: "/venues", None),
+        Route("venues.search_venues", "POST", lambda rng, i: "/venues/search", search),
+        Route("venues.show_venue", "GET", lambda rng, i: f"/venues/{any_id(rng, i)}", None),
+        Route("venues.venue_shows", "GET", lambda rng, i: f"/venues/{any_id(rng, i)}/shows/{rng.choice(['upcoming', 'past'])}", None),
+        Route("venues.create_venue_form", "GET", lambda rng, i: "/venues/create", None),
+        Route("venues.edit_venue", "GET", lambda rng, i: f"/venues/{any_id(rng, i)}/edit", None),
+        Route("artists.listing", "GET", lambda rng, i: "/artists", None),
+        Route("artists.search_artists", "POST", lambda rng, i: "/artists/search", search),
+        Route("artists.show_artist", "GET", lambda rng, i: f"/artists/{any_id(rng, i)}", None),
+        Route("artists.artist_shows", "GET", lambda rng, i: f"/artists/{any_id(rng, i)}/shows/{rng.choice(['upcoming', 'past'])}", None),
+        Route("artists.edit_artist", "GET", lambda rng, i: f"/artists/{any_id(rng, i)}/edit", None),
+        Route("artists.create_artist_form", "GET", lambda rng, i: "/artists/create", None),
+        Route("shows.listing", "GET", calendar, None),
+        Route("shows.create_shows", "GET", lambda rng, i: "/shows/create", None),
+        Route("api.listing", "GET", lambda rng, i: f"/api/v1/{rng.choice(['venues', 'artists', 'shows'])}", None),
+        Route("metrics", "GET", lambda rng, i: "/metrics", None),
+    ]
+    writes = [
+        Route("venues.create_venue_submission", "POST", lambda rng, i: "/venues/create", _venue_form),
+        Route("venues.edit_venue_submission", "POST", lambda rng, i: f"/venues/{any_id(rng, i)}/edit", _venue_form),
+        Route("artists.create_artist_submission", "POST", lambda rng, i: "/artists/create", _artist_form),
+        Route("artists.edit_artist_submission", "POST", lambda rng, i: f"/artists/{any_id(rng, i)}/edit", _artist_form),
+        Route("shows.create_show_submission", "POST", lambda rng, i: "/shows/create", lambda rng, i: {
+            "venue_id": any_id(rng, i), "artist_id": any_id(rng, i),
+            # Past the seeded shows and three hours apart, so never double-booked.
+            "start_time": f"{NOW + timedelta(days=800, hours=3 * i):%Y-%m-%d %H:%M:%S}",
+        }),
+    ]
+    # Venues are deleted from the top of the id range down, never twice.
+    deleted = itertools.count()
+    deletes = [Route("venues.delete_venue", "DELETE", lambda rng, i: f"/venues/{n - next(deleted)}", None)]
+    return reads + writes + deletes
+
+
+def uncovered(table):
+    names = {route.name for route in table}
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if rule.endpoint != "static" and rule.endpoint not in names)
+
+
+def _queries(headers):
+    match = QUERIES.search(headers.get("Server-Timing", ""))
+    return int(match.group(1)) if match else None
+
+
+def drive_client(client, route, requests, rng):
+    samples = []
+    for i in range(requests):
+        path = route.path(rng, i)
+        data = route.data(rng, i) if route.data else None
+        start = time.perf_counter()
+        response = client.open(path, method=route.method, data=data)
+        response.get_data()
+        samples.append(Sample(time.perf_counter() - start, response.status_code, _queries(response.headers)))
+    return samples
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def _http_request(base, method, path, data):
+    body = urllib.parse.urlencode(data, doseq=True).encode() if data else None
+    request = urllib.request.Request(base + path, data=body, method=method)
+    start = time.perf_counter()
+    try:
+        with _opener.open(request) as response:
+            response.read()
+            status, headers = response.status, response.headers
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, headers = e.code, e.headers
+    return Sample(time.perf_counter() - start, status, _queries(headers))
+
+
+def drive_http(base, route, requests, rng, concurrency):
+    # Draw every request up front so the sequence does not depend on thread timing.
+    calls = [(route.path(rng, i), route.data(rng, i) if route.data else None) for i in range(requests)]
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda call: _http_request(base, route.method, *call), calls))
+
+
+def summarize(samples, wall):
+    latencies = [sample.elapsed * 1000 for sample in samples]
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+    return {
+        "requests": len(samples),
+        "p50_ms": round(quantiles[49], 3),
+        "p95_ms": round(quantiles[94], 3),
+        "p99_ms": round(quantiles[98], 3),
+        "throughput_rps": round(len(samples) / wall, 1),
+        "errors": sum(sample.status >= 500 for sample in samples),
+        "queries": statistics.median(queries) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "statuses": statuses,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCHMARKS, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app.logger.setLevel(logging.CRITICAL)
+    # A failing route is reported as its 500s rather than ending the run.
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    drivers = ("client", "http") if args.driver == "both" else (args.driver,)
+
+    with app.app_context():
+        print(f"seeding {args.scale} ...", file=sys.stderr)
+        counts = seed(args.scale, args.seed)
+        dialect = db.engine.dialect.name
+    table = routes(counts)
+    for endpoint in uncovered(table):
+        print(f"warning: no benchmark for endpoint {endpoint}", file=sys.stderr)
+
+    server = base = None
+    if "http" in drivers:
+        base = args.url
+        if base is None:
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base = f"http://127.0.0.1:{server.server_port}"
+
+    results = {}
+    client = app.test_client()
+    print(f"{'route':<34} {'driver':<7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>7} {'errors':>6}")
+    try:
+        for route in table:
+            requests = args.requests if route.method != "DELETE" else min(args.requests, counts["venues"] // 4)
+            for driver in drivers:
+                rng = random.Random(f"{args.seed}:{route.name}")
+                start = time.perf_counter()
+                if driver == "client":
+                    samples = drive_client(client, route, requests, rng)
+                else:
+                    samples = drive_http(base, route, requests, rng, args.concurrency)
+                summary = summarize(samples, time.perf_counter() - start)
+                results.setdefault(route.name, {})[driver] = summary
+                print(f"{route.name:<34} {driver:<7} {summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} "
+                      f"{summary['p99_ms']:>8.2f} {summary['throughput_rps']:>8.1f} {summary['queries'] or '-':>7} "
+                      f"{summary['errors']:>6}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    commit = _commit()
+    output = args.output or os.path.join(BENCHMARKS, "results", f"{commit}-{args.scale}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "scale": args.scale, "seed": args.seed, "dataset": counts,
+                "requests": args.requests, "concurrency": args.concurrency,
+                "database": dialect, "python": platform.python_version(),
+            },
+            "routes": results,
+        }, f, indent=2, sort_keys=True)
+    print(f"results written to {output}", file=sys.stderr)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ("scale", "database", "requests", "concurrency"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning: {key} differs ({baseline['meta'].get(key)} vs {current['meta'].get(key)})")
+
+    regressions = 0
+    print(f"{'route':<34} {'driver':<7} {'p95 ms':>17} {'change':>8} {'req/s':>17} {'queries':>9}")
+    for name, drivers in sorted(current["routes"].items()):
+        for driver, new in sorted(drivers.items()):
+            old = baseline["routes"].get(name, {}).get(driver)
+            if old is None:
+                print(f"{name:<34} {driver:<7} {'new':>17}")
+                continue
+            change = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+            more_queries = (new["queries_max"] or 0) > (old["queries_max"] or 0)
+            flag = change > args.threshold or more_queries
+            regressions += flag
+            print(f"{name:<34} {driver:<7} {old['p95_ms']:>8.2f}>{new['p95_ms']:<8.2f} {change:>+8.0%} "
+                  f"{old['throughput_rps']:>8.1f}>{new['throughput_rps']:<8.1f} "
+                  f"{old['queries_max'] or '-'!s:>4}>{new['queries_max'] or '-'!s:<4}{'  REGRESSION' if flag else ''}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, benchmark every route and write JSON results")
+    run_parser.add_argument("--scale", default="1k", help="1k, 10k, 100k, 1m or a number of shows")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--requests", type=int, default=50, help="requests per route and driver")
+    run_parser.add_argument("--driver", choices=("client", "http", "both"), default="both")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="threads of the HTTP driver")
+    run_parser.add_argument("--url", help="benchmark a running server on the same DATABASE_URL instead of starting one")
+    run_parser.add_argument("--output", help="results file (default: results/<commit>-<scale>.json)")
+
+    compare_parser = commands.add_parser("compare", help="diff two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2,
+                                help="p95 growth flagged as a regression (default 0.2 = 20%%)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Statement count of the search endpoints as the result size grows.
+
+Seeds an in-memory SQLite database and posts an empty search term, which
+matches every row, counting the SQL statements each request issues. With
+batched show counting the count stays flat however many rows match.
+
+    python benchmarks/search_show_counts.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from app import create_app
+from counters import rebuild
+from models import db, Venue, Artist, Show
+from search import reset_index
+from testing import count_queries
+
+app = create_app()
+
+SIZES = (10, 100, 1000, 5000)
+SHOWS_PER_ROW = 4
+
+
+def seed(size):
+    db.drop_all()
+    db.create_all()
+    now = datetime.now()
+    db.session.execute(insert(Venue), [
+        {"id": i, "name": f"venue {i}", "city": "City", "state": "NY"} for i in range(1, size + 1)
+    ])
+    db.session.execute(insert(Artist), [
+        {"id": i, "name": f"artist {i}", "city": "City", "state": "NY"} for i in range(1, size + 1)
+    ])
+    db.session.execute(insert(Show), [
+        {"venue_id": i, "artist_id": i, "time": now + timedelta(days=j * 30 - 45)}
+        for i in range(1, size + 1) for j in range(SHOWS_PER_ROW)
+    ])
+    rebuild()
+    reset_index()
+
+
+def run(client, url):
+    with count_queries() as statements:
+        start = time.perf_counter()
+        response = client.post(url, data={"search_term": ""})
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200, response.status_code
+    return len(statements), elapsed
+
+
+def main():
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    print(f"{'rows':>6} {'endpoint':<16} {'queries':>7} {'ms':>9}")
+    with app.app_context():
+        for size in SIZES:
+            seed(size)
+            for url in ("/venues/search", "/artists/search"):
+                queries, elapsed = run(client, url)
+                print(f"{size:>6} {url:<16} {queries:>7} {elapsed * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
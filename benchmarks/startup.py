@@ -0,0 +1,189 @@
+"""Import time of the app and memory of its gunicorn workers.
+
+Two measurements of the app named by ``--app`` (a gunicorn app spec):
+
+* import - the median wall time, over ``--runs`` fresh interpreters, of
+  importing its module and of loading the app, and the packages taking
+  longest to import according to ``python -X importtime``;
+* memory - ``--workers`` sync gunicorn workers are started, with and
+  without ``--preload``, and sent a few requests of every read route each.
+  Reports the RSS, PSS and private memory of each worker, and the PSS of
+  the whole server, master included. PSS splits each shared page between
+  the processes sharing it, so it is what preloading saves.
+
+    python benchmarks/startup.py --app "app:create_app()" --workers 4
+
+Linux only: memory is read from ``/proc/<pid>/smaps_rollup``. Without
+DATABASE_URL a temporary SQLite file is seeded.
+"""
+import argparse
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = ("/", "/venues", "/artists", "/shows", "/venues/1", "/artists/1")
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+_LOAD = """
+import time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from gunicorn.util import import_app
+import_app({spec!r})
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def import_times(spec, runs):
+    """Median seconds to import the app's module, and to load the app."""
+    script = _LOAD.format(module=spec.split(":")[0], spec=spec)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append([float(value) for value in output.split()])
+    return [statistics.median(column) for column in zip(*samples)]
+
+
+def slowest_imports(spec, limit):
+    """``[(package, seconds)]`` of the top-level packages slowest to import."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", _LOAD.format(module=spec.split(":")[0], spec=spec)],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stderr
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            packages[match[4].split(".")[0]] += int(match[1])
+    return [(package, micros / 1e6) for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:limit]]
+
+
+def memory(pid):
+    """Rss, Pss and private memory of ``pid`` in bytes."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The process name may contain spaces; the parent pid follows it.
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            found.append(int(entry))
+    return found
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(spec, workers, preload, requests):
+    """Start gunicorn and warm every worker up.
+
+    Returns the memory of the master and of each worker, and the number of
+    requests that failed.
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+               "--log-level", "warning", spec]
+    if preload:
+        command.insert(3, "--preload")
+    # gunicorn.conf.py preloads unless told otherwise.
+    env = dict(os.environ, GUNICORN_PRELOAD="true" if preload else "false")
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+        while len(children(server.pid)) < workers:
+            time.sleep(0.2)
+
+        # Sync workers take turns on the listening socket, so enough
+        # requests reach every one of them.
+        errors = 0
+        for _ in range(requests * workers):
+            for path in PATHS:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=30).close()
+                except urllib.error.HTTPError:
+                    errors += 1
+        return memory(server.pid), [memory(pid) for pid in children(server.pid)], errors
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+
+
+def mib(value):
+    return f"{value / 2 ** 20:8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="app:create_app()", help="gunicorn app spec")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=7, help="interpreters started per import measurement")
+    parser.add_argument("--requests", type=int, default=5, help="rounds of the read routes per worker")
+    parser.add_argument("--scale", default="1k")
+    args = parser.parse_args()
+
+    module_time, load_time = import_times(args.app, args.runs)
+    print(f"import {args.app.split(':')[0]:<10} {module_time * 1000:8.1f} ms")
+    print(f"load {args.app:<12} {load_time * 1000:8.1f} ms")
+    print("\nslowest packages to import (self time)")
+    for package, seconds in slowest_imports(args.app, 10):
+        print(f"  {package:<20} {seconds * 1000:8.1f} ms")
+
+    from gunicorn.util import import_app
+    from dataset import seed
+
+    with import_app(args.app).app_context():
+        print(f"\nseeded {seed(args.scale)}")
+
+    print(f"\n{args.workers} workers, MiB     {'rss':>8} {'pss':>8} {'private':>8} {'total pss':>10} {'errors':>7}")
+    for preload in (False, True):
+        master, workers, errors = serve(args.app, args.workers, preload, args.requests)
+        per_worker = {key: statistics.mean(worker[key] for worker in workers) for key in master}
+        total = master["pss"] + sum(worker["pss"] for worker in workers)
+        print(f"{'preload' if preload else 'no preload':<19} {mib(per_worker['rss'])} {mib(per_worker['pss'])} "
+              f"{mib(per_worker['private'])} {mib(total):>10} {errors:7d}")
+
+
+if __name__ == "__main__":
+    main()
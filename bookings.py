@@ -0,0 +1,289 @@
+"""Double-booking checks: a venue, or an artist, plays one show at a time.
+
+A show is booked from ``time`` up to, not including, ``end_time``, and
+lasts at most ``SHOW_MAX_DURATION``. The bound is what keeps overlap
+lookups cheap: the bookings that can overlap ``[start, end)`` all start
+within ``(start - max duration, end)``, a range of the ``(venue_id, time)``
+and ``(artist_id, time)`` indexes, so a check costs O(log n + k) instead of
+a walk over every show of the venue. A batch is checked with one such
+range per owner and run of nearby bookings, so an import spread over
+years reads only the shows around its own. ``IntervalIndex`` does the
+same in memory for bookings that are not in the database yet.
+
+* On PostgreSQL, exclusion constraints on Show reject overlaps in the
+  database itself, also between concurrent transactions.
+* Before every flush, new and moved shows are checked against each other
+  and the database, and ``BookingConflict`` is raised for the first
+  overlap. On SQLite this is the only check.
+* The importer rejects conflicting rows with ``find_conflicts``, and
+  ``flask bookings report`` lists the overlaps in the Show table or in a
+  catalogue about to be imported.
+"""
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, bindparam, event, or_, select
+from sqlalchemy.orm import Session
+
+from models import db, Show
+
+SIDES = (("venue", "venue_id"), ("artist", "artist_id"))
+_SHOW_KEYS = ("venue_id", "artist_id", "time", "end_time")
+# Ranges looked up per query. A chunk is padded with empty ranges to the
+# next of these widths, so that queries reuse a few statements, each
+# compiled once.
+_RANGE_WIDTHS = (1, 8, 64)
+
+# ``index`` of a booking overlapping ``other_index`` in the same batch or
+# the existing show ``other_show_id``, on the ``side`` of the venue or the
+# artist.
+Conflict = namedtuple("Conflict", "index side other_index other_show_id")
+
+
+def _conflict_order(conflict):
+    # One of other_index and other_show_id is None; batch rows come first.
+    return (
+        conflict.index, conflict.side, conflict.other_index is None,
+        conflict.other_index or 0, conflict.other_show_id or 0,
+    )
+
+
+class BookingConflict(ValueError):
+    pass
+
+
+def max_duration():
+    return timedelta(minutes=current_app.config["SHOW_MAX_DURATION"])
+
+
+class IntervalIndex:
+    """Bookings of many owners, kept sorted by start for overlap lookups.
+
+    No booking lasts longer than ``max_duration``, so the ones overlapping
+    ``[start, end)`` are found by bisecting on start times.
+    """
+
+    def __init__(self, max_duration, bookings=()):
+        """Index ``(key, start, end, item)`` tuples of ``bookings``, sorted once."""
+        self.max_duration = max_duration
+        self._starts = defaultdict(list)
+        self._bookings = defaultdict(list)
+        for key, start, end, item in sorted(bookings, key=itemgetter(0, 1)):
+            self._starts[key].append(start)
+            self._bookings[key].append((end, item))
+
+    def overlapping(self, key, start, end):
+        """Items of the bookings of ``key`` overlapping ``[start, end)``."""
+        starts = self._starts.get(key)
+        if not starts:
+            return []
+        low = bisect_left(starts, start - self.max_duration)
+        high = bisect_left(starts, end)
+        return [item for other_end, item in self._bookings[key][low:high] if other_end > start]
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def _windows(bookings, key, max_duration):
+    """Disjoint ``(owner, low, high)`` start ranges of the shows that may overlap ``bookings``.
+
+    Each booking needs the shows of its owner starting in ``(start - max
+    duration, end)``; the ranges of an owner's bookings that touch are
+    merged.
+    """
+    windows = []
+    for owner, low, high in sorted(
+        (booking[key], booking["time"] - max_duration, booking["end_time"]) for booking in bookings
+    ):
+        if windows and windows[-1][0] == owner and low <= windows[-1][2]:
+            windows[-1][2] = max(windows[-1][2], high)
+        else:
+            windows.append([owner, low, high])
+    return windows
+
+
+@lru_cache(maxsize=None)
+def _ranges_query(key, width):
+    """Shows of ``key`` ``owner_<i>`` starting within ``(low_<i>, high_<i>)``, for any ``i < width``."""
+    column = getattr(Show, key)
+    return select(Show.id, column, Show.time, Show.end_time).where(or_(*(
+        and_(
+            column == bindparam(f"owner_{i}"),
+            Show.time > bindparam(f"low_{i}"),
+            Show.time < bindparam(f"high_{i}"),
+        )
+        for i in range(width)
+    )))
+
+
+def _existing(session, key, windows, exclude, max_duration):
+    """Index of the shows starting within ``windows``, but those in ``exclude``."""
+    shows = []
+    for chunk in _chunks(windows, _RANGE_WIDTHS[-1]):
+        width = next(width for width in _RANGE_WIDTHS if width >= len(chunk))
+        chunk += [(None, None, None)] * (width - len(chunk))
+        params = {}
+        for i, (owner, low, high) in enumerate(chunk):
+            params.update({f"owner_{i}": owner, f"low_{i}": low, f"high_{i}": high})
+        shows += [
+            (owner, time, end_time, id_)
+            for id_, owner, time, end_time in session.execute(_ranges_query(key, width), params)
+            if id_ not in exclude
+        ]
+    return IntervalIndex(max_duration, shows)
+
+
+def find_conflicts(session, bookings):
+    """Overlaps among ``bookings`` and between them and the Show table.
+
+    ``bookings`` are mappings with ``venue_id``, ``artist_id``, ``time`` and
+    ``end_time``, and ``id`` for shows already in the database, which are
+    then not checked against themselves. Within the batch, a booking is
+    reported against the earlier ones it overlaps. Returns ``Conflict``
+    tuples.
+    """
+    if not bookings:
+        return []
+    duration = max_duration()
+    exclude = {booking["id"] for booking in bookings if booking.get("id") is not None}
+    conflicts = []
+    for side, key in SIDES:
+        existing = _existing(session, key, _windows(bookings, key, duration), exclude, duration)
+        batch = IntervalIndex(duration, (
+            (booking[key], booking["time"], booking["end_time"], index)
+            for index, booking in enumerate(bookings)
+        ))
+        for index, booking in enumerate(bookings):
+            owner, booked = booking[key], (booking["time"], booking["end_time"])
+            conflicts += [
+                Conflict(index, side, other, None)
+                for other in batch.overlapping(owner, *booked) if other < index
+            ]
+            conflicts += [
+                Conflict(index, side, None, show_id) for show_id in existing.overlapping(owner, *booked)
+            ]
+    return sorted(conflicts, key=_conflict_order)
+
+
+def describe(conflict, bookings):
+    """Human readable reason for ``conflict``, of a booking in ``bookings``."""
+    booking = bookings[conflict.index]
+    owner = booking[f"{conflict.side}_id"]
+    other = (
+        f"show {conflict.other_show_id}" if conflict.other_show_id is not None
+        else f"row {conflict.other_index + 1}"
+    )
+    return f"{conflict.side} {owner} is already booked by {other}"
+
+
+def check_duration(start, end):
+    """Error message for a booking that does not last between 0 and the maximum, or None."""
+    if end <= start:
+        return "must be after the start time"
+    if end - start > max_duration():
+        return f"shows last at most {current_app.config['SHOW_MAX_DURATION']} minutes"
+    return None
+
+
+def overlaps():
+    """Every pair of overlapping shows in the Show table.
+
+    Streams the shows of each venue, then of each artist, in start order
+    from the ``(owner, time)`` indexes, keeping only the shows still
+    running. Yields ``(side, owner, show_id, other_show_id)``, the other
+    show starting first.
+    """
+    for side, key in SIDES:
+        column = getattr(Show, key)
+        rows = db.session.execute(
+            select(column, Show.time, Show.end_time, Show.id)
+            .order_by(column, Show.time, Show.id)
+            .execution_options(yield_per=10000)
+        )
+        owner, running = None, []
+        for key_, time, end_time, id_ in rows:
+            if key_ != owner:
+                owner, running = key_, []
+            running = [(other_end, other) for other_end, other in running if other_end > time]
+            for _, other in running:
+                yield side, owner, id_, other
+            running.append((end_time, id_))
+
+
+@event.listens_for(Session, "before_flush")
+def _check_bookings(session, flush_context, instances):
+    shows = [
+        obj for obj in session.new if isinstance(obj, Show)
+    ] + [
+        obj for obj in session.dirty
+        if isinstance(obj, Show) and obj not in session.deleted
+        and any(db.inspect(obj).attrs[key].history.has_changes() for key in _SHOW_KEYS)
+    ]
+    if not shows:
+        return
+    bookings = []
+    for show in shows:
+        if show.time is None:
+            continue
+        if show.end_time is None:
+            show.end_time = show.time + timedelta(minutes=current_app.config["SHOW_DEFAULT_DURATION"])
+        error = check_duration(show.time, show.end_time)
+        if error:
+            raise BookingConflict(f"end_time: {error}")
+        bookings.append({
+            "id": show.id, "venue_id": show.venue_id, "artist_id": show.artist_id,
+            "time": show.time, "end_time": show.end_time,
+        })
+    conflicts = find_conflicts(session, bookings)
+    if conflicts:
+        raise BookingConflict(describe(conflicts[0], bookings))
+
+
+bookings_cli = AppGroup("bookings", help="Find shows booked at the same time.")
+
+
+@bookings_cli.command("report", help="List overlapping shows, in the database or in a shows file to import.")
+@click.argument("path", required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]),
+              help="Input format; guessed from the file extension by default.")
+def report_command(path, fmt):
+    found = 0
+    if path is None:
+        for side, owner, show_id, other in overlaps():
+            found += 1
+            click.echo(f"{side} {owner}: show {show_id} overlaps show {other}")
+    else:
+        # Imported late: the importer builds on the forms.
+        from importer import KINDS, RowError, read_rows
+
+        convert = KINDS["shows"][1]
+
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        bookings, lines = [], []
+        with open(path, newline="" if fmt == "csv" else None) as stream:
+            for line, row in enumerate(read_rows(stream, fmt), 1):
+                try:
+                    bookings.append(convert(row)[0])
+                    lines.append(line)
+                except RowError as e:
+                    click.echo(f"row {line}: skipped, {e}")
+        # Rows are numbered after the file rather than the valid ones.
+        for conflict in find_conflicts(db.session, bookings):
+            found += 1
+            if conflict.other_index is not None:
+                conflict = conflict._replace(other_index=lines[conflict.other_index] - 1)
+            click.echo(f"row {lines[conflict.index]}: {describe(conflict, bookings)}")
+    click.echo(f"{found} conflicts.")
+    if found:
+        raise SystemExit(1)
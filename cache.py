@@ -0,0 +1,286 @@
+"""Read-through cache for rendered venue and artist detail pages.
+
+Pages are stored under ``page:<kind>:<id>:<version>``, where ``version`` is
+the entity's ``version`` column. Every flush that touches a Venue, Artist or
+Show bumps the versions of exactly the pages it affects in the same
+transaction, and once it commits the keys of the previous versions are
+deleted from the backend. Because the version lives in the database, a
+worker never serves a page older than the last commit, even with a
+per-process backend.
+
+The one exception is a renamed venue or artist, which shows on the pages
+of every counterpart it has shows with. Finding those takes a scan of its
+shows, so their versions are bumped by a background job (see jobs.py)
+and, until it runs, they may still show the old name or image.
+
+Backends:
+
+* ``LRUCache`` - in-process, bounded by entry count and TTL.
+* ``RedisCache`` - any client speaking the redis-py API (``redis.Redis``,
+  or ``testing.FakeRedis`` in tests).
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import partial, wraps
+
+from flask import current_app, g, has_app_context, session as flask_session
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from asyncdb import async_db
+from jobs import job_queue
+from models import db, Venue, Artist, Show
+
+# Columns of one side that are rendered on the other side's detail page.
+_SHOWN_ON_COUNTERPART = ("name", "image_link")
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with a per-entry time to live."""
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = self.misses = self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] <= self.clock():
+                del self._data[key]
+                self.evictions += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self.clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._data)}
+
+
+class RedisCache:
+    """Cache stored in Redis; eviction is left to the server's policy."""
+
+    def __init__(self, client, ttl=300):
+        self.client = client
+        self.ttl = ttl
+        self.hits = self.misses = 0
+
+    @classmethod
+    def from_url(cls, url, ttl=300):
+        import redis  # Optional dependency, only needed for this backend.
+
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode()
+
+    def set(self, key, value):
+        self.client.set(key, value.encode(), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        try:
+            evictions = self.client.info("stats").get("evicted_keys", 0)
+        except Exception:
+            evictions = 0
+        return {"hits": self.hits, "misses": self.misses, "evictions": evictions}
+
+
+class PageCache:
+    """Flask extension holding the configured page cache backend."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get("PAGE_CACHE_BACKEND", "lru")
+        ttl = app.config.get("PAGE_CACHE_TTL", 300)
+        if backend == "redis":
+            app.extensions["page_cache"] = RedisCache.from_url(app.config["PAGE_CACHE_REDIS_URL"], ttl)
+        elif backend == "lru":
+            app.extensions["page_cache"] = LRUCache(app.config.get("PAGE_CACHE_SIZE", 1024), ttl)
+        else:
+            app.extensions["page_cache"] = None
+
+    @property
+    def backend(self):
+        return current_app.extensions.get("page_cache")
+
+    def stats(self):
+        backend = self.backend
+        return backend.stats() if backend is not None else {}
+
+
+page_cache = PageCache()
+
+
+def page_key(model, entity_id, version):
+    return f"page:{model.__tablename__.lower()}:{entity_id}:{version}"
+
+
+def _version(model, entity_id, session):
+    return session.execute(select(model.version).where(model.id == entity_id)).scalar()
+
+
+async def page_version(model, entity_id):
+    """``version`` of a venue or artist, None if missing; read once per request."""
+    versions = g.setdefault("page_versions", {})
+    if (model, entity_id) not in versions:
+        versions[model, entity_id] = await async_db.run(partial(_version, model, entity_id))
+    return versions[model, entity_id]
+
+
+def cached_page(model):
+    """Serve a detail view for ``model`` from the page cache.
+
+    The view is an async view fetching its data through ``async_db``; it
+    must take ``<model>_id`` and return the rendered template. Requests
+    carrying flashed messages bypass the cache, since the layout renders
+    them into the page.
+    """
+    id_arg = f"{model.__tablename__.lower()}_id"
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(**kwargs):
+            backend = current_app.extensions.get("page_cache")
+            if backend is None or flask_session.get("_flashes"):
+                return await view(**kwargs)
+
+            entity_id = kwargs[id_arg]
+            version = await page_version(model, entity_id)
+            if version is None:
+                return await view(**kwargs)
+
+            key = page_key(model, entity_id, version)
+            page = backend.get(key)
+            if page is None:
+                page = await view(**kwargs)
+                backend.set(key, page)
+            return page
+
+        return wrapper
+
+    return decorator
+
+
+def _history_values(obj, attr):
+    """Current and previous values of ``attr`` changed in this flush."""
+    history = inspect(obj).attrs[attr].history
+    return {value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None}
+
+
+def _changed(obj, attrs):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+def invalidate_pages(session, model, ids):
+    """Bump ``model.version`` for ``ids`` in the session's transaction.
+
+    The superseded page keys are deleted from the backend once the
+    transaction commits. ORM flushes call this automatically; writes that
+    bypass the ORM (bulk imports) must call it themselves.
+    """
+    stmt = (
+        update(model)
+        .where(model.id.in_(ids))
+        .values(version=model.version + 1)
+        .returning(model.id, model.version)
+    )
+    session.info.setdefault("page_cache_stale", []).extend(
+        page_key(model, id_, version - 1) for id_, version in session.connection().execute(stmt)
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_pages(session, flush_context):
+    touched = {Venue: set(), Artist: set()}
+    renamed = {Venue: set(), Artist: set()}
+
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and session.is_modified(obj):
+            touched[type(obj)].add(obj.id)
+            if _changed(obj, _SHOWN_ON_COUNTERPART):
+                renamed[type(obj)].add(obj.id)
+
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Show) and (obj not in session.dirty or session.is_modified(obj)):
+            touched[Venue] |= _history_values(obj, "venue_id")
+            touched[Artist] |= _history_values(obj, "artist_id")
+
+    for model, ids in renamed.items():
+        for id_ in sorted(ids):
+            job_queue.enqueue(
+                "pages.counterparts", key=f"counterparts:{model.__name__}:{id_}", session=session,
+                model=model.__name__, id=id_,
+            )
+
+    for model, ids in touched.items():
+        if ids:
+            invalidate_pages(session, model, ids)
+
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            session.info.setdefault("page_cache_stale", []).append(page_key(type(obj), obj.id, obj.version))
+
+
+@job_queue.job("pages.counterparts")
+def _invalidate_counterparts(model, id):
+    """Invalidate the pages of the counterparts of a renamed venue or artist."""
+    if model == "Venue":
+        counterpart, ids = Artist, select(Show.artist_id).where(Show.venue_id == id)
+    else:
+        counterpart, ids = Venue, select(Show.venue_id).where(Show.artist_id == id)
+    ids = set(db.session.execute(ids.distinct()).scalars())
+    if ids:
+        invalidate_pages(db.session, counterpart, ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_stale_pages(session):
+    stale = session.info.pop("page_cache_stale", None)
+    if not stale or not has_app_context():
+        return
+    backend = current_app.extensions.get("page_cache")
+    if backend is not None:
+        backend.delete(*stale)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stale_pages(session):
+    session.info.pop("page_cache_stale", None)
@@ -7,9 +7,93 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 DEBUG = True
 
 # Connect to the database
-SQLALCHEMY_DATABASE_URI = f"postgresql+psycopg2://" \
-                          f"{os.getenv('DB_USER', 'postgres')}:" \
-                          f"{os.getenv('DB_PASSWORD')}@" \
-                          f"{os.getenv('DB_HOST', '127.0.0.1:5000')}/" \
-                          f"{'DB_NAME', 'fyyur'}"
+SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL",
+                                    f"postgresql+psycopg2://"
+                                    f"{os.getenv('DB_USER', 'postgres')}:"
+                                    f"{os.getenv('DB_PASSWORD')}@"
+                                    f"{os.getenv('DB_HOST', '127.0.0.1:5000')}/"
+                                    f"{os.getenv('DB_NAME', 'fyyur')}")
 
+# Number of city/state groups rendered per page of /venues
+AREAS_PER_PAGE = int(os.getenv("AREAS_PER_PAGE", 20))
+
+# Number of rows rendered per page of /artists and /shows
+LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", 50))
+
+# JSON API: largest ?limit= accepted, rows fetched per cursor round trip
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 1000))
+API_YIELD_PER = int(os.getenv("API_YIELD_PER", 1000))
+
+# Months offered by the date picker of /shows, with their show counts
+CALENDAR_MONTHS = int(os.getenv("CALENDAR_MONTHS", 12))
+
+# Length of a show listed without an end time, and the longest show
+# accepted, in minutes. Overlap checks look back this far for bookings.
+SHOW_DEFAULT_DURATION = int(os.getenv("SHOW_DEFAULT_DURATION", 120))
+SHOW_MAX_DURATION = int(os.getenv("SHOW_MAX_DURATION", 24 * 60))
+
+# Upcoming/past shows rendered on a detail page before "Load more"
+DETAIL_SHOWS_LIMIT = int(os.getenv("DETAIL_SHOWS_LIMIT", 12))
+
+
+# Maximum number of ranked matches returned by venue/artist search
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", 50))
+
+# Seconds the genre choices of a worker's forms may miss genres added by
+# other workers
+GENRE_REFRESH_INTERVAL = float(os.getenv("GENRE_REFRESH_INTERVAL", 30))
+
+# Rendered venue/artist page cache: "lru" (per process), "redis" or "none"
+PAGE_CACHE_BACKEND = os.getenv("PAGE_CACHE_BACKEND", "lru")
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", 1024))
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 300))
+PAGE_CACHE_REDIS_URL = os.getenv("PAGE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Lifetime of fingerprinted static URLs, served as immutable
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", 365 * 24 * 3600))
+
+# Connection pool of each worker process. Keep workers * (size + overflow)
+# below the server's max_connections, or point DATABASE_URL at a pooler.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Server-side statement timeout in milliseconds, 0 to disable
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 30000))
+
+# "pgbouncer" when DATABASE_URL points at a transaction-mode pooler
+DB_POOLER = os.getenv("DB_POOLER", "")
+
+# Read replicas for read-only views, comma separated; empty reads from the primary
+DATABASE_REPLICA_URLS = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url]
+# Seconds a user reads from the primary after committing a write
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+# Replicas further behind than this many seconds are skipped
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 2))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 1))
+
+# Requests over these budgets are logged and counted in /metrics
+PROFILE_QUERY_BUDGET = int(os.getenv("PROFILE_QUERY_BUDGET", 20))
+PROFILE_LATENCY_BUDGET = int(os.getenv("PROFILE_LATENCY_BUDGET", 500))  # milliseconds
+# Fraction of requests run under cProfile; profiles of slow ones go to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(basedir, "profiles"))
+
+# Background jobs (see jobs.py). Eager mode runs the jobs a request
+# enqueues in its own process once the response is sent; turn it off where
+# ``flask worker`` runs.
+JOBS_EAGER = os.getenv("JOBS_EAGER", "true").lower() in ("1", "true", "yes")
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 5))
+# Seconds before the first retry of a failed job, doubled for each further one
+JOBS_RETRY_DELAY = float(os.getenv("JOBS_RETRY_DELAY", 10))
+# Seconds a worker may run a job before another may claim it again
+JOBS_LEASE = int(os.getenv("JOBS_LEASE", 300))
+
+# Send the independent queries of the venue and artist detail pages
+# concurrently on an asyncio engine (asyncpg on PostgreSQL, aiosqlite on
+# SQLite, see requirements-async.txt); other views are unaffected
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false").lower() in ("1", "true", "yes")
+# Defaults to DATABASE_URL with the async driver swapped in
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
@@ -0,0 +1,373 @@
+"""Materialized show counters.
+
+* upcoming/past show counts on Venue and Artist;
+* ``ShowMonthCount``, the shows of every calendar month per venue
+  location, read by the date picker of /shows.
+
+``upcoming_shows_count`` and ``past_shows_count`` are relative to a
+watermark, ``ShowCounterRollover.rolled_up_to``, rather than to the clock:
+a show is past once the watermark has passed it. That keeps them exact
+under incremental maintenance:
+
+* every flush adding, removing or moving a Show adjusts the counters of
+  the venues and artists involved in the same transaction; bulk writes
+  that bypass the ORM call ``apply_shows`` themselves;
+* ``rollover`` advances the watermark to now and moves the shows it
+  passed from upcoming to past. Run it on a schedule
+  (``flask counters rollover``); between runs, listings may count a show
+  that just started as upcoming;
+* ``check`` recomputes the counters from the Show table and, with
+  ``repair``, fixes any drift (``flask counters check --repair``).
+
+Month counts do not depend on the watermark. Shows are counted under the
+location their venue has after the flush; a venue that moves or is
+deleted has all its shows moved between locations at once.
+
+Writers take a shared lock on the watermark row and the rollover an
+exclusive one (on PostgreSQL), so a show is never counted against a
+watermark that moves before it commits.
+"""
+from collections import Counter
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import db, Venue, Artist, Show, ShowCounterRollover, ShowMonthCount
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+_SIDES = ((Venue, "venue_id"), (Artist, "artist_id"))
+
+
+def watermark(connection, lock=None, now=None):
+    """The rollover watermark, creating it at ``now`` if missing.
+
+    ``lock`` is ``"share"`` or ``"update"`` to lock the row until the
+    transaction ends.
+    """
+    stmt = select(ShowCounterRollover.rolled_up_to).where(ShowCounterRollover.id == 1)
+    if lock:
+        stmt = stmt.with_for_update(read=lock == "share")
+    rolled_up_to = connection.execute(stmt).scalar()
+    if rolled_up_to is None:
+        insert = _INSERTS[connection.dialect.name](ShowCounterRollover)
+        connection.execute(
+            insert.values(id=1, rolled_up_to=now or datetime.now()).on_conflict_do_nothing()
+        )
+        rolled_up_to = connection.execute(stmt).scalar()
+    return rolled_up_to
+
+
+def _update_counters(connection, model, deltas):
+    """Add ``{id: (upcoming, past)}`` to the counters of ``model``."""
+    rows = [
+        {"_id": id_, "_upcoming": upcoming, "_past": past}
+        for id_, (upcoming, past) in deltas.items() if upcoming or past
+    ]
+    if not rows:
+        return
+    table = model.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values(
+            upcoming_shows_count=table.c.upcoming_shows_count + bindparam("_upcoming"),
+            past_shows_count=table.c.past_shows_count + bindparam("_past"),
+        ),
+        rows,
+    )
+
+
+def month_of(time):
+    """First day of the month of ``time``."""
+    return date(time.year, time.month, 1)
+
+
+def add_months(month, n):
+    """The first day of the month ``n`` months after ``month``."""
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_column(connection):
+    """SQL expression for the first day of the month of ``Show.time``."""
+    if connection.dialect.name == "postgresql":
+        return func.date(func.date_trunc("month", Show.time))
+    return func.date(Show.time, "start of month")
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def apply_months(connection, shows):
+    """Count ``shows`` in the month counts of their location.
+
+    ``shows`` are ``(city, state, time, sign)`` tuples. Every show counts
+    towards its location and towards every location (empty city and
+    state); a venue without a location only towards the latter.
+    """
+    deltas = Counter()
+    for city, state, time, sign in shows:
+        month = month_of(time)
+        deltas["", "", month] += sign
+        if city or state:
+            deltas[city or "", state or "", month] += sign
+    _update_months(connection, deltas)
+
+
+def _update_months(connection, deltas, replace=False):
+    """Add ``{(city, state, month): shows}`` to the month counts, or set them with ``replace``."""
+    rows = [
+        {"city": city, "state": state, "month": month, "shows": shows}
+        for (city, state, month), shows in deltas.items() if shows or replace
+    ]
+    if not rows:
+        return
+    insert = _INSERTS[connection.dialect.name](ShowMonthCount)
+    shows = insert.excluded.shows if replace else ShowMonthCount.shows + insert.excluded.shows
+    connection.execute(
+        insert.on_conflict_do_update(
+            index_elements=[ShowMonthCount.city, ShowMonthCount.state, ShowMonthCount.month],
+            set_={"shows": shows},
+        ),
+        rows,
+    )
+
+
+def _locate(connection, shows):
+    """``(city, state, time, sign)`` of ``(venue_id, artist_id, time, sign)`` shows."""
+    venue_ids = {venue_id for venue_id, _, _, _ in shows}
+    if not venue_ids:
+        return []
+    locations = {
+        id_: (city, state) for id_, city, state in connection.execute(
+            select(Venue.id, Venue.city, Venue.state).where(Venue.id.in_(venue_ids))
+        )
+    }
+    return [(*locations[venue_id], time, sign) for venue_id, _, time, sign in shows]
+
+
+def _venue_shows(connection, venue_ids, sign):
+    """``(city, state, time, sign)`` of every show of the venues ``venue_ids``."""
+    return [
+        (city, state, time, sign) for city, state, time in connection.execute(
+            select(Venue.city, Venue.state, Show.time)
+            .join(Show, Show.venue_id == Venue.id)
+            .where(Venue.id.in_(venue_ids))
+        )
+    ]
+
+
+def apply_shows(connection, shows):
+    """Count ``shows`` in the counters of their venues and artists.
+
+    ``shows`` are ``(venue_id, artist_id, time, sign)`` tuples, ``sign``
+    being 1 for an added show and -1 for a removed one.
+    """
+    shows = list(shows)
+    if not shows:
+        return
+    _apply_counters(connection, shows)
+    apply_months(connection, _locate(connection, shows))
+
+
+def _apply_counters(connection, shows):
+    rolled_up_to = watermark(connection, lock="share")
+    for model, key in _SIDES:
+        upcoming, past = Counter(), Counter()
+        for venue_id, artist_id, time, sign in shows:
+            id_ = venue_id if key == "venue_id" else artist_id
+            (upcoming if time > rolled_up_to else past)[id_] += sign
+        _update_counters(connection, model, {
+            id_: (upcoming[id_], past[id_]) for id_ in upcoming.keys() | past.keys()
+        })
+
+
+def rollover(now=None):
+    """Move shows the clock has passed from upcoming to past.
+
+    Returns the number of shows moved.
+    """
+    now = now or datetime.now()
+    connection = db.session.connection()
+    rolled_up_to = watermark(connection, lock="update", now=now)
+    if now <= rolled_up_to:
+        db.session.commit()
+        return 0
+
+    moved = 0
+    for model, key in _SIDES:
+        column = getattr(Show, key)
+        passed = dict(connection.execute(
+            select(column, func.count())
+            .where(Show.time > rolled_up_to, Show.time <= now)
+            .group_by(column)
+        ).all())
+        _update_counters(connection, model, {id_: (-n, n) for id_, n in passed.items()})
+        # Every show has one venue and one artist: both sides see the same total.
+        moved = sum(passed.values())
+    connection.execute(
+        update(ShowCounterRollover).where(ShowCounterRollover.id == 1).values(rolled_up_to=now)
+    )
+    db.session.commit()
+    return moved
+
+
+def check(repair=False):
+    """Compare the counters with the Show table.
+
+    Returns ``[(model, id, stored, actual)]`` for every drifted row, with
+    ``stored`` and ``actual`` as ``(upcoming, past)``, or for month counts
+    ``id`` as ``(city, state, month)`` and the counts as numbers. With
+    ``repair`` the stored counters are overwritten with the actual ones.
+    """
+    connection = db.session.connection()
+    rolled_up_to = watermark(connection, lock="update" if repair else None)
+    drift = []
+    for model, key in _SIDES:
+        column = getattr(Show, key)
+        actual = (
+            select(
+                column.label("id"),
+                func.sum(case((Show.time > rolled_up_to, 1), else_=0)).label("upcoming"),
+                func.count().label("total"),
+            )
+            .group_by(column)
+            .subquery()
+        )
+        upcoming = func.coalesce(actual.c.upcoming, 0)
+        past = func.coalesce(actual.c.total, 0) - upcoming
+        rows = connection.execute(
+            select(model.id, model.upcoming_shows_count, model.past_shows_count, upcoming, past)
+            .outerjoin(actual, actual.c.id == model.id)
+            .where((model.upcoming_shows_count != upcoming) | (model.past_shows_count != past))
+        ).all()
+        drift += [(model, id_, (up, pa), (real_up, real_pa)) for id_, up, pa, real_up, real_pa in rows]
+        if repair:
+            _update_counters(connection, model, {
+                id_: (real_up - up, real_pa - pa) for id_, up, pa, real_up, real_pa in rows
+            })
+
+    month = _month_column(connection)
+    actual = Counter()
+    for city, state, month_, shows in connection.execute(
+        select(Venue.city, Venue.state, month, func.count())
+        .join(Venue, Venue.id == Show.venue_id)
+        .group_by(Venue.city, Venue.state, month)
+    ):
+        actual["", "", _as_date(month_)] += shows
+        if city or state:
+            actual[city or "", state or "", _as_date(month_)] += shows
+    stored = {
+        (city, state, month_): shows for city, state, month_, shows in connection.execute(
+            select(ShowMonthCount.city, ShowMonthCount.state, ShowMonthCount.month, ShowMonthCount.shows)
+        )
+    }
+    drifted = {
+        key: actual[key] for key in actual.keys() | stored.keys()
+        if actual[key] != stored.get(key, 0)
+    }
+    drift += [(ShowMonthCount, key, stored.get(key, 0), shows) for key, shows in sorted(drifted.items())]
+    if repair:
+        _update_months(connection, drifted, replace=True)
+    if repair:
+        db.session.commit()
+    return drift
+
+
+def rebuild(now=None):
+    """Reset the watermark to ``now`` and recompute every counter.
+
+    For bulk loads that bypass ``apply_shows``; commits.
+    """
+    connection = db.session.connection()
+    watermark(connection, lock="update", now=now)
+    connection.execute(
+        update(ShowCounterRollover).where(ShowCounterRollover.id == 1)
+        .values(rolled_up_to=now or datetime.now())
+    )
+    return check(repair=True)
+
+
+_SHOW_KEYS = ("venue_id", "artist_id", "time")
+_VENUE_KEYS = ("city", "state")
+
+
+@event.listens_for(Session, "before_flush")
+def _load_counted_shows(session, flush_context, instances):
+    # Shows about to be moved or deleted are counted under the values they
+    # have in the database, which the session may not have loaded.
+    ids = [
+        obj.id for obj in (*session.dirty, *session.deleted)
+        if isinstance(obj, Show) and obj.id is not None and (
+            obj in session.deleted
+            or any(db.inspect(obj).attrs[key].history.has_changes() for key in _SHOW_KEYS)
+        )
+    ]
+    rows = ids and session.execute(
+        select(Show.id, Show.venue_id, Show.artist_id, Show.time).where(Show.id.in_(ids))
+    )
+    session.info["counted_shows"] = {id_: tuple(row) for id_, *row in rows or ()}
+
+    # So are the shows of venues about to move or be deleted, under the
+    # venue's location in the database.
+    moved = [
+        obj.id for obj in (*session.dirty, *session.deleted)
+        if isinstance(obj, Venue) and obj.id is not None and (
+            obj in session.deleted
+            or any(db.inspect(obj).attrs[key].history.has_changes() for key in _VENUE_KEYS)
+        )
+    ]
+    session.info["moved_venues"] = (
+        set(moved), _venue_shows(session.connection(), moved, -1) if moved else []
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_shows(session, flush_context):
+    counted = session.info.pop("counted_shows", {})
+    moved, months = session.info.pop("moved_venues", (set(), []))
+    shows = [
+        (*counted[obj.id], -1) for obj in session.deleted
+        if isinstance(obj, Show) and obj.id in counted
+    ]
+    for obj in session.new:
+        if isinstance(obj, Show):
+            shows.append((obj.venue_id, obj.artist_id, obj.time, 1))
+    for obj in session.dirty:
+        if isinstance(obj, Show) and obj.id in counted:
+            shows.append((*counted[obj.id], -1))
+            shows.append((obj.venue_id, obj.artist_id, obj.time, 1))
+    connection = session.connection()
+    if shows:
+        _apply_counters(connection, shows)
+    # Moved venues swap all their shows from the old location for the new.
+    months += _locate(connection, [show for show in shows if show[0] not in moved])
+    if moved:
+        months += _venue_shows(connection, moved, 1)
+    apply_months(connection, months)
+
+
+counters_cli = AppGroup("counters", help="Maintain the materialized show counters.")
+
+
+@counters_cli.command("rollover", help="Move shows that have started from upcoming to past.")
+def rollover_command():
+    click.echo(f"Moved {rollover()} shows to past.")
+
+
+@counters_cli.command("check", help="Compare the counters with the Show table.")
+@click.option("--repair", is_flag=True, help="Overwrite drifted counters.")
+def check_command(repair):
+    drift = check(repair)
+    for model, id_, stored, actual in drift[:50]:
+        click.echo(f"{model.__tablename__} {id_}: stored {stored}, actual {actual}")
+    if len(drift) > 50:
+        click.echo(f"... and {len(drift) - 50} more")
+    click.echo(f"{len(drift)} drifted rows{', repaired' if repair and drift else ''}.")
+    if drift and not repair:
+        raise SystemExit(1)
@@ -0,0 +1,156 @@
+"""Engine configuration and connection pool metrics.
+
+``engine_options`` turns the ``DB_*`` settings into
+``SQLALCHEMY_ENGINE_OPTIONS``. With ``DB_POOLER=pgbouncer`` the database
+URL points at a transaction-mode pooler, where a server connection only
+belongs to us for one transaction: nothing may rely on session state or
+server-side prepared statements, so the statement timeout is set with
+``SET LOCAL`` at the start of every transaction rather than as a
+connection option, and psycopg 3 is told never to prepare.
+
+Engines use ``TimedQueuePool``, which records how long each checkout
+waited for a connection, how many timed out and how close the pool came
+to running out. ``db_pool.stats()`` reports them per engine.
+
+``db_pool.init_app`` must run before ``db.init_app``, which creates the
+engines.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds, in seconds, of the checkout wait histogram buckets.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float("inf"))
+
+
+class PoolMetrics:
+    """Checkout wait times and saturation of one pool."""
+
+    def __init__(self):
+        self.checkouts = self.timeouts = 0
+        self.wait_total = self.wait_max = 0.0
+        self.buckets = [0] * len(WAIT_BUCKETS)
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+
+    def record(self, wait, checked_out=None, timed_out=False):
+        with self._lock:
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.buckets[bisect_left(WAIT_BUCKETS, wait)] += 1
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+
+class TimedQueuePool(QueuePool):
+    """``QueuePool`` that records checkout waits in ``self.metrics``."""
+
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start, self.checkedout())
+        return record
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def capacity(self):
+        return self.size() + max(self._max_overflow, 0)
+
+    def stats(self):
+        metrics = self.metrics
+        capacity = self.capacity()
+        checked_out = self.checkedout()
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "overflow": max(self.overflow(), 0),
+            "saturation": checked_out / capacity if capacity else 0.0,
+            "peak_saturation": metrics.peak_checked_out / capacity if capacity else 0.0,
+            "checkouts": metrics.checkouts,
+            "timeouts": metrics.timeouts,
+            "wait_seconds_total": metrics.wait_total,
+            "wait_seconds_max": metrics.wait_max,
+            "wait_buckets": dict(zip(WAIT_BUCKETS, metrics.buckets)),
+        }
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for the ``DB_*`` settings in ``config``."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # Flask-SQLAlchemy shares one connection for in-memory databases.
+        return {}
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": config.get("DB_POOL_SIZE", 5),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 5),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 10),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", True),
+    }
+    if url.get_backend_name() != "postgresql":
+        return options
+
+    timeout = config.get("DB_STATEMENT_TIMEOUT", 0)
+    connect_args = {}
+    if config.get("DB_POOLER") == "pgbouncer":
+        if url.get_driver_name() == "psycopg":
+            connect_args["prepare_threshold"] = None
+        if timeout:
+            options["execution_options"] = {"statement_timeout": timeout}
+    elif timeout:
+        connect_args["options"] = f"-c statement_timeout={int(timeout)}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+@event.listens_for(Engine, "begin")
+def _set_local_statement_timeout(conn):
+    timeout = conn.get_execution_options().get("statement_timeout")
+    if timeout:
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+class DatabasePool:
+    """Flask extension applying ``engine_options`` and reporting pool stats."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        options = engine_options(app.config)
+        options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    def stats(self):
+        return {
+            bind or "default": engine.pool.stats()
+            for bind, engine in current_app.extensions["sqlalchemy"].engines.items()
+            if isinstance(engine.pool, TimedQueuePool)
+        }
+
+
+db_pool = DatabasePool()
@@ -13,6 +13,16 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench(scale="1k", baseline=None):
+    local("python benchmarks/routes.py run --scale {} --output bench-{}.json".format(scale, scale))
+    if baseline:
+        local("python benchmarks/routes.py compare {} bench-{}.json".format(baseline, scale))
+
+
+def assets():
+    local("flask assets build")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
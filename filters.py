@@ -0,0 +1,83 @@
+"""Jinja filters.
+
+``format_datetime`` takes ``datetime`` objects as they come out of the
+database; strings are still accepted and parsed. Babel patterns are parsed
+once per (format, locale) and the formatted strings of recently seen
+timestamps are memoized, since a page often repeats the same show times.
+``format_datetimes``, the ``datetimes`` filter, formats a column of
+timestamps with one pattern lookup; the listing templates use it for the
+show times of a page.
+
+Babel and its locale data, and dateutil, are imported on first use rather
+than with the app. ``load_locale_data`` loads them ahead of time, for a
+server that forks its workers after loading the app.
+"""
+from datetime import datetime
+from functools import lru_cache
+
+# Shorthands used by the templates.
+FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+# Babel's own named formats, which depend on locale data rather than a pattern.
+_NAMED_FORMATS = ("long", "short")
+
+
+@lru_cache(maxsize=None)
+def _compiled(format, locale):
+    """Parsed pattern and locale for a format, or None for a named format."""
+    from babel import Locale
+    from babel.dates import parse_pattern
+
+    pattern = FORMATS.get(format, format)
+    if pattern in _NAMED_FORMATS:
+        return None
+    return parse_pattern(pattern), Locale.parse(locale)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    value = str(value)
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        import dateutil.parser
+
+        return dateutil.parser.parse(value)
+
+
+def _babel_format(value, format, locale):
+    from babel.dates import format_datetime as babel_format_datetime
+
+    return babel_format_datetime(value, format, locale=locale)
+
+
+@lru_cache(maxsize=4096)
+def _format(value, format, locale):
+    compiled = _compiled(format, locale)
+    if compiled is None:
+        return _babel_format(value, format, locale)
+    pattern, locale = compiled
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format="medium", locale="en"):
+    return _format(_as_datetime(value), format, locale)
+
+
+def format_datetimes(values, format="medium", locale="en"):
+    """Format a whole column of timestamps with one pattern lookup."""
+    compiled = _compiled(format, locale)
+    if compiled is None:
+        return [_babel_format(_as_datetime(value), format, locale) for value in values]
+    pattern, locale = compiled
+    return [pattern.apply(_as_datetime(value), locale) for value in values]
+
+
+def load_locale_data(locale="en"):
+    """Import Babel and load the data of ``locale`` now rather than on first use."""
+    for format in FORMATS:
+        format_datetimes([datetime(2000, 1, 1)], format, locale)
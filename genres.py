@@ -0,0 +1,152 @@
+"""Process-wide registry of Genre rows.
+
+Genres are a small, nearly static set, so every worker keeps the
+``type -> id`` map in memory, loaded from the whole table on first use.
+A form submission resolves all of its genres at once: names missing from
+the map are looked up with one ``IN`` query, and any still unknown are
+created with one ``INSERT ... ON CONFLICT`` that returns the ids of both
+new and concurrently-inserted rows. The unique constraint on
+``Genre.type`` keeps workers from creating duplicates.
+
+Ids learned from a transaction are only published to the map once it
+commits, so a rolled back insert never leaves a dangling id behind.
+
+The registry also holds the genre choices of the venue and artist forms.
+Genres are only ever added, so at most every ``GENRE_REFRESH_INTERVAL``
+seconds a form compares the newest id in the table with the newest one
+known, and the map is reloaded when another worker has added genres since.
+Genres added by the worker itself are offered as soon as they commit.
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models import db, Genre
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Genres offered by the forms before they were read from the table; seeded
+# by migration 0008.
+DEFAULT_GENRES = (
+    "Alternative", "Blues", "Classical", "Country", "Electronic", "Folk", "Funk", "Hip-Hop",
+    "Heavy Metal", "Instrumental", "Jazz", "Musical Theatre", "Pop", "Punk", "R&B", "Reggae",
+    "Rock n Roll", "Soul", "Other",
+)
+
+
+class GenreRegistry:
+    """In-memory ``type -> id`` map over the Genre table."""
+
+    def __init__(self):
+        self._ids = None
+        self._newest = 0
+        self._choices = None
+        self._version = 0
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._ids is None:
+                self._ids = dict(db.session.execute(select(Genre.type, Genre.id)).all())
+                self._newest = max(self._ids.values(), default=0)
+                self._checked = time.monotonic()
+                self._choices = None
+        return self._ids
+
+    def reset(self):
+        """Forget the map; it is reloaded on next use."""
+        with self._lock:
+            self._ids = None
+
+    def publish(self, ids):
+        with self._lock:
+            if self._ids is not None and not ids.keys() <= self._ids.keys():
+                self._ids.update(ids)
+                self._newest = max(self._newest, *ids.values())
+                self._choices = None
+
+    def refresh(self):
+        """Reload the map if genres were added since it was loaded."""
+        newest = db.session.scalar(select(func.max(Genre.id))) or 0
+        with self._lock:
+            self._checked = time.monotonic()
+            if self._ids is not None and newest > self._newest:
+                self._ids = None
+
+    def choices(self):
+        """``(type, type)`` form choices of every genre, sorted."""
+        interval = current_app.config.get("GENRE_REFRESH_INTERVAL", 30)
+        if self._ids is not None and time.monotonic() - self._checked >= interval:
+            self.refresh()
+        known = self._load()
+        with self._lock:
+            if self._choices is None:
+                self._choices = [(name, name) for name in sorted(known)]
+                self._version += 1
+            return self._choices
+
+    def version(self):
+        """Changes whenever ``choices`` does."""
+        return self._version
+
+    def lookup(self, name):
+        """Id of the genre ``name``, or None if there is no such genre."""
+        if name not in self._load():
+            self.refresh()
+        return self._load().get(name)
+
+    def ids(self, names):
+        """Map every name in ``names`` to its Genre id, creating missing ones."""
+        names = set(names)
+        known = self._load()
+        found = {name: known[name] for name in names if name in known}
+        missing = names - found.keys()
+        if not missing:
+            return found
+
+        learned = dict(db.session.execute(
+            select(Genre.type, Genre.id).where(Genre.type.in_(missing))
+        ).all())
+        missing -= learned.keys()
+
+        if missing:
+            insert = _INSERTS[db.session.get_bind().dialect.name](Genre)
+            stmt = (
+                insert.values([{"type": name} for name in missing])
+                .on_conflict_do_update(index_elements=[Genre.type], set_={"type": insert.excluded.type})
+                .returning(Genre.type, Genre.id)
+            )
+            learned.update(db.session.execute(stmt).all())
+
+        db.session.info.setdefault("genre_ids", {}).update(learned)
+        found.update(learned)
+        return found
+
+    def genres(self, names):
+        """Genre instances for ``names``, attached to the session without loading them."""
+        genres = []
+        for name, id_ in self.ids(names).items():
+            genre = Genre(id=id_, type=name)
+            make_transient_to_detached(genre)
+            genres.append(db.session.merge(genre, load=False))
+        return genres
+
+
+genre_registry = GenreRegistry()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_genre_ids(session):
+    ids = session.info.pop("genre_ids", None)
+    if ids:
+        genre_registry.publish(ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_genre_ids(session):
+    session.info.pop("genre_ids", None)
@@ -0,0 +1,40 @@
+"""gunicorn settings, read from the working directory:
+
+    gunicorn --workers 4
+
+With ``GUNICORN_PRELOAD`` on (the default) the master builds the app once
+and forks its workers from it, so they share the imported code and the
+app copy-on-write instead of each building their own. Code changes then
+need a restart of the master rather than a ``HUP``.
+"""
+import gc
+import os
+
+wsgi_app = "app:create_app()"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from filters import load_locale_data
+
+    # Load what the app would otherwise load on first use in every worker.
+    load_locale_data()
+    # Everything alive now lives as long as the workers. Leaving it out of
+    # collections keeps the collector from writing to, and so copying, the
+    # pages holding it.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from models import db
+
+    # Connections must not be shared across processes. The app opens none
+    # while it is built, but drop any inherited ones without closing them
+    # for the master.
+    with worker.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
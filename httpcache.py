@@ -0,0 +1,204 @@
+"""HTTP caching headers: conditional GET for pages, fingerprinted static files.
+
+Venue and artist pages, and their show fragments, carry a weak ``ETag``
+made of the entity's ``version`` column (see cache.py), a digest of the
+templates and static files, and the current ``PAGE_CACHE_TTL`` window.
+The window is there because shows move from upcoming to past without a
+version bump, so a page is re-rendered at least that often, the same
+staleness the page cache allows. A request whose ``If-None-Match`` matches
+is answered ``304`` after one primary key lookup, before anything is
+rendered. Pages are sent with ``Cache-Control: no-cache``, so browsers and
+CDNs may keep them but revalidate every time.
+
+``url_for("static", filename="css/main.css")`` returns
+``/static/css/main.<hash>.css``, with a hash of the file's contents. Such
+URLs are served with a year-long ``immutable`` ``Cache-Control``. An
+outdated hash still gets the current file, without the long lifetime.
+Static files with precompressed ``.br`` or ``.gz`` copies (see assets.py)
+are served compressed to clients that accept it.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request, session as flask_session
+from werkzeug.security import safe_join
+
+from cache import page_version
+
+FINGERPRINT_LENGTH = 12
+# Precompressed copies next to a static file, preferred first.
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+_FINGERPRINTED = re.compile(rf"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{{{FINGERPRINT_LENGTH}}})(?P<ext>\.[^./]+)$")
+
+
+class HttpCache:
+    """Flask extension fingerprinting static URLs and holding file digests.
+
+    Digests are cached by modification time and size, so a changed file
+    gets a new fingerprint without a restart.
+    """
+
+    def __init__(self, app=None):
+        self._digests = {}
+        self._release = None
+        self._release_folders = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["http_cache"] = self
+        app.url_defaults(self._fingerprint_static_url)
+        app.view_functions["static"] = self._send_static
+
+    def digest(self, path):
+        """Hex SHA-256 of the file at ``path``, or None if there is none."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != signature:
+            with open(path, "rb") as f:
+                cached = self._digests[path] = (signature, hashlib.file_digest(f, "sha256").hexdigest())
+        return cached[1]
+
+    def release(self):
+        """Digest of every template and static file.
+
+        Computed once. In debug mode it is recomputed when the modification
+        time of one of their directories changes, as it does when a file is
+        added, removed or renamed over, which is how most editors save.
+        """
+        if self._release is not None and current_app.debug:
+            if any(_mtime(folder) != mtime for folder, mtime in self._release_folders):
+                self._release = None
+        if self._release is None:
+            app = current_app
+            folders = [app.static_folder, os.path.join(app.root_path, app.template_folder)]
+            release, seen = hashlib.sha256(), []
+            for folder in folders:
+                for root, _, files in sorted(os.walk(folder)):
+                    seen.append((root, _mtime(root)))
+                    for name in sorted(files):
+                        path = os.path.join(root, name)
+                        release.update(f"{os.path.relpath(path, folder)}:{self.digest(path)}\n".encode())
+            self._release = release.hexdigest()[:FINGERPRINT_LENGTH]
+            self._release_folders = seen
+        return self._release
+
+    def fingerprint(self, filename):
+        """``filename`` with the hash of its contents before the extension."""
+        path = safe_join(current_app.static_folder, filename)
+        digest = path and self.digest(path)
+        if not digest:
+            return filename
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+    def _fingerprint_static_url(self, endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = self.fingerprint(values["filename"])
+
+    def _send_static(self, filename):
+        app = current_app
+        path = safe_join(app.static_folder, filename)
+        match = _FINGERPRINTED.match(filename)
+        if match is None or (path and os.path.isfile(path)):
+            return self._send_precompressed(filename)
+
+        original = match["stem"] + match["ext"]
+        response = self._send_precompressed(original)
+        if self.fingerprint(original) == filename:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config.get("STATIC_MAX_AGE", 31536000)
+            response.cache_control.immutable = True
+        return response
+
+    def _send_precompressed(self, filename):
+        # Serve the .br or .gz copy written by ``flask assets build`` when
+        # the client accepts it and it is not older than the file.
+        app = current_app
+        path = safe_join(app.static_folder, filename)
+        variants = [
+            (encoding, suffix) for encoding, suffix in PRECOMPRESSED
+            if path and _newer_or_same(path + suffix, path)
+        ]
+        for encoding, suffix in variants:
+            if request.accept_encodings[encoding]:
+                response = app.send_static_file(filename + suffix)
+                response.content_encoding = encoding
+                response.mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                break
+        else:
+            response = app.send_static_file(filename)
+        if variants:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _newer_or_same(path, than):
+    try:
+        return os.stat(path).st_mtime_ns >= os.stat(than).st_mtime_ns
+    except OSError:
+        return False
+
+
+http_cache = HttpCache()
+
+
+def page_etag(model, entity_id, version):
+    """Weak entity tag of the pages rendered from ``model`` ``entity_id``."""
+    ttl = current_app.config.get("PAGE_CACHE_TTL", 300)
+    window = int(time.time() // ttl) if ttl else 0
+    release = current_app.extensions["http_cache"].release()
+    return f"{model.__tablename__.lower()}-{entity_id}-{version}-{release}-{window}"
+
+
+def conditional_page(model):
+    """Answer ``If-None-Match`` for a view rendered from ``model``.
+
+    Like ``cached_page`` the view must be async, take ``<model>_id`` and
+    render rows whose changes bump ``model.version``. Requests carrying
+    flashed messages are rendered and sent uncacheable, since the layout
+    renders them into the page.
+    """
+    id_arg = f"{model.__tablename__.lower()}_id"
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(**kwargs):
+            if flask_session.get("_flashes"):
+                response = make_response(await view(**kwargs))
+                response.cache_control.no_store = True
+                return response
+
+            entity_id = kwargs[id_arg]
+            version = await page_version(model, entity_id)
+            if version is None:
+                return await view(**kwargs)
+
+            etag = page_etag(model, entity_id, version)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(await view(**kwargs))
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,368 @@
+"""Bulk import of venues, artists and shows from CSV or NDJSON files.
+
+    flask import venues venues.csv
+    flask import artists artists.ndjson --chunk-size 10000
+    flask import shows shows.csv --rejects bad_shows.csv
+
+Rows are streamed from the file and validated with the same forms as the
+HTML pages (``VenueForm``, ``ArtistForm``, ``ShowForm``). Each chunk is
+written in one transaction: genres and foreign keys are resolved for the
+whole chunk at once and rows go in through executemany, or ``COPY`` for
+shows on PostgreSQL. Rows that fail validation, book a venue or artist
+for a time it is already booked (see ``bookings.py``), or belong to a
+chunk the database refuses, are written to a side file with the reason
+and the run carries on.
+
+In CSV files genres are separated by ``;``; in NDJSON they are a list.
+Genres that do not exist yet are created.
+Venue and artist rows may carry an explicit ``id`` so that a shows file
+can refer to them.
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import timedelta
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+from bookings import describe, find_conflicts
+from cache import invalidate_pages
+from counters import apply_shows
+from forms import VenueForm, ArtistForm, ShowForm
+from genres import genre_registry
+from models import db, Venue, Artist, Show, venue_genre, artist_genre
+from search import reset_index
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield rows of a CSV or NDJSON stream as dicts."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            genres = row.get("genres")
+            if isinstance(genres, str):
+                row["genres"] = [genre.strip() for genre in genres.split(";") if genre.strip()]
+            yield row
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("not an object")
+        except ValueError as e:
+            row = {"_line": line.rstrip("\n"), "_error": f"invalid JSON: {e}"}
+        yield row
+
+
+def _formdata(row):
+    data = MultiDict()
+    for key, value in row.items():
+        for item in value if isinstance(value, list) else [value]:
+            if item is None or item is False:
+                continue
+            data.add(key, "y" if item is True else str(item))
+    return data
+
+
+def _validate(form_class, row):
+    if "_error" in row:
+        raise RowError(row["_error"])
+    form = form_class(formdata=_formdata(row), meta={"csrf": False})
+    if "genres" in form:
+        # Unlike the pages, a catalogue may bring genres of its own; they
+        # are created along with its rows.
+        form.genres.validate_choice = False
+    if not form.validate():
+        raise RowError("; ".join(f"{field}: {', '.join(errors)}" for field, errors in form.errors.items()))
+    return form
+
+
+def _optional_id(row):
+    if row.get("id") in (None, ""):
+        return {}
+    try:
+        return {"id": int(row["id"])}
+    except (TypeError, ValueError):
+        raise RowError("id: must be an integer")
+
+
+def _venue_values(row):
+    form = _validate(VenueForm, row)
+    return {
+        **_optional_id(row),
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "address": form.address.data,
+        "phone": re.sub(r"\D", "", form.phone.data or ""),
+        "image_link": form.image_link.data,
+        "facebook_link": form.facebook_link.data,
+        "website_link": form.website_link.data,
+        "seeking_talents": form.seeking_talent.data,
+        "seeking_description": form.seeking_description.data,
+    }, form.genres.data
+
+
+def _artist_values(row):
+    form = _validate(ArtistForm, row)
+    return {
+        **_optional_id(row),
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "phone": re.sub(r"\D", "", form.phone.data or ""),
+        "image_link": form.image_link.data,
+        "facebook_link": form.facebook_link.data,
+        "website_link": form.website_link.data,
+        "seeking_venue": form.seeking_venue.data,
+        "seeking_description": form.seeking_description.data,
+    }, form.genres.data
+
+
+def _show_values(row):
+    form = _validate(ShowForm, row)
+    try:
+        venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+    except (TypeError, ValueError):
+        raise RowError("venue_id, artist_id: must be integers")
+    start = form.start_time.data
+    end = form.end_time.data or start + timedelta(minutes=current_app.config["SHOW_DEFAULT_DURATION"])
+    return {"venue_id": venue_id, "artist_id": artist_id, "time": start, "end_time": end}, None
+
+
+class Rejects:
+    """Side file for rejected rows, opened on the first rejection."""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, row, error):
+        self.count += 1
+        if self.fmt == "csv":
+            row = {key: ";".join(value) if isinstance(value, list) else value for key, value in row.items()}
+            if self._writer is None:
+                self._file = open(self.path, "w", newline="")
+                self._writer = csv.DictWriter(self._file, [*row, "error"], extrasaction="ignore")
+                self._writer.writeheader()
+            self._writer.writerow({**row, "error": error})
+        else:
+            if self._file is None:
+                self._file = open(self.path, "w")
+            self._file.write(json.dumps({**row, "_error": error}, default=str) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _insert_with_genres(model, association, key, values, genres):
+    genre_ids = genre_registry.ids({name for names in genres for name in names})
+    ids = db.session.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), values
+    ).scalars().all()
+    links = [
+        {key: id_, "genre_id": genre_ids[name]}
+        for id_, names in zip(ids, genres) for name in set(names)
+    ]
+    if links:
+        db.session.execute(insert(association), links)
+
+
+def _write_venues(values, genres):
+    _insert_with_genres(Venue, venue_genre, "venue_id", values, genres)
+
+
+def _write_artists(values, genres):
+    _insert_with_genres(Artist, artist_genre, "artist_id", values, genres)
+
+
+def _copy_shows(values):
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        writer.writerow((row["venue_id"], row["artist_id"], row["time"].isoformat(), row["end_time"].isoformat()))
+    buffer.seek(0)
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert('COPY "Show" (venue_id, artist_id, time, end_time) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _check_show_keys(values):
+    """Split show rows into ones whose venue and artist exist, and the rest."""
+    venue_ids = {row["venue_id"] for row in values}
+    artist_ids = {row["artist_id"] for row in values}
+    known_venues = set(db.session.execute(select(Venue.id).where(Venue.id.in_(venue_ids))).scalars())
+    known_artists = set(db.session.execute(select(Artist.id).where(Artist.id.in_(artist_ids))).scalars())
+
+    valid, invalid = [], []
+    for index, row in enumerate(values):
+        if row["venue_id"] not in known_venues:
+            invalid.append((index, f"venue_id: no venue {row['venue_id']}"))
+        elif row["artist_id"] not in known_artists:
+            invalid.append((index, f"artist_id: no artist {row['artist_id']}"))
+        else:
+            valid.append(row)
+    return valid, invalid
+
+
+def _check_show_bookings(values):
+    """Split show rows into ones booking a free venue and artist, and the rest.
+
+    Rows are checked against the database and against the rows before
+    them in the chunk.
+    """
+    conflicts = {}
+    for conflict in find_conflicts(db.session, values):
+        conflicts.setdefault(conflict.index, describe(conflict, values))
+    valid = [row for index, row in enumerate(values) if index not in conflicts]
+    return valid, list(conflicts.items())
+
+
+def _write_shows(values, genres):
+    if db.session.get_bind().dialect.name == "postgresql":
+        _copy_shows(values)
+    else:
+        db.session.execute(insert(Show), values)
+    apply_shows(
+        db.session.connection(),
+        ((row["venue_id"], row["artist_id"], row["time"], 1) for row in values)
+    )
+    invalidate_pages(db.session, Venue, {row["venue_id"] for row in values})
+    invalidate_pages(db.session, Artist, {row["artist_id"] for row in values})
+
+
+KINDS = {
+    "venues": (Venue, _venue_values, _write_venues),
+    "artists": (Artist, _artist_values, _write_artists),
+    "shows": (Show, _show_values, _write_shows),
+}
+
+
+def import_rows(kind, rows, chunk_size=5000, rejects=None, progress=None):
+    """Validate and write ``rows`` of ``kind`` chunk by chunk.
+
+    ``rejects`` receives ``(row, error)`` for every rejected row and
+    ``progress`` the running ``(imported, rejected)`` totals after each
+    chunk. Returns the same totals.
+    """
+    model, convert, write = KINDS[kind]
+    imported = rejected = 0
+    explicit_ids = False
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        accepted, values, genres = [], [], []
+        for row in chunk:
+            try:
+                row_values, row_genres = convert(row)
+            except RowError as e:
+                rejected += 1
+                if rejects:
+                    rejects(row, str(e))
+                continue
+            accepted.append(row)
+            values.append(row_values)
+            genres.append(row_genres)
+            explicit_ids = explicit_ids or "id" in row_values
+
+        try:
+            for check in (_check_show_keys, _check_show_bookings) if kind == "shows" else ():
+                if not values:
+                    break
+                values, invalid = check(values)
+                for index, error in invalid:
+                    rejected += 1
+                    if rejects:
+                        rejects(accepted[index], error)
+                invalid = {index for index, _ in invalid}
+                accepted = [row for index, row in enumerate(accepted) if index not in invalid]
+            if values:
+                write(values, genres)
+            db.session.commit()
+            imported += len(values)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            error = str(getattr(e, "orig", None) or e).splitlines()[0]
+            rejected += len(accepted)
+            if rejects:
+                for row in accepted:
+                    rejects(row, f"database: {error}")
+
+        if progress:
+            progress(imported, rejected)
+
+    if model is not Show:
+        reset_index(model)
+        if explicit_ids and db.session.get_bind().dialect.name == "postgresql":
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"(SELECT coalesce(max(id), 1) FROM \"{table}\"))"
+            ))
+            db.session.commit()
+
+    return imported, rejected
+
+
+import_cli = AppGroup("import", help="Bulk import venues, artists and shows from CSV or NDJSON.")
+
+
+def _import_command(kind):
+    @import_cli.command(kind, help=f"Import {kind} from a CSV or NDJSON file.")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]),
+                  help="Input format; guessed from the file extension by default.")
+    @click.option("--chunk-size", default=5000, show_default=True,
+                  help="Rows validated and written per transaction.")
+    @click.option("--rejects", "rejects_path",
+                  help="File for rejected rows (default: <path>.rejects.<ext>).")
+    def command(path, fmt, chunk_size, rejects_path):
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        base, ext = os.path.splitext(path)
+        rejects = Rejects(rejects_path or f"{base}.rejects{ext}", fmt)
+        start = time.perf_counter()
+
+        def progress(imported, rejected):
+            elapsed = time.perf_counter() - start
+            click.echo(f"  {imported + rejected:,} rows read, {imported:,} imported, "
+                       f"{rejected:,} rejected ({(imported + rejected) / elapsed:,.0f} rows/s)")
+
+        with open(path, newline="" if fmt == "csv" else None) as stream:
+            try:
+                imported, rejected = import_rows(kind, read_rows(stream, fmt), chunk_size, rejects.write, progress)
+            finally:
+                rejects.close()
+
+        elapsed = time.perf_counter() - start
+        click.echo(f"Imported {imported:,} {kind} in {elapsed:.1f}s ({imported / elapsed:,.0f} rows/s).")
+        if rejected:
+            click.echo(f"Rejected {rejected:,} rows, written to {rejects.path}.")
+
+    return command
+
+
+for _kind in KINDS:
+    _import_command(_kind)
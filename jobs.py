@@ -0,0 +1,291 @@
+"""Background jobs for the work a write derives from its rows.
+
+A write commits its own rows and enqueues what can follow later, so the
+time of a form POST does not grow with every kind of derived data. Jobs
+are rows of the ``Job`` table, inserted in the transaction of the write:
+they exist exactly when the write committed.
+
+* ``enqueue`` adds a job for a handler registered with ``job``. Jobs
+  sharing a ``key`` are merged while queued, the latest arguments winning,
+  so a burst of edits of one venue runs its job once.
+* ``flask worker`` runs jobs from a pool of threads. A worker claims due
+  jobs with ``UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)``,
+  so concurrent workers never wait on, or take, each other's jobs; on
+  SQLite, which has a single writer, the claim is one atomic statement.
+  Each thread claims a few jobs at a time, saving a commit per job. A
+  claim is a lease of ``JOBS_LEASE`` seconds, after which the job is due
+  again, in case its worker died, unless that was its last attempt.
+* A handler runs in the transaction that deletes its job. A failed job is
+  retried ``JOBS_MAX_ATTEMPTS`` times, ``JOBS_RETRY_DELAY`` seconds later
+  and twice as long after each further failure, then kept as failed with
+  its error. Handlers must therefore be safe to run more than once.
+* With ``JOBS_EAGER`` on, the web process also runs the jobs a request
+  enqueued, once the response is sent. Workers pick up whatever it does
+  not get to.
+
+``stats`` reports the queue depth, exported by ``/metrics``.
+"""
+import signal
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+
+import click
+from flask import after_this_request, current_app, g, has_request_context
+from flask.cli import with_appcontext
+from sqlalchemy import case, delete, event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from models import db, Job
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class JobQueue:
+    """Flask extension holding the job handlers and the queue operations."""
+
+    def __init__(self, app=None):
+        self.handlers = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JOBS_EAGER", True)
+        app.config.setdefault("JOBS_MAX_ATTEMPTS", 5)
+        app.config.setdefault("JOBS_RETRY_DELAY", 10)
+        app.config.setdefault("JOBS_LEASE", 300)
+
+    def job(self, name):
+        """Register the decorated function as the handler of jobs ``name``."""
+        def decorator(handler):
+            self.handlers[name] = handler
+            return handler
+
+        return decorator
+
+    def enqueue(self, name, *, key=None, session=None, **args):
+        """Queue the job ``name`` with ``args`` in the transaction of ``session``.
+
+        ``args`` must be JSON serializable. Returns the job id, that of the
+        queued job it was merged into if one has the same ``key``.
+        """
+        if name not in self.handlers:
+            raise LookupError(f"no handler for job {name!r}")
+        session = session or db.session
+        connection = session.connection()
+        insert = _INSERTS[connection.dialect.name](Job).values(
+            name=name, args=args, key=key, state="queued", attempts=0, run_at=datetime.now()
+        )
+        if key is not None:
+            insert = insert.on_conflict_do_update(
+                index_elements=[Job.key], index_where=Job.state == "queued",
+                set_={"args": insert.excluded.args},
+            )
+        job_id = connection.execute(insert.returning(Job.id)).scalar_one()
+        session.info.setdefault("jobs_enqueued", set()).add(job_id)
+        return job_id
+
+    def claim(self, limit=1, ids=None):
+        """Lease up to ``limit`` due jobs, or the due ones of ``ids``, and return them.
+
+        Queued jobs come first, then running ones whose lease has run out.
+        """
+        jobs = []
+        for state in ("queued",) if ids is not None else ("queued", "running"):
+            if len(jobs) < limit:
+                jobs += self._claim(state, limit - len(jobs), ids)
+        return jobs
+
+    def _claim(self, state, limit, ids):
+        now = datetime.now()
+        due = [Job.state == state, Job.run_at <= now]
+        if state == "running":
+            # A job whose every attempt ran out its lease is failed, not
+            # run once more.
+            max_attempts = current_app.config["JOBS_MAX_ATTEMPTS"]
+            db.session.execute(
+                update(Job).where(*due, Job.attempts >= max_attempts)
+                .values(state="failed", error="lease expired")
+                .execution_options(synchronize_session=False)
+            )
+            due.append(Job.attempts < max_attempts)
+        # One state at a time, so that the (state, run_at) index yields
+        # the jobs in order without sorting every due one.
+        due = (
+            select(Job.id)
+            .where(*due)
+            .order_by(Job.run_at, Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if ids is not None:
+            due = due.where(Job.id.in_(ids))
+        stmt = (
+            update(Job)
+            .where(Job.id.in_(due.scalar_subquery()))
+            .values(state="running", attempts=Job.attempts + 1,
+                    run_at=now + timedelta(seconds=current_app.config["JOBS_LEASE"]))
+            .returning(Job.id, Job.name, Job.args, Job.key, Job.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        jobs = db.session.execute(stmt).all()
+        db.session.commit()
+        return jobs
+
+    def run(self, job):
+        """Run a claimed job; returns whether it succeeded."""
+        try:
+            handler = self.handlers.get(job.name)
+            if handler is None:
+                raise LookupError(f"no handler for job {job.name!r}")
+            handler(**job.args)
+            # A worker that outlived its lease leaves the job to the one
+            # that claimed it since.
+            db.session.execute(
+                delete(Job).where(Job.id == job.id, Job.attempts == job.attempts),
+                execution_options={"synchronize_session": False},
+            )
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception("Job %s %s failed", job.id, job.name)
+            self._failed(job, e)
+            return False
+
+    def _failed(self, job, error):
+        config = current_app.config
+        mine = (Job.id == job.id, Job.attempts == job.attempts)
+        if job.attempts >= config["JOBS_MAX_ATTEMPTS"]:
+            db.session.execute(update(Job).where(*mine).values(state="failed", error=repr(error)))
+            db.session.commit()
+            return
+        delay = timedelta(seconds=config["JOBS_RETRY_DELAY"] * 2 ** (job.attempts - 1))
+        try:
+            db.session.execute(update(Job).where(*mine).values(
+                state="queued", run_at=datetime.now() + delay, error=repr(error)
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # The same key was enqueued again meanwhile; that job runs instead.
+            db.session.rollback()
+            db.session.execute(delete(Job).where(*mine))
+            db.session.commit()
+
+    def work(self, stop, burst=False, poll=1.0, batch=10):
+        """Claim and run jobs, ``batch`` at a time, until ``stop`` is set.
+
+        With ``burst``, return as soon as no job is due instead.
+        """
+        while not stop.is_set():
+            jobs = self.claim(batch)
+            if not jobs:
+                if burst:
+                    return
+                stop.wait(poll)
+            for job in jobs:
+                self.run(job)
+            db.session.remove()
+
+    def retry_failed(self):
+        """Queue the failed jobs again; returns how many."""
+        # Of the jobs sharing a key, only the newest one is kept: the
+        # queued one if there is one, else the last to fail.
+        other = aliased(Job)
+        superseded = select(other.id).where(
+            other.key == Job.key,
+            (other.state == "queued") | ((other.state == "failed") & (other.id > Job.id)),
+        ).exists()
+        db.session.execute(delete(Job).where(Job.state == "failed", Job.key.is_not(None), superseded))
+        count = db.session.execute(
+            update(Job).where(Job.state == "failed")
+            .values(state="queued", attempts=0, run_at=datetime.now(), error=None)
+        ).rowcount
+        db.session.commit()
+        return count
+
+    def stats(self):
+        """Jobs per state, and the age of the oldest due queued job in seconds."""
+        now = datetime.now()
+        counts = {"queued": 0, "running": 0, "failed": 0}
+        oldest = None
+        rows = db.session.execute(
+            select(Job.state, func.count(), func.min(case((Job.run_at <= now, Job.run_at))))
+            .group_by(Job.state)
+        )
+        for state, count, due in rows:
+            counts[state] = count
+            if state == "queued" and due is not None:
+                oldest = due
+        counts["oldest_due_seconds"] = (now - oldest).total_seconds() if oldest else 0
+        return counts
+
+
+job_queue = JobQueue()
+
+
+def _run_eagerly(app, ids):
+    with app.app_context():
+        try:
+            for job in job_queue.claim(len(ids), ids=sorted(ids)):
+                job_queue.run(job)
+        finally:
+            db.session.remove()
+
+
+def _run_after_response(app, ids, response):
+    response.call_on_close(partial(_run_eagerly, app, ids))
+    return response
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_jobs(session):
+    ids = session.info.pop("jobs_enqueued", None)
+    if not ids or not has_request_context() or not current_app.config["JOBS_EAGER"]:
+        return
+    if "jobs_enqueued" not in g:
+        g.jobs_enqueued = set()
+        after_this_request(partial(_run_after_response, current_app._get_current_object(), g.jobs_enqueued))
+    g.jobs_enqueued |= ids
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_jobs(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+@click.command("worker", help="Run queued background jobs.")
+@click.option("--concurrency", "-c", default=2, show_default=True, help="Jobs run at once, one per thread.")
+@click.option("--burst", is_flag=True, help="Exit once no job is due instead of waiting for more.")
+@click.option("--batch", default=10, show_default=True, help="Jobs claimed at once by each thread.")
+@click.option("--poll", default=1.0, show_default=True, help="Seconds between polls of an empty queue.")
+@click.option("--retry-failed", is_flag=True, help="Queue the failed jobs again first.")
+@with_appcontext
+def worker_command(concurrency, burst, batch, poll, retry_failed):
+    app = current_app._get_current_object()
+    if retry_failed:
+        click.echo(f"{job_queue.retry_failed()} failed jobs queued again.")
+    stop = threading.Event()
+
+    def work():
+        with app.app_context():
+            try:
+                job_queue.work(stop, burst, poll, batch)
+            finally:
+                db.session.remove()
+
+    def shut_down(signum, frame):
+        # Jobs already claimed are finished, the rest left queued.
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shut_down)
+    signal.signal(signal.SIGINT, shut_down)
+    threads = [threading.Thread(target=work, name=f"worker-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(0.5)
+    click.echo(f"Stopped; {job_queue.stats()['queued']} jobs queued.")
@@ -0,0 +1,28 @@
+"""show listing indexes
+
+* ``(venue_id, time)`` on Show for the show counts of the /venues areas.
+* ``(time, id)`` on Show for the keyset-paginated /shows listing.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 01:45:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_time', 'Show', ['venue_id', 'time'], unique=False)
+    op.create_index('ix_Show_time_id', 'Show', ['time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_time_id', table_name='Show')
+    op.drop_index('ix_Show_venue_id_time', table_name='Show')
@@ -0,0 +1,46 @@
+"""name search indexes
+
+On PostgreSQL, GIN indexes on the names of venues and artists: a
+``simple`` tsvector for word prefixes and a pg_trgm index for substring
+matching and similarity ranking. Other databases search in process.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 01:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        op.create_index(
+            f'ix_{table}_name_tsv', table,
+            [sa.text("to_tsvector('simple', coalesce(name, ''))")],
+            postgresql_using='gin'
+        )
+        op.create_index(
+            f'ix_{table}_name_trgm', table, ['name'],
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_name_tsv', table_name=table)
@@ -0,0 +1,42 @@
+"""unique genre types
+
+A unique constraint on ``Genre.type``, so that workers resolving genres
+by name (see genres.py) cannot create duplicates. Existing duplicates are
+merged first: venues and artists are linked to the oldest genre of each
+type, and the others are deleted. Links made duplicate by the merge are
+removed by 0006.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 02:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+ASSOCIATIONS = ('venue_genre', 'artist_genre')
+# Oldest genre of the type of ``{genre_id}``.
+KEPT = 'SELECT min(kept.id) FROM "Genre" kept JOIN "Genre" g ON g.type = kept.type WHERE g.id = {genre_id}'
+DUPLICATES = 'SELECT g.id FROM "Genre" g WHERE g.id > (SELECT min(kept.id) FROM "Genre" kept WHERE kept.type = g.type)'
+
+
+def upgrade():
+    for table in ASSOCIATIONS:
+        op.execute(
+            f'UPDATE {table} SET genre_id = ({KEPT.format(genre_id=f"{table}.genre_id")}) '
+            f'WHERE genre_id IN ({DUPLICATES})'
+        )
+    op.execute(f'DELETE FROM "Genre" WHERE id IN ({DUPLICATES})')
+    with op.batch_alter_table('Genre') as batch_op:
+        batch_op.create_unique_constraint('Genre_type_key', ['type'])
+
+
+def downgrade():
+    with op.batch_alter_table('Genre') as batch_op:
+        batch_op.drop_constraint('Genre_type_key', type_='unique')
@@ -0,0 +1,66 @@
+"""indexes for hot query paths
+
+* ``(state, city)`` on Venue for the area grouping of /venues.
+* ``(venue_id, time, id)`` and ``(artist_id, time, id)`` on Show for show
+  counts and the keyset-paginated shows of the detail pages; the first
+  replaces ``(venue_id, time)``.
+* Primary keys on the genre association tables, owner first, after
+  dropping duplicate links.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 02:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+ASSOCIATIONS = (('venue_genre', 'venue_id'), ('artist_genre', 'artist_id'))
+
+
+def _dedupe(table, owner):
+    op.execute(f'DELETE FROM {table} WHERE {owner} IS NULL OR genre_id IS NULL')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            f'DELETE FROM {table} a USING {table} b '
+            f'WHERE a.ctid > b.ctid AND a.{owner} = b.{owner} AND a.genre_id = b.genre_id'
+        )
+    else:
+        op.execute(
+            f'DELETE FROM {table} WHERE rowid NOT IN '
+            f'(SELECT min(rowid) FROM {table} GROUP BY {owner}, genre_id)'
+        )
+
+
+def upgrade():
+    op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city'], unique=False)
+    op.create_index('ix_Show_venue_id_time_id', 'Show', ['venue_id', 'time', 'id'], unique=False)
+    op.create_index('ix_Show_artist_id_time_id', 'Show', ['artist_id', 'time', 'id'], unique=False)
+    op.drop_index('ix_Show_venue_id_time', table_name='Show')
+
+    for table, owner in ASSOCIATIONS:
+        _dedupe(table, owner)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(owner, existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column('genre_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_primary_key(f'{table}_pkey', [owner, 'genre_id'])
+
+
+def downgrade():
+    for table, owner in ASSOCIATIONS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'{table}_pkey', type_='primary')
+            batch_op.alter_column(owner, existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column('genre_id', existing_type=sa.Integer(), nullable=True)
+
+    op.create_index('ix_Show_venue_id_time', 'Show', ['venue_id', 'time'], unique=False)
+    op.drop_index('ix_Show_artist_id_time_id', table_name='Show')
+    op.drop_index('ix_Show_venue_id_time_id', table_name='Show')
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
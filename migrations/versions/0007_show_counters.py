@@ -0,0 +1,64 @@
+"""materialized upcoming/past show counters
+
+* ``upcoming_shows_count`` and ``past_shows_count`` on Venue and Artist,
+  backfilled against a rollover watermark set to the time of the upgrade.
+* ``ShowCounterRollover`` holding that watermark.
+* On PostgreSQL, ``(state, city)`` on Venue covers the listing columns.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 03:10:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+OWNERS = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+
+def upgrade():
+    for table, _ in OWNERS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    rollover = op.create_table('ShowCounterRollover',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_up_to', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    now = datetime.now()
+    op.bulk_insert(rollover, [{'id': 1, 'rolled_up_to': now}])
+
+    for table, owner in OWNERS:
+        op.get_bind().execute(sa.text(
+            f'UPDATE "{table}" SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{owner} = "{table}".id AND "Show".time > :now), '
+            f'past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{owner} = "{table}".id AND "Show".time <= :now)'
+        ), {'now': now})
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_Venue_state_city', table_name='Venue')
+        op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city'], unique=False,
+                        postgresql_include=['id', 'name', 'upcoming_shows_count'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_Venue_state_city', table_name='Venue')
+        op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city'], unique=False)
+
+    op.drop_table('ShowCounterRollover')
+    for table, _ in OWNERS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
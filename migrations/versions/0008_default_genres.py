@@ -0,0 +1,41 @@
+"""default genres
+
+The venue and artist forms read their genre choices from the Genre table
+instead of a list in forms.py; this adds the genres of that list that a
+database does not have yet.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 05:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+)
+
+
+def upgrade():
+    insert = sa.text(
+        'INSERT INTO "Genre" (type) SELECT :type '
+        'WHERE NOT EXISTS (SELECT 1 FROM "Genre" WHERE type = :type)'
+    )
+    for genre in GENRES:
+        op.get_bind().execute(insert, {'type': genre})
+
+
+def downgrade():
+    # Genres may be linked to venues and artists by now, or may have
+    # existed before the upgrade; they are left in place.
+    pass
@@ -0,0 +1,54 @@
+"""show calendar
+
+* ``ShowMonthCount``, shows per month and venue location for the date
+  picker of /shows, backfilled from the Show table.
+* ``(city, state)`` on Venue for the city filter of /shows.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 06:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowMonthCount',
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('shows', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('city', 'state', 'month')
+    )
+    op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        month = 'date_trunc(\'month\', "Show".time)::date'
+    else:
+        month = 'date("Show".time, \'start of month\')'
+    # Every location, then each one; venues without a location only count
+    # towards the former.
+    op.get_bind().execute(sa.text(
+        f'INSERT INTO "ShowMonthCount" (city, state, month, shows) '
+        f'SELECT \'\', \'\', {month}, count(*) FROM "Show" GROUP BY {month}'
+    ))
+    op.get_bind().execute(sa.text(
+        f'INSERT INTO "ShowMonthCount" (city, state, month, shows) '
+        f'SELECT coalesce("Venue".city, \'\'), coalesce("Venue".state, \'\'), {month}, count(*) '
+        f'FROM "Show" JOIN "Venue" ON "Venue".id = "Show".venue_id '
+        f'WHERE coalesce("Venue".city, \'\') != \'\' OR coalesce("Venue".state, \'\') != \'\' '
+        f'GROUP BY coalesce("Venue".city, \'\'), coalesce("Venue".state, \'\'), {month}'
+    ))
+
+
+def downgrade():
+    op.drop_index('ix_Venue_city_state', table_name='Venue')
+    op.drop_table('ShowMonthCount')
@@ -0,0 +1,57 @@
+"""show end time and booking constraints
+
+* ``end_time`` on Show, backfilled at two hours after ``time`` (the
+  default ``SHOW_DEFAULT_DURATION``).
+* On PostgreSQL, exclusion constraints keeping the shows of a venue, and
+  of an artist, from overlapping. Existing overlaps make the upgrade fail;
+  ``flask bookings report`` lists them.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 08:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+OWNERS = ('venue_id', 'artist_id')
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+    if postgres:
+        op.execute('UPDATE "Show" SET end_time = time + interval \'2 hours\'')
+    else:
+        # In the text format SQLAlchemy stores, fractional seconds included.
+        op.execute(
+            'UPDATE "Show" SET end_time = '
+            'strftime(\'%Y-%m-%d %H:%M:%S\', time, \'+2 hours\') || substr(time, 20)'
+        )
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+    if postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for owner in OWNERS:
+            op.create_exclude_constraint(
+                f'ex_Show_{owner}_booking', 'Show',
+                (owner, '='), (sa.text('tsrange(time, end_time)'), '&&'),
+                using='gist',
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for owner in OWNERS:
+            op.drop_constraint(f'ex_Show_{owner}_booking', 'Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
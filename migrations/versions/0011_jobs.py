@@ -0,0 +1,44 @@
+"""background jobs
+
+``Job``, the queue of work derived from writes (see jobs.py), with an
+index for claiming due jobs and a partial unique index merging queued
+jobs of the same key.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('args', sa.JSON(), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=True),
+    sa.Column('state', sa.String(length=16), server_default='queued', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_Job_state_run_at', 'Job', ['state', 'run_at'], unique=False)
+    op.create_index('ux_Job_key_queued', 'Job', ['key'], unique=True,
+                    postgresql_where=sa.text("state = 'queued'"),
+                    sqlite_where=sa.text("state = 'queued'"))
+
+
+def downgrade():
+    op.drop_index('ux_Job_key_queued', table_name='Job')
+    op.drop_index('ix_Job_state_run_at', table_name='Job')
+    op.drop_table('Job')
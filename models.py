@@ -1,28 +1,67 @@
+from datetime import timedelta
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from app import app
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# Trigram indexes back the substring/similarity part of name search.
+event.listen(
+    db.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+# The booking exclusion constraints on Show mix equality and range overlap.
+event.listen(
+    db.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql")
+)
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+
+def name_tsvector(column):
+    """Full-text expression indexed on, and searched against, a name column."""
+    return db.func.to_tsvector(
+        db.literal_column("'simple'"),
+        db.func.coalesce(column, db.literal_column("''"))
+    )
+
+
+def name_search_indexes(table, column):
+    """GIN indexes for name search; only created on PostgreSQL."""
+    return (
+        db.Index(f"ix_{table}_name_tsv", name_tsvector(column),
+                 postgresql_using="gin").ddl_if(dialect="postgresql"),
+        db.Index(f"ix_{table}_name_trgm", column,
+                 postgresql_using="gin",
+                 postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
 
 
 class Genre(db.Model):
     __tablename__ = "Genre"
 
     id = db.Column(db.Integer, primary_key=True)
-    type = db.Column(db.String())
+    type = db.Column(db.String(), unique=True)
 
 
+# Keyed on the owner first, which is how genres are loaded for a page.
 artist_genre = db.Table(
     "artist_genre",
     db.Column("genre_id", db.ForeignKey("Genre.id")),
-    db.Column("artist_id", db.ForeignKey("Artist.id"))
+    db.Column("artist_id", db.ForeignKey("Artist.id")),
+    db.PrimaryKeyConstraint("artist_id", "genre_id")
 )
 
 venue_genre = db.Table(
     "venue_genre",
     db.Column("genre_id", db.ForeignKey("Genre.id")),
-    db.Column("venue_id", db.ForeignKey("Venue.id"))
+    db.Column("venue_id", db.ForeignKey("Venue.id")),
+    db.PrimaryKeyConstraint("venue_id", "genre_id")
 )
 
 
@@ -38,10 +77,27 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String())
-    shows = db.relationship("Show", backref="venue", lazy=False)
-    genres = db.relationship("Genre", secondary=venue_genre, lazy=False)
+    # A venue's shows are deleted with it; load them first.
+    shows = db.relationship("Show", backref=db.backref("venue", lazy="raise"), lazy="raise",
+                            cascade="all, delete")
+    genres = db.relationship("Genre", secondary=venue_genre, lazy="raise")
     seeking_talents = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
+    # Bumped whenever the venue or anything rendered on its page changes.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Maintained by counters.py, relative to the last rollover.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Area grouping of /venues, keyset-paginated on (state, city); the
+        # included columns make the listing an index-only read.
+        db.Index("ix_Venue_state_city", "state", "city",
+                 postgresql_include=["id", "name", "upcoming_shows_count"]),
+        # City filter of the /shows calendar, with or without a state.
+        db.Index("ix_Venue_city_state", "city", "state"),
+        *name_search_indexes("Venue", name),
+    )
 
 
 class Artist(db.Model):
@@ -54,11 +110,36 @@ class Artist(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    shows = db.relationship("Show", backref="artist", lazy=False)
+    shows = db.relationship("Show", backref=db.backref("artist", lazy="raise"), lazy="raise")
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(255))
     website_link = db.Column(db.String(255))
-    genres = db.relationship("Genre", secondary=artist_genre, lazy=False)
+    genres = db.relationship("Genre", secondary=artist_genre, lazy="raise")
+    # Bumped whenever the artist or anything rendered on its page changes.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Maintained by counters.py, relative to the last rollover.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = name_search_indexes("Artist", name)
+
+
+def _default_end_time(context):
+    minutes = current_app.config["SHOW_DEFAULT_DURATION"]
+    return context.get_current_parameters()["time"] + timedelta(minutes=minutes)
+
+
+def booking_constraint(column):
+    """No two shows of the same venue or artist overlap; PostgreSQL only.
+
+    Elsewhere bookings.py checks bookings before they are flushed.
+    """
+    return ExcludeConstraint(
+        (column, "="),
+        (db.func.tsrange(db.column("time"), db.column("end_time")), "&&"),
+        name=f"ex_Show_{column}_booking",
+        using="gist",
+    ).ddl_if(dialect="postgresql")
 
 
 class Show(db.Model):
@@ -68,3 +149,63 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
     time = db.Column(db.DateTime, nullable=False)
+    # Exclusive; defaults to SHOW_DEFAULT_DURATION after ``time``.
+    end_time = db.Column(db.DateTime, nullable=False, default=_default_end_time)
+
+    __table_args__ = (
+        # Show counts and the keyset-paginated upcoming/past shows of the
+        # venue and artist pages.
+        db.Index("ix_Show_venue_id_time_id", "venue_id", "time", "id"),
+        db.Index("ix_Show_artist_id_time_id", "artist_id", "time", "id"),
+        # Keyset pagination and date range of the /shows calendar.
+        db.Index("ix_Show_time_id", "time", "id"),
+        booking_constraint("venue_id"),
+        booking_constraint("artist_id"),
+    )
+
+
+# Single row: shows up to ``rolled_up_to`` are counted as past by the
+# upcoming/past show counters.
+class ShowCounterRollover(db.Model):
+    __tablename__ = "ShowCounterRollover"
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_up_to = db.Column(db.DateTime, nullable=False)
+
+
+# Shows per calendar month and venue location, maintained by counters.py
+# for the date picker of /shows. The row with an empty city and state
+# counts the shows of every location.
+class ShowMonthCount(db.Model):
+    __tablename__ = "ShowMonthCount"
+
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+# Work derived from a write, run by ``flask worker`` (see jobs.py). Rows
+# are deleted once their job has run, or kept as failed.
+class Job(db.Model):
+    __tablename__ = "Job"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    args = db.Column(db.JSON, nullable=False)
+    # Queued jobs with the same key are merged into one.
+    key = db.Column(db.String(255))
+    # "queued", "running" or "failed".
+    state = db.Column(db.String(16), nullable=False, default="queued", server_default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # When a queued job is due, or the lease of a running one ends.
+    run_at = db.Column(db.DateTime, nullable=False)
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        # Claiming due jobs, oldest first, and the queue depth metric.
+        db.Index("ix_Job_state_run_at", "state", "run_at"),
+        db.Index("ux_Job_key_queued", "key", unique=True,
+                 postgresql_where=db.text("state = 'queued'"),
+                 sqlite_where=db.text("state = 'queued'")),
+    )
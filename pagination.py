@@ -0,0 +1,80 @@
+"""Keyset (cursor) pagination for the listing views.
+
+A page is selected with ``WHERE (k1, k2, ...) > (:v1, :v2, ...)`` on the
+listing's sort key instead of ``OFFSET``, so every page is an index range
+scan of the same cost. The key of the last row is handed to the client as
+an opaque ``?after=`` cursor.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from werkzeug.exceptions import BadRequest
+
+from models import db
+
+
+class InvalidCursor(BadRequest):
+    description = "The pagination cursor is malformed."
+
+
+def encode_cursor(values):
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _typed(column, value):
+    python_type = column.type.python_type
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    # JSON has no other types to convert, but a forged cursor may hold any.
+    if not isinstance(value, python_type) or (isinstance(value, bool) and python_type is not bool):
+        raise TypeError(value)
+    return value
+
+
+def decode_cursor(cursor, columns):
+    """Turn a cursor back into key values typed after ``columns``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [_typed(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, NotImplementedError):
+        raise InvalidCursor()
+
+
+def after_key(stmt, columns, cursor, descending=False):
+    """Restrict ``stmt`` to rows sorting after ``cursor`` on ``columns``."""
+    if cursor:
+        key, values = tuple_(*columns), tuple_(*decode_cursor(cursor, columns))
+        stmt = stmt.where(key < values if descending else key > values)
+    if descending:
+        return stmt.order_by(*(column.desc() for column in columns))
+    return stmt.order_by(*columns)
+
+
+def keyset_page(stmt, columns, cursor=None, per_page=50, scalars=False, descending=False, session=None):
+    """Fetch one page of ``stmt`` ordered by ``columns``.
+
+    ``scalars`` selects ORM entities rather than rows. Returns
+    ``(items, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    session = session or db.session
+    stmt = after_key(stmt, columns, cursor, descending).limit(per_page + 1)
+    result = session.execute(stmt)
+    items = (result.scalars() if scalars else result).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in columns])
+
+    return items, next_cursor
@@ -0,0 +1,257 @@
+"""Per-request profiling, budgets and a Prometheus ``/metrics`` endpoint.
+
+For every request ``RequestProfiler`` records wall time, the number of SQL
+statements and the time spent in them (from engine events, so replicas
+are counted too), template render time and response size. They are sent
+back in a ``Server-Timing`` header and aggregated into per-endpoint
+histograms served at ``/metrics`` in the Prometheus text format, next to
+the page cache and connection pool stats. Metrics are per process.
+
+Requests over ``PROFILE_QUERY_BUDGET`` statements or
+``PROFILE_LATENCY_BUDGET`` milliseconds are logged as warnings and
+counted. With ``PROFILE_SAMPLE_RATE`` above 0, that fraction of requests
+runs under cProfile and the profile of any that turn out slow is dumped
+to ``PROFILE_DIR``.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from cache import page_cache
+from dbpool import db_pool
+from jobs import job_queue
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, float("inf"))
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760, float("inf"))
+
+
+class RequestProfile:
+    """What one request spent its time on."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.profiler = None
+        self._template_starts = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:g}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+HISTOGRAMS = {
+    "fyyur_request_duration_seconds": ("Request wall time.", DURATION_BUCKETS),
+    "fyyur_request_sql_seconds": ("Time spent in SQL per request.", DURATION_BUCKETS),
+    "fyyur_request_sql_queries": ("SQL statements per request.", QUERY_BUCKETS),
+    "fyyur_request_template_seconds": ("Template render time per request.", DURATION_BUCKETS),
+    "fyyur_response_size_bytes": ("Response body size.", SIZE_BUCKETS),
+}
+
+
+class Metrics:
+    """Per-endpoint histograms and counters."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.requests = {}
+        self.over_budget = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, status, values, over_budget):
+        with self._lock:
+            for name, value in values.items():
+                if value is None:
+                    continue
+                key = (name, endpoint)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(HISTOGRAMS[name][1])
+                self.histograms[key].observe(value)
+            self.requests[endpoint, status] = self.requests.get((endpoint, status), 0) + 1
+            for budget in over_budget:
+                self.over_budget[endpoint, budget] = self.over_budget.get((endpoint, budget), 0) + 1
+
+    def lines(self):
+        with self._lock:
+            for name, (help_text, _) in HISTOGRAMS.items():
+                yield f"# HELP {name} {help_text}"
+                yield f"# TYPE {name} histogram"
+                for (metric, endpoint), histogram in sorted(self.histograms.items()):
+                    if metric == name:
+                        yield from histogram.lines(name, f'endpoint="{endpoint}"')
+            yield "# HELP fyyur_requests_total Requests by endpoint and status."
+            yield "# TYPE fyyur_requests_total counter"
+            for (endpoint, status), count in sorted(self.requests.items()):
+                yield f'fyyur_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+            yield "# HELP fyyur_requests_over_budget_total Requests over the query or latency budget."
+            yield "# TYPE fyyur_requests_over_budget_total counter"
+            for (endpoint, budget), count in sorted(self.over_budget.items()):
+                yield f'fyyur_requests_over_budget_total{{endpoint="{endpoint}",budget="{budget}"}} {count}'
+
+
+def _gauge_lines(prefix, help_text, rows):
+    """Gauges for the numeric values of ``(labels, stats)`` rows."""
+    names = {}
+    for labels, stats in rows:
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                names.setdefault(f"{prefix}_{key}", []).append((labels, value))
+    for name, values in names.items():
+        yield f"# HELP {name} {help_text}"
+        yield f"# TYPE {name} gauge"
+        for labels, value in values:
+            yield f"{name}{{{labels}}} {value:g}" if labels else f"{name} {value:g}"
+
+
+def _pool_wait_lines(pools):
+    name = "fyyur_db_pool_checkout_wait_seconds"
+    yield f"# HELP {name} Time waited for a pooled connection."
+    yield f"# TYPE {name} histogram"
+    for bind, stats in pools.items():
+        histogram = Histogram(tuple(stats["wait_buckets"]))
+        histogram.counts = list(stats["wait_buckets"].values())
+        histogram.sum = stats["wait_seconds_total"]
+        yield from histogram.lines(name, f'bind="{bind}"')
+
+
+def _current_profile():
+    if has_request_context():
+        return g.get("profile")
+    return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    start = conn.info.pop("query_start", None)
+    if profile is not None and start is not None:
+        profile.queries += 1
+        profile.sql_time += time.perf_counter() - start
+
+
+def _start_template(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None:
+        profile._template_starts.append(time.perf_counter())
+
+
+def _end_template(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None and profile._template_starts:
+        profile.template_time += time.perf_counter() - profile._template_starts.pop()
+
+
+class RequestProfiler:
+    """Flask extension profiling every request and serving ``/metrics``."""
+
+    def __init__(self, app=None):
+        self.metrics = Metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(_start_template, app)
+        template_rendered.connect(_end_template, app)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view)
+
+    def _start(self):
+        g.profile = profile = RequestProfile()
+        rate = current_app.config.get("PROFILE_SAMPLE_RATE", 0)
+        if rate and random.random() < rate:
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+
+    def _finish(self, response):
+        profile = g.pop("profile", None)
+        if profile is None or request.endpoint == "metrics":
+            return response
+        if profile.profiler is not None:
+            profile.profiler.disable()
+        elapsed = profile.elapsed
+        config = current_app.config
+
+        over_budget = []
+        if profile.queries > config.get("PROFILE_QUERY_BUDGET", 20):
+            over_budget.append("queries")
+        if elapsed * 1000 > config.get("PROFILE_LATENCY_BUDGET", 500):
+            over_budget.append("latency")
+        if over_budget:
+            current_app.logger.warning(
+                "%s %s over budget: %.0fms, %d queries (%.0fms in SQL)",
+                request.method, request.path, elapsed * 1000, profile.queries, profile.sql_time * 1000
+            )
+            if profile.profiler is not None and "latency" in over_budget:
+                self._dump(profile.profiler)
+
+        response.headers["Server-Timing"] = ", ".join((
+            f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.queries} queries"',
+            f"tpl;dur={profile.template_time * 1000:.1f}",
+            f"app;dur={elapsed * 1000:.1f}",
+        ))
+        self.metrics.observe(request.endpoint or "none", response.status_code, {
+            "fyyur_request_duration_seconds": elapsed,
+            "fyyur_request_sql_seconds": profile.sql_time,
+            "fyyur_request_sql_queries": profile.queries,
+            "fyyur_request_template_seconds": profile.template_time,
+            # Streamed responses have no length up front.
+            "fyyur_response_size_bytes": response.content_length,
+        }, over_budget)
+        return response
+
+    def _dump(self, profiler):
+        directory = current_app.config.get("PROFILE_DIR", "profiles")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{request.endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        current_app.logger.warning("profile of %s written to %s", request.path, path)
+
+    def metrics_view(self):
+        lines = list(self.metrics.lines())
+        lines += _gauge_lines("fyyur_page_cache", "Page cache statistic.", [("", page_cache.stats())])
+        pools = db_pool.stats()
+        lines += _gauge_lines("fyyur_db_pool", "Connection pool statistic.", [
+            (f'bind="{bind}"', stats) for bind, stats in pools.items()
+        ])
+        lines += _pool_wait_lines(pools)
+        lines += _gauge_lines("fyyur_jobs", "Background job queue statistic.", [("", job_queue.stats())])
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+request_profiler = RequestProfiler()
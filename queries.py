@@ -0,0 +1,301 @@
+from datetime import datetime, time
+from itertools import groupby
+from operator import itemgetter
+
+from sqlalchemy import and_, case, exists, func, select
+
+from counters import add_months, month_of
+from models import db, Venue, Artist, Show, Genre, ShowMonthCount, venue_genre, artist_genre
+from pagination import after_key, decode_cursor, encode_cursor, keyset_page
+
+
+def venue_areas(after=None, per_page=20, session=None):
+    """Group venues by city/state together with their upcoming-show counts.
+
+    The page of areas is picked in a subquery, keyset-paginated on
+    (state, city), and its venues are read with their materialized
+    ``upcoming_shows_count`` (see ``counters.py``) in the same statement,
+    covered by the (state, city) index, so the listing costs a single round
+    trip whatever the catalogue size or page depth. One area more than a
+    page is picked to tell whether there is a next page; its venues are
+    dropped.
+
+    Returns ``(areas, next_cursor)`` where ``areas`` matches the structure
+    expected by ``pages/venues.html``.
+    """
+    area_key = (Venue.state, Venue.city)
+
+    areas = after_key(
+        select(Venue.city, Venue.state).group_by(Venue.city, Venue.state),
+        area_key,
+        after
+    ).limit(per_page + 1).subquery()
+
+    stmt = (
+        select(
+            Venue.city,
+            Venue.state,
+            Venue.id,
+            Venue.name,
+            Venue.upcoming_shows_count.label("num_upcoming_shows"),
+        )
+        .join(areas, and_(Venue.city == areas.c.city, Venue.state == areas.c.state))
+        .order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+    )
+
+    data = []
+    rows = (session or db.session).execute(stmt.execution_options(yield_per=1000))
+    for (city, state), area_rows in groupby(rows, key=itemgetter(0, 1)):
+        venues = []
+        for row in area_rows:
+            venues.append({
+                "id": row.id,
+                "name": row.name,
+                "num_upcoming_shows": row.num_upcoming_shows
+            })
+        data.append({
+            "city": city,
+            "state": state,
+            "venues": venues
+        })
+
+    next_cursor = None
+    if len(data) > per_page:
+        data = data[:per_page]
+        next_cursor = encode_cursor([data[-1]["state"], data[-1]["city"]])
+
+    return data, next_cursor
+
+
+def entity(model, entity_id, session=None):
+    """The venue or artist ``entity_id``, or None."""
+    return (session or db.session).get(model, entity_id)
+
+
+_GENRE_LINKS = {Venue: (venue_genre, venue_genre.c.venue_id), Artist: (artist_genre, artist_genre.c.artist_id)}
+
+
+def entity_genres(model, entity_id, session=None):
+    """Names of the genres of the venue or artist ``entity_id``."""
+    table, owner = _GENRE_LINKS[model]
+    stmt = select(Genre.type).join(table, table.c.genre_id == Genre.id).where(owner == entity_id)
+    return (session or db.session).execute(stmt).scalars().all()
+
+
+def show_counts(column, ids, now=None, session=None):
+    """Count upcoming and past shows for many venues or artists at once.
+
+    ``column`` is the Show foreign key to group by (``Show.venue_id`` or
+    ``Show.artist_id``). All ids are resolved with one aggregate query;
+    ids without shows are reported with zero counts.
+
+    Returns ``{id: {"upcoming": n, "past": m}}``.
+    """
+    now = now or datetime.now()
+    counts = {id_: {"upcoming": 0, "past": 0} for id_ in ids}
+    if not counts:
+        return counts
+
+    upcoming = func.sum(case((Show.time > now, 1), else_=0))
+    stmt = (
+        select(column, upcoming.label("upcoming"), func.count(Show.id).label("total"))
+        .where(column.in_(list(counts)))
+        .group_by(column)
+    )
+    for id_, num_upcoming, total in (session or db.session).execute(stmt):
+        counts[id_] = {"upcoming": num_upcoming, "past": total - num_upcoming}
+
+    return counts
+
+
+def stored_show_counts(model, ids, session=None):
+    """Read the materialized show counters of many venues or artists.
+
+    Unlike ``show_counts`` this is a primary key lookup, with counts as of
+    the last counter rollover (see ``counters.py``). Unknown ids are
+    reported with zero counts.
+
+    Returns ``{id: {"upcoming": n, "past": m}}``.
+    """
+    counts = {id_: {"upcoming": 0, "past": 0} for id_ in ids}
+    if not counts:
+        return counts
+
+    stmt = select(model.id, model.upcoming_shows_count, model.past_shows_count).where(
+        model.id.in_(list(counts))
+    )
+    for id_, upcoming, past in (session or db.session).execute(stmt):
+        counts[id_] = {"upcoming": upcoming, "past": past}
+
+    return counts
+
+
+# For each side of a show: the model on the other side, the foreign key
+# joining to it and the prefix used by the detail templates.
+_COUNTERPARTS = {
+    "venue_id": (Artist, Show.artist_id, "artist"),
+    "artist_id": (Venue, Show.venue_id, "venue"),
+}
+
+
+def entity_shows(column, entity_id, upcoming, after=None, limit=12, now=None, session=None):
+    """One page of a venue's or artist's upcoming or past shows.
+
+    ``column`` is ``Show.venue_id`` or ``Show.artist_id``. Shows are joined
+    to the other side in the same query; upcoming shows come soonest first,
+    past shows most recent first, both keyset-paginated on (time, id).
+
+    Returns ``(shows, next_cursor)``.
+    """
+    now = now or datetime.now()
+    counterpart, counterpart_id, prefix = _COUNTERPARTS[column.key]
+
+    stmt = (
+        select(
+            Show.id,
+            Show.time,
+            counterpart.id.label(f"{prefix}_id"),
+            counterpart.name.label(f"{prefix}_name"),
+            counterpart.image_link.label(f"{prefix}_image_link"),
+        )
+        .join(counterpart, counterpart.id == counterpart_id)
+        .where(column == entity_id, Show.time > now if upcoming else Show.time <= now)
+    )
+    rows, next_cursor = keyset_page(
+        stmt, (Show.time, Show.id), after, limit, descending=not upcoming, session=session
+    )
+
+    shows = []
+    for row in rows:
+        shows.append({
+            f"{prefix}_id": row[2],
+            f"{prefix}_name": row[3],
+            f"{prefix}_image_link": row[4],
+            "start_time": row.time
+        })
+
+    return shows, next_cursor
+
+
+def _at_location(city, state):
+    """Month count rows of a location; ``state`` only narrows ``city``."""
+    if not city:
+        return and_(ShowMonthCount.city == "", ShowMonthCount.state == "")
+    if state:
+        return and_(ShowMonthCount.city == city, ShowMonthCount.state == state)
+    return ShowMonthCount.city == city
+
+
+def _window_end(start, end, city, state, shows, session):
+    """Start of the month by which the location has had more than ``shows``
+    shows since the month of ``start``, going by the month counts; ``end``
+    if that is earlier or never comes."""
+    stmt = (
+        select(ShowMonthCount.month, func.sum(ShowMonthCount.shows))
+        .where(_at_location(city, state), ShowMonthCount.month >= month_of(start))
+        .group_by(ShowMonthCount.month)
+        .order_by(ShowMonthCount.month)
+    )
+    if end is not None:
+        stmt = stmt.where(ShowMonthCount.month < end)
+    seen = 0
+    for month, count in session.execute(stmt):
+        seen += count
+        if seen > shows:
+            bound = datetime.combine(add_months(month, 1), time.min)
+            return bound if end is None else min(bound, end)
+    return end
+
+
+def calendar_shows(start, end=None, city=None, state=None, genre_id=None, after=None, per_page=50,
+                   session=None):
+    """One page of the shows from ``start`` up to ``end``, grouped by day.
+
+    ``city`` (narrowed by ``state``) filters on the venue's location and
+    ``genre_id`` on the artist's genres. Shows are keyset-paginated on
+    (time, id) within the date range, so a page costs the same at any
+    depth. Without a city the page is a range scan of the (time, id)
+    index. With one, the city's venues come from the (city, state) index
+    and their shows from the (venue_id, time, id) one, which have to be
+    sorted; so the range is first cut down to the whole months that the
+    materialized month counts say hold enough shows for the page. A day
+    may continue on the next page.
+
+    Returns ``(days, next_cursor)`` with ``days`` as ``[(date, shows)]``.
+    """
+    stmt = (
+        select(
+            Show.id,
+            Show.time,
+            Show.end_time,
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .where(Show.time >= start)
+    )
+    if end is not None:
+        stmt = stmt.where(Show.time < end)
+    if city:
+        stmt = stmt.where(Venue.city == city)
+        if state:
+            stmt = stmt.where(Venue.state == state)
+    if genre_id is not None:
+        stmt = stmt.where(exists().where(
+            artist_genre.c.artist_id == Show.artist_id, artist_genre.c.genre_id == genre_id
+        ))
+    columns = (Show.time, Show.id)
+    session = session or db.session
+    rows, next_cursor = [], None
+    window_start = decode_cursor(after, columns)[0] if after else start
+    while True:
+        window_end = end
+        if city:
+            window_end = _window_end(window_start, end, city, state, per_page - len(rows), session)
+        window = stmt if window_end is None else stmt.where(Show.time < window_end)
+        page, next_cursor = keyset_page(window, columns, after, per_page - len(rows), session=session)
+        rows += page
+        if next_cursor or window_end == end:
+            break
+        if len(rows) == per_page:
+            next_cursor = encode_cursor([rows[-1].time, rows[-1].id])
+            break
+        # Fewer shows matched than the month counts promised, as happens
+        # with a genre filter: carry on from the end of the window.
+        window_start, after = window_end, encode_cursor([window_end, 0])
+
+    days = []
+    for day, day_rows in groupby(rows, key=lambda row: row.time.date()):
+        days.append((day, [{
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.time,
+            "end_time": row.end_time,
+        } for row in day_rows]))
+
+    return days, next_cursor
+
+
+def month_counts(first, last, city=None, state=None, session=None):
+    """Shows per month from the month ``first`` to the month ``last``.
+
+    Read from the counts materialized by ``counters.py`` rather than from
+    the Show table: at most one row per month and state the city is in.
+    ``first`` and ``last`` are first days of months; ``state`` only
+    narrows ``city``.
+
+    Returns ``{month: shows}`` for the months with shows.
+    """
+    stmt = (
+        select(ShowMonthCount.month, func.sum(ShowMonthCount.shows))
+        .where(_at_location(city, state), ShowMonthCount.month.between(first, last))
+        .group_by(ShowMonthCount.month)
+    )
+    return {month: int(shows) for month, shows in (session or db.session).execute(stmt) if shows}
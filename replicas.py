@@ -0,0 +1,146 @@
+"""Route read-only views to read replicas.
+
+Replica URLs come from ``DATABASE_REPLICA_URLS`` and are registered as
+Flask-SQLAlchemy binds ``replica_0``, ``replica_1``, ... Views decorated
+with ``@read_replica`` run with one replica chosen for the whole request
+(its rows must come from a single snapshot); ``RoutingSession`` sends
+their queries there and everything else, including any flush or DML
+statement, to the primary.
+
+A request goes to the primary instead when:
+
+* the user committed a write less than ``REPLICA_STICKY_SECONDS`` ago, so
+  they always see their own changes, or
+* every replica lags more than ``REPLICA_MAX_LAG`` seconds, or could not
+  be reached, at its last check. Lag is checked at most once every
+  ``REPLICA_LAG_CHECK_INTERVAL`` seconds per replica.
+
+Stand-in replicas for tests can be any databases with the same schema;
+``replica_router.lag_probe`` can be replaced to simulate lag.
+"""
+import random
+import threading
+import time
+
+from flask import current_app, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from dbpool import engine_options
+
+STICKY_KEY = "db_write_at"
+
+
+def replica_lag(engine):
+    """Seconds the replica behind ``engine`` trails its primary.
+
+    Stand-ins on other databases are only checked to be reachable.
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            conn.execute(text("SELECT 1"))
+            return 0.0
+        return conn.execute(text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )).scalar()
+
+
+class RoutingSession(FlaskSession):
+    """Session reading from ``info["replica"]``'s bind when one is set."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and bind is None and not self._flushing and not getattr(clause, "is_dml", False):
+            return self._db.engines[replica]
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+def read_replica(view):
+    """Mark a view as safe to serve from a read replica."""
+    view.read_replica = True
+    return view
+
+
+class ReplicaRouter:
+    """Flask extension registering replica binds and choosing one per request.
+
+    ``init_app`` must run before ``db.init_app``.
+    """
+
+    def __init__(self, app=None, lag_probe=replica_lag):
+        self.lag_probe = lag_probe
+        self._lags = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        for index, url in enumerate(app.config.get("DATABASE_REPLICA_URLS", [])):
+            binds[f"replica_{index}"] = {
+                **engine_options({**app.config, "SQLALCHEMY_DATABASE_URI": url}),
+                "url": url,
+            }
+        app.before_request(self._route)
+        app.teardown_request(self._unroute)
+
+    @property
+    def keys(self):
+        return [key for key in current_app.config.get("SQLALCHEMY_BINDS", {}) if key.startswith("replica_")]
+
+    def lag(self, key):
+        """Last measured lag of replica ``key``, re-measured when stale."""
+        now = time.monotonic()
+        checked, lag = self._lags.get(key, (None, None))
+        if checked is not None and now - checked < current_app.config.get("REPLICA_LAG_CHECK_INTERVAL", 1):
+            return lag
+        engine = current_app.extensions["sqlalchemy"].engines[key]
+        try:
+            lag = self.lag_probe(engine)
+        except SQLAlchemyError:
+            current_app.logger.warning("replica %s unreachable, reading from the primary", key)
+            lag = float("inf")
+        with self._lock:
+            self._lags[key] = (now, lag)
+        return lag
+
+    def choose(self):
+        """Bind key of a replica fit to serve this request, or None for the primary."""
+        written = flask_session.get(STICKY_KEY)
+        if written is not None and time.time() - written < current_app.config.get("REPLICA_STICKY_SECONDS", 5):
+            return None
+        max_lag = current_app.config.get("REPLICA_MAX_LAG", 2)
+        healthy = [key for key in self.keys if self.lag(key) <= max_lag]
+        return random.choice(healthy) if healthy else None
+
+    def _route(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if getattr(view, "read_replica", False):
+            replica = self.choose()
+            if replica is not None:
+                current_app.extensions["sqlalchemy"].session.info["replica"] = replica
+
+    def _unroute(self, exc):
+        current_app.extensions["sqlalchemy"].session.info.pop("replica", None)
+
+
+replica_router = ReplicaRouter()
+
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _stick_to_primary(session):
+    if session.info.pop("wrote", False) and has_request_context():
+        flask_session[STICKY_KEY] = time.time()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
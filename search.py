@@ -0,0 +1,226 @@
+"""Ranked name search for venues and artists.
+
+On PostgreSQL the search runs against the GIN indexes declared in models.py:
+a ``simple`` tsvector of the name for prefix matching of every word, and a
+pg_trgm index that serves substring (ILIKE) matching and similarity ranking.
+
+Other backends (SQLite test runs) use an in-process ``NameIndex`` that is
+built on the first search and kept current from committed ORM changes.
+"""
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+
+from sqlalchemy import event, func, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from models import db, name_tsvector, Venue, Artist
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# In-process indexes keyed by model, only used off PostgreSQL.
+_indexes = {}
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class NameIndex:
+    """Trigram and word-prefix index over ``(id, name)`` pairs.
+
+    Trigram postings are arrays of ids. Renaming or deleting a row takes its
+    id out of the postings and words of the old name, so they hold no stale
+    or duplicate entries.
+    """
+
+    def __init__(self, rows=()):
+        self.names = {}
+        self.lowered = {}
+        self.postings = {}
+        self.words = {}
+        self.sorted_words = []
+        for id_, name in rows:
+            self.add(id_, name, sort=False)
+        self.sorted_words.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, id_, name, sort=True):
+        self.remove(id_)
+        name = name or ""
+        lowered = name.lower()
+        self.names[id_] = name
+        self.lowered[id_] = lowered
+
+        for gram in _trigrams(lowered):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("i")
+            posting.append(id_)
+
+        for word in set(_tokens(lowered)):
+            ids = self.words.get(word)
+            if ids is None:
+                ids = self.words[word] = set()
+                if sort:
+                    self.sorted_words.insert(bisect_left(self.sorted_words, word), word)
+                else:
+                    self.sorted_words.append(word)
+            ids.add(id_)
+
+    def remove(self, id_):
+        lowered = self.lowered.pop(id_, None)
+        if lowered is None:
+            return
+        del self.names[id_]
+        for gram in _trigrams(lowered):
+            posting = self.postings[gram]
+            posting.remove(id_)
+            if not posting:
+                del self.postings[gram]
+        for word in set(_tokens(lowered)):
+            ids = self.words[word]
+            ids.discard(id_)
+            if not ids:
+                del self.words[word]
+                del self.sorted_words[bisect_left(self.sorted_words, word)]
+
+    def _substring_matches(self, term):
+        grams = _trigrams(term)
+        if grams:
+            rarest = min((self.postings.get(gram, ()) for gram in grams), key=len)
+            candidates = set(rarest)
+        else:
+            candidates = self.lowered.keys()
+        return {id_ for id_ in candidates if term in self.lowered.get(id_, "")}
+
+    def _prefix_matches(self, words):
+        matches = None
+        for prefix in words:
+            ids = set()
+            i = bisect_left(self.sorted_words, prefix)
+            while i < len(self.sorted_words) and self.sorted_words[i].startswith(prefix):
+                ids |= self.words[self.sorted_words[i]]
+                i += 1
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                break
+        return matches or set()
+
+    def search(self, term, limit):
+        term = term.strip().lower()
+        if not term:
+            return heapq.nsmallest(limit, self.names.items(), key=lambda item: item[1].lower())
+
+        words = _tokens(term)
+        prefix_matches = self._prefix_matches(words) if words else set()
+        substring_matches = self._substring_matches(term)
+
+        term_grams = _trigrams(term)
+
+        def rank(id_):
+            lowered = self.lowered[id_]
+            if id_ in substring_matches:
+                # The term's trigrams are a subset of the name's, so the
+                # trigram similarity reduces to a length ratio.
+                score = len(term) / len(lowered)
+            else:
+                score = _similarity(term_grams, _trigrams(lowered))
+            if id_ in prefix_matches:
+                score += 1.0
+            return -score, lowered
+
+        matches = substring_matches | prefix_matches
+        return [(id_, self.names[id_]) for id_ in heapq.nsmallest(limit, matches, key=rank)]
+
+
+def _sql_search(model, term, limit, session):
+    term = term.strip()
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    conditions = [model.name.ilike(f"%{escaped}%", escape="\\")]
+    rank = func.similarity(model.name, term)
+
+    words = _tokens(term)
+    if words:
+        vector = name_tsvector(model.name)
+        query = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{word}:*" for word in words))
+        conditions.append(vector.op("@@")(query))
+        rank = rank + func.ts_rank(vector, query)
+
+    stmt = (
+        select(model.id, model.name)
+        .where(or_(*conditions))
+        .order_by(rank.desc(), model.name)
+        .limit(limit)
+    )
+    return [(row.id, row.name) for row in session.execute(stmt)]
+
+
+def _name_index(model, session):
+    index = _indexes.get(model)
+    if index is None:
+        rows = session.execute(select(model.id, model.name).execution_options(yield_per=10000))
+        index = _indexes[model] = NameIndex(rows)
+    return index
+
+
+def search_names(model, term, limit=50, session=None):
+    """Best ``limit`` matches of ``term`` against ``model.name``.
+
+    A row matches when its name contains the term or when every word of the
+    term prefixes a word of the name. Results are ``(id, name)`` pairs,
+    best match first.
+    """
+    session = session or db.session
+    if session.get_bind().dialect.name == "postgresql":
+        return _sql_search(model, term, limit, session)
+    return _name_index(model, session).search(term, limit)
+
+
+def reset_index(model=None):
+    """Drop in-process indexes, e.g. after writes that bypass the ORM."""
+    if model is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(model, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_name_changes(session, flush_context):
+    changes = session.info.setdefault("search_index_changes", [])
+    for obj in session.new | session.dirty:
+        if isinstance(obj, (Venue, Artist)):
+            changes.append((type(obj), obj.id, obj.name))
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            changes.append((type(obj), obj.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_name_changes(session):
+    for model, id_, name in session.info.pop("search_index_changes", ()):
+        index = _indexes.get(model)
+        if index is None:
+            continue
+        if name is None:
+            index.remove(id_)
+        else:
+            index.add(id_, name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_name_changes(session):
+    session.info.pop("search_index_changes", None)
@@ -0,0 +1,122 @@
+"""Show pages: the calendar and the form."""
+from datetime import date, datetime, time, timedelta
+from functools import partial
+
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from werkzeug.exceptions import BadRequest
+
+from asyncdb import async_db
+from bookings import BookingConflict
+from counters import add_months
+from forms import ShowForm
+from genres import genre_registry
+from models import db, Show
+from queries import calendar_shows, month_counts
+from replicas import read_replica
+
+shows = Blueprint("shows", __name__, url_prefix="/shows")
+
+
+def _date_arg(name, default=None):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be a date, as YYYY-MM-DD.")
+
+
+@shows.route("")
+@read_replica
+async def listing():
+    start = _date_arg("from", date.today())
+    end = _date_arg("to")
+    city = request.args.get("city") or None
+    state = request.args.get("state") or None
+    genre = request.args.get("genre") or None
+    filters = {"city": city, "state": state, "genre": genre}
+
+    first_month = start.replace(day=1)
+    months = [add_months(first_month, n) for n in range(current_app.config["CALENDAR_MONTHS"])]
+    counts = await async_db.run(partial(month_counts, months[0], months[-1], city, state))
+    picker = [{
+        "month": month,
+        "shows": counts.get(month, 0),
+        "url": url_for("shows.listing", **{
+            "from": month.isoformat(),
+            "to": (add_months(month, 1) - timedelta(days=1)).isoformat(),
+        }, **filters),
+    } for month in months]
+
+    genre_id = genre and genre_registry.lookup(genre)
+    if genre and genre_id is None:
+        days, next_cursor = [], None
+    else:
+        days, next_cursor = await async_db.run(partial(
+            calendar_shows,
+            datetime.combine(start, time.min),
+            end and datetime.combine(end + timedelta(days=1), time.min),
+            city,
+            state,
+            genre_id,
+            request.args.get("after"),
+            current_app.config["LISTING_PAGE_SIZE"],
+        ))
+
+    range_args = {"from": start.isoformat(), "to": end and end.isoformat(), **filters}
+    return render_template(
+        "pages/shows.html",
+        days=days,
+        picker=picker,
+        earlier_url=url_for(
+            "shows.listing", **{"from": add_months(first_month, -len(months)).isoformat()}, **filters),
+        later_url=url_for(
+            "shows.listing", **{"from": add_months(first_month, len(months)).isoformat()}, **filters),
+        first_url=url_for("shows.listing", **range_args),
+        next_url=next_cursor and url_for("shows.listing", after=next_cursor, **range_args),
+        filters=filters,
+    )
+
+
+@shows.route("/create")
+def create_shows():
+    # renders form. do not touch.
+    form = ShowForm()
+    return render_template("forms/new_show.html", form=form)
+
+
+@shows.route("/create", methods=["POST"])
+def create_show_submission():
+    form = ShowForm()
+    if not form.validate():
+        flash(form.errors)
+        return redirect(url_for("index"))
+
+    flag = False
+    error = "error occurred while creating show"
+    try:
+        show = Show(
+            time=form.start_time.data,
+            end_time=form.end_time.data,
+            artist_id=int(form.artist_id.data),
+            venue_id=int(form.venue_id.data)
+        )
+        db.session.add(show)
+        db.session.commit()
+    except BookingConflict as e:
+        flag = True
+        error = f"Show could not be listed: {e}"
+        db.session.rollback()
+    except:
+        flag = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if not flag:
+        flash("Show was successfully listed!")
+        return render_template("pages/home.html")
+    else:
+        flash(error)
+        return render_template("pages/home.html")
@@ -0,0 +1,84 @@
+"""Test helpers: SQL statement budgets and an in-memory Redis stand-in.
+
+Relationships on the models are ``lazy="raise"``, so a view that forgets to
+declare a loading option fails loudly; these helpers catch the remaining
+case of a view that loads eagerly but issues more queries than it should.
+
+    with assert_max_queries(2):
+        client.post("/venues/search", data={"search_term": "a"})
+
+    assert_route_queries(client, "/venues/1", 3)
+"""
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from models import db
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect every statement sent to ``engine`` inside the block."""
+    engine = engine or db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """Fail if the block issues more than ``limit`` statements."""
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) > limit:
+        raise AssertionError(
+            f"{len(statements)} queries executed, expected at most {limit}:\n"
+            + "\n".join(statements)
+        )
+
+
+def assert_route_queries(client, url, limit, method="GET", **kwargs):
+    """Request ``url`` through a Flask test client within a query budget.
+
+    Extra keyword arguments are passed to the client call. Returns the
+    response so callers can make further assertions on it.
+    """
+    with assert_max_queries(limit):
+        response = client.open(url, method=method, **kwargs)
+    return response
+
+
+class FakeRedis:
+    """In-memory stand-in for the subset of redis-py used by the caches."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.data = {}
+
+    def get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= self.clock():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, self.clock() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def info(self, section=None):
+        return {"evicted_keys": 0}
@@ -0,0 +1,44 @@
+"""Fixtures: the app from its factory over a freshly seeded database.
+
+Every test gets the synthetic catalogue of ``benchmarks/dataset.py`` at
+``SHOWS`` shows, in an in-memory SQLite database unless
+``TEST_DATABASE_URL`` points elsewhere (its tables are dropped and
+recreated). The page cache is off and jobs are left queued, so requests
+issue every statement of their view and nothing runs after the response.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+# Read by config.py when the app is first built.
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", "sqlite://")
+os.environ["PAGE_CACHE_BACKEND"] = "none"
+os.environ["JOBS_EAGER"] = "false"
+
+import pytest
+
+from app import create_app
+from dataset import seed
+
+SHOWS = 200
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    # The forms are posted without a session to hold a CSRF token.
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def counts(app):
+    """Seed the catalogue; the test runs in an app context."""
+    with app.app_context():
+        yield seed(SHOWS)
+
+
+@pytest.fixture
+def client(app, counts):
+    return app.test_client()
@@ -0,0 +1,49 @@
+"""Content negotiation and conditional requests of the JSON API."""
+import json
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from api import NDJSON
+from models import db, Show
+
+
+def test_format_follows_accept(client, counts):
+    response = client.get("/api/v1/venues", headers={"Accept": NDJSON})
+    assert response.mimetype == NDJSON
+    assert len(response.get_data(as_text=True).splitlines()) == counts["venues"]
+
+    response = client.get("/api/v1/venues", headers={"Accept": "application/json"})
+    assert response.mimetype == "application/json"
+    assert len(json.loads(response.data)["data"]) == counts["venues"]
+
+
+def test_responses_vary_on_accept(client):
+    response = client.get("/api/v1/shows", headers={"Accept": NDJSON})
+    assert response.status_code == 200
+    assert "Accept" in response.vary
+
+    revalidated = client.get("/api/v1/shows", headers={"Accept": NDJSON, "If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert "Accept" in revalidated.vary
+
+
+def test_other_format_does_not_revalidate(client):
+    etag = client.get("/api/v1/shows", headers={"Accept": NDJSON}).headers["ETag"]
+    response = client.get("/api/v1/shows", headers={"Accept": "application/json", "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_rescheduled_and_moved_shows_change_the_etag(client):
+    etags = [client.get("/api/v1/shows").headers["ETag"]]
+    # The first show of the first page.
+    show = db.session.scalars(select(Show).order_by(Show.time, Show.id)).first()
+    for change in (
+        lambda: setattr(show, "end_time", show.end_time + timedelta(minutes=30)),
+        lambda: setattr(show, "time", show.time + timedelta(minutes=15)),
+        lambda: setattr(show, "venue_id", show.venue_id % 2 + 1),
+    ):
+        change()
+        db.session.commit()
+        etags.append(client.get("/api/v1/shows").headers["ETag"])
+    assert len(set(etags)) == len(etags)
@@ -0,0 +1,85 @@
+"""Views in async mode, on a SQLite file through aiosqlite."""
+import asyncio
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from app import create_app
+from asyncdb import async_db
+from dataset import seed
+from models import db, Artist, Venue
+from queries import entity
+from testing import count_queries
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("greenlet")
+
+
+@pytest.fixture
+def async_app(tmp_path, monkeypatch):
+    settings = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    settings.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'async.db'}",
+        ASYNC_VIEWS=True,
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+    )
+    app = create_app(SimpleNamespace(**settings))
+    # A loop and engines of this test's own, not those of another app.
+    monkeypatch.setattr(async_db, "_pid", None)
+    with app.app_context():
+        seed(50)
+        db.session.remove()
+        yield app
+        loop, engines = async_db._process_state()
+        for engine in engines.values():
+            loop.submit(engine.dispose()).result()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _async_engine(app):
+    with app.test_request_context():
+        return async_db.engine().sync_engine
+
+
+@pytest.mark.parametrize("path", ["/venues/1", "/artists/1"])
+def test_detail_pages_query_the_async_engine(async_app, monkeypatch, path):
+    client = async_app.test_client()
+    engine = _async_engine(async_app)
+    with count_queries(engine) as queries:
+        page = client.get(path)
+    assert page.status_code == 200
+    # The five gathered queries; the ETag's version lookup runs alone.
+    assert len(queries) == 5
+
+    monkeypatch.setitem(async_app.config, "ASYNC_VIEWS", False)
+    assert client.get(path).data == page.data
+
+
+@pytest.mark.parametrize("path", ["/venues", "/artists", "/shows"])
+def test_listings_keep_the_sync_path(async_app, path):
+    client = async_app.test_client()
+    engine = _async_engine(async_app)
+    with count_queries(engine) as queries:
+        assert client.get(path).status_code == 200
+    assert not queries
+
+
+def test_missing_entity_is_not_found(async_app):
+    assert async_app.test_client().get("/venues/100000").status_code == 404
+
+
+def test_views_may_await_other_awaitables(async_app):
+    @async_app.route("/_pair")
+    async def pair():
+        await asyncio.sleep(0)
+        venue, artist = await async_db.gather(partial(entity, Venue, 1), partial(entity, Artist, 1))
+        timed = await asyncio.wait_for(asyncio.sleep(0, result=venue.name), timeout=1)
+        return {"venue": timed, "artist": artist.name}
+
+    response = async_app.test_client().get("/_pair")
+    assert response.status_code == 200
+    assert response.json["venue"] and response.json["artist"]
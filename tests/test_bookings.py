@@ -0,0 +1,71 @@
+"""Overlap checks of batches of bookings, against a walk over every pair."""
+import random
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from bookings import Conflict, SIDES, _conflict_order, find_conflicts
+from dataset import NOW
+from models import db, Show
+
+
+def _naive(bookings, shows):
+    # Shows moved by the batch are checked at their new times only.
+    moved = {booking.get("id") for booking in bookings}
+    conflicts = []
+    for index, booking in enumerate(bookings):
+        for side, key in SIDES:
+            def overlap(other):
+                return (
+                    other[key] == booking[key]
+                    and other["time"] < booking["end_time"] and other["end_time"] > booking["time"]
+                )
+            conflicts += [Conflict(index, side, other, None) for other in range(index) if overlap(bookings[other])]
+            conflicts += [
+                Conflict(index, side, None, show["id"]) for show in shows
+                if overlap(show) and show["id"] not in moved
+            ]
+    return sorted(conflicts, key=_conflict_order)
+
+
+def test_batches_match_a_naive_check(counts):
+    shows = [row._asdict() for row in db.session.execute(
+        select(Show.id, Show.venue_id, Show.artist_id, Show.time, Show.end_time)
+    )]
+    rng = random.Random(1)
+    for size in (1, 7, 150):
+        bookings = []
+        for _ in range(size):
+            if rng.random() < 0.3:
+                booking = dict(rng.choice(shows))
+                booking["time"] += timedelta(minutes=rng.randint(-180, 180))
+            else:
+                booking = {
+                    "venue_id": rng.randint(1, counts["venues"]),
+                    "artist_id": rng.randint(1, counts["artists"]),
+                    # Spread over years, so that each owner has several ranges.
+                    "time": NOW + timedelta(days=rng.randint(-700, 700), minutes=rng.randint(0, 1440)),
+                }
+            booking["end_time"] = booking["time"] + timedelta(minutes=rng.randint(30, 240))
+            bookings.append(booking)
+        assert find_conflicts(db.session, bookings) == _naive(bookings, shows)
+
+
+def test_batch_reports_earlier_overlaps_only(counts):
+    start = NOW + timedelta(days=900)
+    bookings = [
+        {"venue_id": 1, "artist_id": 1, "time": start + timedelta(hours=1), "end_time": start + timedelta(hours=3)},
+        {"venue_id": 1, "artist_id": 2, "time": start, "end_time": start + timedelta(hours=2)},
+        {"venue_id": 2, "artist_id": 2, "time": start + timedelta(hours=2), "end_time": start + timedelta(hours=4)},
+    ]
+    assert find_conflicts(db.session, bookings) == [Conflict(1, "venue", 0, None)]
+
+
+def test_booking_overlapping_the_batch_and_an_existing_show(counts):
+    show = db.session.execute(select(Show.id, Show.venue_id, Show.time).limit(1)).one()
+    bookings = [
+        {"venue_id": show.venue_id, "artist_id": 1, "time": show.time, "end_time": show.time + timedelta(hours=1)},
+        {"venue_id": show.venue_id, "artist_id": 2, "time": show.time, "end_time": show.time + timedelta(hours=1)},
+    ]
+    conflicts = [c for c in find_conflicts(db.session, bookings) if c.index == 1 and c.side == "venue"]
+    assert conflicts == [Conflict(1, "venue", 0, None), Conflict(1, "venue", None, show.id)]
@@ -0,0 +1,155 @@
+"""Page cache backends and the version bumps that invalidate them."""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+
+from cache import LRUCache, RedisCache, page_key
+from dataset import NOW
+from jobs import job_queue
+from models import db, Artist, Show, Venue
+from testing import FakeRedis
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_lru_get_set(clock):
+    cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+    assert cache.get("a") is None
+    cache.set("a", "page a")
+    assert cache.get("a") == "page a"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 1}
+
+
+def test_lru_expires_entries(clock):
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.set("a", "page a")
+    clock.now = 9.9
+    assert cache.get("a") == "page a"
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 1, "size": 0}
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = LRUCache(maxsize=2, clock=clock)
+    cache.set("a", "page a")
+    cache.set("b", "page b")
+    cache.get("a")
+    cache.set("c", "page c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "page a"
+    assert cache.get("c") == "page c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_delete(clock):
+    cache = LRUCache(clock=clock)
+    cache.set("a", "page a")
+    cache.delete("a", "missing")
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_redis_get_set(clock):
+    cache = RedisCache(FakeRedis(clock), ttl=10)
+    assert cache.get("a") is None
+    cache.set("a", "page é")
+    assert cache.client.data["a"][0] == "page é".encode()
+    assert cache.get("a") == "page é"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_redis_expires_entries(clock):
+    cache = RedisCache(FakeRedis(clock), ttl=10)
+    cache.set("a", "page a")
+    clock.now = 10
+    assert cache.get("a") is None
+
+
+def test_redis_delete(clock):
+    cache = RedisCache(FakeRedis(clock))
+    cache.set("a", "page a")
+    cache.set("b", "page b")
+    cache.delete("a", "b")
+    cache.delete()
+    assert cache.client.data == {}
+
+
+@pytest.fixture(params=["lru", "redis"])
+def backend(request, app, monkeypatch):
+    backend = LRUCache() if request.param == "lru" else RedisCache(FakeRedis())
+    monkeypatch.setitem(app.extensions, "page_cache", backend)
+    return backend
+
+
+def _versions(model):
+    return dict(db.session.execute(select(model.id, model.version)).all())
+
+
+def test_detail_page_served_from_cache(client, backend):
+    first = client.get("/venues/1")
+    assert backend.get(page_key(Venue, 1, _versions(Venue)[1])) is not None
+    assert client.get("/venues/1").data == first.data
+    assert backend.stats()["hits"] >= 2
+
+
+def test_edit_bumps_version_and_deletes_stale_page(client, backend):
+    client.get("/venues/1")
+    version = _versions(Venue)[1]
+    stale = page_key(Venue, 1, version)
+
+    db.session.get(Venue, 1).phone = "5125550199"
+    db.session.flush()
+    # Bumped in the flush's transaction; the page goes once it commits.
+    assert _versions(Venue)[1] == version + 1
+    assert backend.get(stale) is not None
+    db.session.commit()
+    assert backend.get(stale) is None
+
+
+def test_rollback_keeps_page(client, backend):
+    client.get("/venues/1")
+    version = _versions(Venue)[1]
+
+    db.session.get(Venue, 1).phone = "5125550199"
+    db.session.flush()
+    db.session.rollback()
+    assert _versions(Venue)[1] == version
+    assert backend.get(page_key(Venue, 1, version)) is not None
+
+
+def test_new_show_bumps_its_venue_and_artist(counts):
+    venues, artists = _versions(Venue), _versions(Artist)
+    start = NOW + timedelta(days=900)
+    db.session.add(Show(venue_id=2, artist_id=3, time=start, end_time=start + timedelta(hours=2)))
+    db.session.commit()
+
+    assert _versions(Venue) == {**venues, 2: venues[2] + 1}
+    assert _versions(Artist) == {**artists, 3: artists[3] + 1}
+
+
+def test_rename_bumps_counterparts_through_a_job(counts):
+    artist_ids = set(db.session.execute(select(Show.artist_id).where(Show.venue_id == 1)).scalars())
+    artists = _versions(Artist)
+
+    db.session.get(Venue, 1).name = "Renamed Hall"
+    db.session.commit()
+    assert _versions(Artist) == artists
+
+    for job in job_queue.claim(10):
+        assert job_queue.run(job)
+    assert _versions(Artist) == {
+        id_: version + (id_ in artist_ids) for id_, version in artists.items()
+    }
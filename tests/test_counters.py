@@ -0,0 +1,77 @@
+"""Materialized show counters across a rollover, and drift checks."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from counters import check, month_of, rollover
+from models import db, Artist, Show, ShowCounterRollover, ShowMonthCount, Venue
+
+
+def _counts(model, id_):
+    db.session.expire_all()
+    entity = db.session.get(model, id_)
+    return entity.upcoming_shows_count, entity.past_shows_count
+
+
+def _month_count(city, state, month):
+    return db.session.scalar(select(ShowMonthCount.shows).where(
+        ShowMonthCount.city == city, ShowMonthCount.state == state, ShowMonthCount.month == month
+    )) or 0
+
+
+def test_rollover_moves_a_started_show_to_past(counts):
+    venue = Venue(name="Rollover Hall", city="Rollover City", state="TX", address="1 Main St")
+    artist = Artist(name="Rollover Band", city="Austin", state="TX")
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    rolled_up_to = db.session.get(ShowCounterRollover, 1).rolled_up_to
+    start = rolled_up_to + timedelta(hours=1)
+    month = month_of(start)
+    everywhere = _month_count("", "", month)
+
+    db.session.add(Show(venue_id=venue.id, artist_id=artist.id, time=start, end_time=start + timedelta(hours=2)))
+    db.session.commit()
+    assert _counts(Venue, venue.id) == _counts(Artist, artist.id) == (1, 0)
+    assert _month_count("Rollover City", "TX", month) == 1
+    assert _month_count("", "", month) == everywhere + 1
+
+    # A rollover short of the show leaves it upcoming.
+    rollover(now=start - timedelta(minutes=1))
+    assert _counts(Venue, venue.id) == (1, 0)
+    assert rollover(now=start + timedelta(minutes=1)) >= 1
+    assert _counts(Venue, venue.id) == _counts(Artist, artist.id) == (0, 1)
+    assert db.session.get(ShowCounterRollover, 1).rolled_up_to == start + timedelta(minutes=1)
+    # Month counts do not depend on the watermark.
+    assert _month_count("Rollover City", "TX", month) == 1
+    assert _month_count("", "", month) == everywhere + 1
+    assert check() == []
+
+    # An earlier time moves nothing back.
+    assert rollover(now=start) == 0
+    assert _counts(Venue, venue.id) == (0, 1)
+
+
+def test_check_flags_and_repairs_corrupted_counters(counts):
+    show = db.session.scalars(select(Show).order_by(Show.id)).first()
+    venue = db.session.get(Venue, show.venue_id)
+    key = (venue.city, venue.state, month_of(show.time))
+    stored_counts = _counts(Venue, venue.id)
+    stored_month = _month_count(*key)
+    assert check() == []
+
+    db.session.execute(update(Venue).where(Venue.id == venue.id)
+                       .values(upcoming_shows_count=Venue.upcoming_shows_count + 3))
+    db.session.execute(update(ShowMonthCount).where(
+        ShowMonthCount.city == key[0], ShowMonthCount.state == key[1], ShowMonthCount.month == key[2]
+    ).values(shows=0))
+    db.session.commit()
+
+    drift = check()
+    assert (Venue, venue.id, (stored_counts[0] + 3, stored_counts[1]), stored_counts) in drift
+    assert (ShowMonthCount, key, 0, stored_month) in drift
+    assert len(drift) == 2
+
+    assert len(check(repair=True)) == 2
+    assert check() == []
+    assert _counts(Venue, venue.id) == stored_counts
+    assert _month_count(*key) == stored_month
@@ -0,0 +1,34 @@
+"""The ``datetime`` and ``datetimes`` template filters."""
+from datetime import datetime
+
+from filters import format_datetime, format_datetimes
+
+TIMES = [datetime(2026, 1, 2, 20, 0), datetime(2026, 1, 2, 20, 0), datetime(2026, 3, 4, 9, 30)]
+
+
+def test_batch_matches_single_values():
+    for format in ("full", "medium", "h:mma", "long"):
+        assert format_datetimes(TIMES, format) == [format_datetime(value, format) for value in TIMES]
+
+
+def test_formats_strings_and_datetimes_alike():
+    assert format_datetimes(["2026-01-02 20:00:00", TIMES[0]], "full") == [
+        "Friday January, 2, 2026 at 8:00PM", "Friday January, 2, 2026 at 8:00PM",
+    ]
+    assert format_datetimes([]) == []
+
+
+def test_listing_templates_format_a_column(app, client, counts, monkeypatch):
+    calls = []
+
+    def datetimes(values, *args):
+        values = list(values)
+        calls.append(len(values))
+        return format_datetimes(values, *args)
+
+    monkeypatch.setitem(app.jinja_env.filters, "datetimes", datetimes)
+    app.jinja_env.cache.clear()
+    response = client.get("/venues/1/shows/past")
+    assert response.status_code == 200
+    assert sum(calls) > 0
+    assert sum(calls) == response.get_data(as_text=True).count("<h6>")
@@ -0,0 +1,35 @@
+"""Genre choices of the forms, and genres brought by imported catalogues."""
+from sqlalchemy import insert, select
+
+from genres import genre_registry
+from importer import import_rows
+from models import db, Genre
+from testing import assert_max_queries
+
+
+def test_choices_do_not_query_within_the_interval(counts):
+    genre_registry.choices()
+    with assert_max_queries(0):
+        genre_registry.choices()
+
+
+def test_choices_pick_up_genres_of_other_workers(app, counts, monkeypatch):
+    genre_registry.choices()
+    db.session.execute(insert(Genre).values(type="Sea Shanty"))
+    db.session.commit()
+    assert ("Sea Shanty", "Sea Shanty") not in genre_registry.choices()
+
+    monkeypatch.setitem(app.config, "GENRE_REFRESH_INTERVAL", 0)
+    assert ("Sea Shanty", "Sea Shanty") in genre_registry.choices()
+
+
+def test_import_creates_unknown_genres(counts):
+    row = {
+        "name": "The Harbour", "city": "Portland", "state": "ME", "address": "1 Pier St",
+        "facebook_link": "https://www.facebook.com/harbour", "genres": ["Blues", "Sea Shanty"],
+    }
+    rejects = []
+    assert import_rows("venues", [row], rejects=lambda row, error: rejects.append(error)) == (1, 0)
+    assert rejects == []
+    assert db.session.scalar(select(Genre.id).where(Genre.type == "Sea Shanty")) is not None
+    assert ("Sea Shanty", "Sea Shanty") in genre_registry.choices()
@@ -0,0 +1,53 @@
+"""Release digest of the templates and static files behind page ETags."""
+import os
+
+import pytest
+
+from httpcache import HttpCache
+
+
+@pytest.fixture
+def folders(app, tmp_path, monkeypatch):
+    static, templates = tmp_path / "static", tmp_path / "templates"
+    static.mkdir()
+    templates.mkdir()
+    (static / "main.css").write_text("body {}")
+    (templates / "page.html").write_text("{{ page }}")
+    monkeypatch.setattr(app, "static_folder", str(static))
+    monkeypatch.setattr(app, "template_folder", str(templates))
+    with app.app_context():
+        yield static, templates
+
+
+def test_release_is_computed_once(app, folders, monkeypatch):
+    static, _ = folders
+    monkeypatch.setitem(app.config, "DEBUG", False)
+    cache = HttpCache()
+    release = cache.release()
+
+    def walk(*args, **kwargs):
+        raise AssertionError("walked the folders again")
+
+    monkeypatch.setattr(os, "walk", walk)
+    (static / "extra.css").write_text("p {}")
+    assert cache.release() == release
+
+
+def test_release_follows_added_and_replaced_files_in_debug(app, folders, monkeypatch):
+    static, templates = folders
+    monkeypatch.setitem(app.config, "DEBUG", True)
+    walks, walk = [], os.walk
+    monkeypatch.setattr(os, "walk", lambda folder: walks.append(folder) or walk(folder))
+    cache = HttpCache()
+    release = cache.release()
+    assert cache.release() == release
+    assert len(walks) == 2
+
+    (static / "extra.css").write_text("p {}")
+    added = cache.release()
+    assert added != release
+
+    # Saved the way most editors do: written aside, then renamed over.
+    (templates / "page.html.tmp").write_text("{{ other }}")
+    os.replace(templates / "page.html.tmp", templates / "page.html")
+    assert cache.release() != added
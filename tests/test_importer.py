@@ -0,0 +1,171 @@
+"""Bulk import: validation, rejected rows and chunked transactions."""
+import csv
+import json
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+from dataset import NOW
+from importer import import_rows, read_rows
+from models import db, Artist, Show, Venue
+
+START = NOW + timedelta(days=3000)
+
+
+def _venue(name, **row):
+    return {"name": name, "city": "Austin", "state": "TX", "address": "1 Main St", "phone": "512-555-0100",
+            "genres": ["Jazz"], "facebook_link": "https://www.facebook.com/fyyur", **row}
+
+
+def _artist(name, **row):
+    return {"name": name, "city": "Austin", "state": "TX", "genres": ["Jazz", "Tango Nuevo"],
+            "facebook_link": "https://www.facebook.com/fyyur", **row}
+
+
+def _show(venue_id, artist_id, hours=0):
+    return {"venue_id": venue_id, "artist_id": artist_id,
+            "start_time": (START + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def _import(kind, rows, **kwargs):
+    rejects = []
+    totals = import_rows(kind, rows, rejects=lambda row, error: rejects.append((row, error)), **kwargs)
+    return totals, rejects
+
+
+def _count(model):
+    return db.session.scalar(select(func.count()).select_from(model))
+
+
+def test_valid_rows_are_imported_with_their_genres(counts):
+    totals, rejects = _import("artists", [_artist("Imported One"), _artist("Imported Two", phone="")])
+    assert totals == (2, 0) and rejects == []
+    artist = db.session.scalar(
+        select(Artist).where(Artist.name == "Imported One").options(selectinload(Artist.genres))
+    )
+    assert artist.phone == "" and artist.city == "Austin"
+    assert sorted(genre.type for genre in artist.genres) == ["Jazz", "Tango Nuevo"]
+
+
+@pytest.mark.parametrize("row, error", [
+    (_venue(""), "name"),
+    (_venue("No State", state="XX"), "state"),
+    (_venue("No Genres", genres=[]), "genres"),
+    (_venue("Bad Link", facebook_link="not a link"), "facebook_link"),
+    (_venue("Bad Id", id="seven"), "id"),
+    ({"_line": "{oops", "_error": "invalid JSON: oops"}, "invalid JSON"),
+])
+def test_invalid_rows_are_rejected(counts, row, error):
+    venues = _count(Venue)
+    totals, rejects = _import("venues", [row, _venue("Valid Hall")])
+    assert totals == (1, 1)
+    [(rejected, reason)] = rejects
+    assert rejected is row and reason.startswith(error)
+    assert _count(Venue) == venues + 1
+
+
+def test_shows_of_unknown_venues_and_artists_are_rejected(counts):
+    shows = _count(Show)
+    unknown = counts["venues"] + 100
+    totals, rejects = _import("shows", [
+        _show(unknown, 1), _show(1, counts["artists"] + 100, 4), _show(2, 2, 8), _show("x", 1, 12),
+    ])
+    assert totals == (1, 3)
+    assert [error for _, error in rejects] == [
+        "venue_id, artist_id: must be integers",
+        f"venue_id: no venue {unknown}",
+        f"artist_id: no artist {counts['artists'] + 100}",
+    ]
+    assert _count(Show) == shows + 1
+
+
+def test_double_bookings_are_rejected_across_chunks(counts):
+    rows = [_show(1, 1), _show(2, 2), _show(1, 3, 1), _show(3, 3, 8), _show(3, 2)]
+    totals, rejects = _import("shows", rows, chunk_size=2)
+    assert totals == (3, 2)
+    # Row 2 overlaps row 0 of the chunk before, row 4 row 1 of the first chunk.
+    assert [row for row, _ in rejects] == [rows[2], rows[4]]
+
+
+def test_a_refused_chunk_is_rolled_back_and_rejected(counts):
+    artists = _count(Artist)
+    rows = [_artist("First"), _artist("Taken Id", id=1), _artist("Second"), _artist("Third")]
+    progress = []
+    totals, rejects = _import("artists", rows, chunk_size=2, progress=lambda *totals: progress.append(totals))
+    assert totals == (2, 2)
+    assert progress == [(0, 2), (2, 2)]
+    assert [row for row, _ in rejects] == rows[:2]
+    assert all(error.startswith("database: ") for _, error in rejects)
+    names = db.session.scalars(select(Artist.name).where(Artist.id > counts["artists"])).all()
+    assert sorted(names) == ["Second", "Third"]
+    assert _count(Artist) == artists + 2
+
+
+@pytest.mark.parametrize("chunk_size, expected", [
+    (1, [(1, 0), (1, 1), (2, 1), (3, 1), (4, 1)]),
+    (2, [(1, 1), (3, 1), (4, 1)]),
+    (5, [(4, 1)]),
+    (10, [(4, 1)]),
+])
+def test_chunk_boundaries(counts, chunk_size, expected):
+    rows = [_venue("Hall 0"), _venue(""), _venue("Hall 2"), _venue("Hall 3"), _venue("Hall 4")]
+    progress = []
+    totals, _ = _import("venues", iter(rows), chunk_size=chunk_size,
+                        progress=lambda *totals: progress.append(totals))
+    assert totals == (4, 1)
+    assert progress == expected
+    names = db.session.scalars(select(Venue.name).where(Venue.id > counts["venues"]).order_by(Venue.id)).all()
+    assert names == ["Hall 0", "Hall 2", "Hall 3", "Hall 4"]
+
+
+def test_read_rows_of_csv_and_ndjson(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_text("name,genres\nOne,Jazz; Folk ;\n")
+    with open(path, newline="") as stream:
+        assert list(read_rows(stream, "csv")) == [{"name": "One", "genres": ["Jazz", "Folk"]}]
+
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"name": "One", "genres": ["Jazz"]}\n\n[1]\n{oops\n')
+    with open(path) as stream:
+        rows = list(read_rows(stream, "ndjson"))
+    assert rows[0] == {"name": "One", "genres": ["Jazz"]}
+    assert rows[1]["_line"] == "[1]" and rows[1]["_error"].startswith("invalid JSON")
+    assert rows[2]["_line"] == "{oops"
+
+
+def test_command_writes_rejects_as_csv(app, counts, tmp_path):
+    path = tmp_path / "venues.csv"
+    with open(path, "w", newline="") as stream:
+        writer = csv.DictWriter(stream, list(_venue("x")))
+        writer.writeheader()
+        writer.writerow({**_venue("CSV Hall"), "genres": "Jazz;Folk"})
+        writer.writerow({**_venue("No City", city=""), "genres": "Jazz;Folk"})
+
+    result = app.test_cli_runner().invoke(args=["import", "venues", str(path)])
+    assert result.exit_code == 0, result.output
+    assert "Rejected 1 rows" in result.output
+
+    with open(tmp_path / "venues.rejects.csv", newline="") as stream:
+        [rejected] = list(csv.DictReader(stream))
+    assert rejected["name"] == "No City" and rejected["genres"] == "Jazz;Folk"
+    assert rejected["error"].startswith("city")
+    assert db.session.scalar(select(func.count()).where(Venue.name == "CSV Hall")) == 1
+
+
+def test_command_writes_rejects_as_ndjson(app, counts, tmp_path):
+    path = tmp_path / "artists.ndjson"
+    path.write_text("\n".join([
+        json.dumps(_artist("NDJSON Band")), json.dumps(_artist("No Genres", genres=[])), "{oops",
+    ]) + "\n")
+    rejects = tmp_path / "bad.ndjson"
+
+    result = app.test_cli_runner().invoke(args=["import", "artists", str(path), "--rejects", str(rejects)])
+    assert result.exit_code == 0, result.output
+    assert "Rejected 2 rows" in result.output
+
+    first, second = [json.loads(line) for line in rejects.read_text().splitlines()]
+    assert first["name"] == "No Genres" and first["_error"].startswith("genres")
+    assert second["_line"] == "{oops" and second["_error"].startswith("invalid JSON")
+    assert db.session.scalar(select(func.count()).where(Artist.name == "NDJSON Band")) == 1
@@ -0,0 +1,204 @@
+"""The background job queue: merging, claims, retries and eager runs."""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Response
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+
+from jobs import job_queue
+from models import db, Job
+
+
+@pytest.fixture
+def handled(app, counts, monkeypatch):
+    """Calls of the ``test.echo`` handler, and failures to raise from it."""
+    calls, failures = [], []
+
+    def echo(**args):
+        calls.append(args)
+        if failures:
+            raise failures.pop(0)
+
+    monkeypatch.setitem(job_queue.handlers, "test.echo", echo)
+    return calls, failures
+
+
+def _job(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def _expire_lease(job_id):
+    db.session.execute(update(Job).where(Job.id == job_id).values(run_at=datetime.now() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def test_enqueue_merges_queued_jobs_by_key(handled):
+    first = job_queue.enqueue("test.echo", key="venue:1", n=1)
+    assert job_queue.enqueue("test.echo", key="venue:1", n=2) == first
+    other = job_queue.enqueue("test.echo", key="venue:2", n=3)
+    unkeyed = [job_queue.enqueue("test.echo", n=4) for _ in range(2)]
+    db.session.commit()
+    assert len({first, other, *unkeyed}) == 4
+    assert _job(first).args == {"n": 2}
+
+    # Once claimed, the job is no longer merged into.
+    [claimed] = job_queue.claim(1)
+    assert claimed.id == first
+    assert job_queue.enqueue("test.echo", key="venue:1", n=5) != first
+
+
+def test_enqueue_needs_a_handler(counts):
+    with pytest.raises(LookupError):
+        job_queue.enqueue("test.missing")
+
+
+def test_enqueued_jobs_are_discarded_with_their_transaction(handled):
+    job_queue.enqueue("test.echo", n=1)
+    db.session.rollback()
+    assert job_queue.claim(10) == []
+
+
+def test_claim_leases_due_jobs_oldest_first(app, handled):
+    ids = [job_queue.enqueue("test.echo", n=n) for n in range(3)]
+    later = job_queue.enqueue("test.echo", n=3)
+    db.session.execute(update(Job).where(Job.id == later).values(run_at=datetime.now() + timedelta(hours=1)))
+    db.session.commit()
+
+    jobs = job_queue.claim(2)
+    assert [job.id for job in jobs] == ids[:2]
+    assert [job.attempts for job in jobs] == [1, 1]
+    lease_end = _job(ids[0]).run_at
+    assert _job(ids[0]).state == "running"
+    assert lease_end > datetime.now() + timedelta(seconds=app.config["JOBS_LEASE"] - 5)
+
+    # Leased jobs are not claimed again, nor jobs not yet due.
+    assert [job.id for job in job_queue.claim(10)] == ids[2:]
+    assert job_queue.claim(10) == []
+
+
+def test_claim_skips_locked_jobs_on_postgresql(handled, monkeypatch):
+    job_queue.enqueue("test.echo", n=1)
+    db.session.commit()
+    statements, execute = [], db.session.execute
+
+    def record(stmt, *args, **kwargs):
+        statements.append(stmt)
+        return execute(stmt, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, "execute", record)
+    job_queue.claim(1)
+    [claim] = statements
+    assert "FOR UPDATE SKIP LOCKED" in str(claim.compile(dialect=postgresql.dialect()))
+
+
+def test_failed_job_is_retried_later_and_later(app, handled, monkeypatch):
+    calls, failures = handled
+    monkeypatch.setitem(app.config, "JOBS_MAX_ATTEMPTS", 3)
+    delay = app.config["JOBS_RETRY_DELAY"]
+    job_id = job_queue.enqueue("test.echo", n=1)
+    db.session.commit()
+
+    for attempt in (1, 2):
+        failures.append(ValueError(f"attempt {attempt}"))
+        [job] = job_queue.claim(1)
+        assert job.attempts == attempt
+        assert not job_queue.run(job)
+        stored = _job(job_id)
+        assert stored.state == "queued" and "attempt" in stored.error
+        wait = (stored.run_at - datetime.now()).total_seconds()
+        assert delay * 2 ** (attempt - 1) - 5 < wait <= delay * 2 ** (attempt - 1)
+        assert job_queue.claim(1) == []
+        _expire_lease(job_id)
+
+    failures.append(ValueError("attempt 3"))
+    [job] = job_queue.claim(1)
+    assert not job_queue.run(job)
+    stored = _job(job_id)
+    assert stored.state == "failed" and stored.attempts == 3 and "attempt 3" in stored.error
+    _expire_lease(job_id)
+    assert job_queue.claim(1) == []
+    assert len(calls) == 3
+
+
+def test_successful_job_is_deleted(handled):
+    calls, _ = handled
+    job_id = job_queue.enqueue("test.echo", n=1)
+    db.session.commit()
+    [job] = job_queue.claim(1)
+    assert job_queue.run(job)
+    assert calls == [{"n": 1}]
+    assert _job(job_id) is None
+
+
+def test_expired_lease_is_claimed_again(handled):
+    calls, _ = handled
+    job_id = job_queue.enqueue("test.echo", n=1)
+    db.session.commit()
+    [stale] = job_queue.claim(1)
+    _expire_lease(job_id)
+
+    [job] = job_queue.claim(1)
+    assert job.id == job_id and job.attempts == 2
+    # The first worker finishing late leaves the job to the second one.
+    assert job_queue.run(stale)
+    assert _job(job_id).state == "running"
+    assert job_queue.run(job)
+    assert _job(job_id) is None
+    assert len(calls) == 2
+
+
+def test_expired_lease_of_the_last_attempt_fails_the_job(app, handled, monkeypatch):
+    monkeypatch.setitem(app.config, "JOBS_MAX_ATTEMPTS", 2)
+    job_id = job_queue.enqueue("test.echo", n=1)
+    db.session.commit()
+    for _ in range(2):
+        assert job_queue.claim(1)
+        _expire_lease(job_id)
+
+    assert job_queue.claim(1) == []
+    stored = _job(job_id)
+    assert stored.state == "failed" and stored.attempts == 2 and stored.error == "lease expired"
+
+
+def test_retry_failed_requeues_the_newest_job_of_a_key(handled):
+    keyed, unkeyed, superseded, replaced = (
+        job_queue.enqueue("test.echo", key="a", n=1), job_queue.enqueue("test.echo", n=2),
+        job_queue.enqueue("test.echo", key="b", n=3), job_queue.enqueue("test.echo", key="c", n=4),
+    )
+    db.session.execute(update(Job).values(state="failed", attempts=5, error="boom"))
+    newer = job_queue.enqueue("test.echo", key="b", n=5)
+    db.session.execute(update(Job).where(Job.id == newer).values(state="failed", error="boom"))
+    queued = job_queue.enqueue("test.echo", key="c", n=6)
+    db.session.commit()
+
+    assert job_queue.retry_failed() == 3
+    jobs = {job.id: job for job in db.session.scalars(select(Job))}
+    assert set(jobs) == {keyed, unkeyed, newer, queued}
+    assert all(job.state == "queued" and job.attempts == 0 and job.error is None for job in jobs.values())
+    assert superseded not in jobs and replaced not in jobs
+
+
+def test_eager_jobs_run_after_the_response(app, handled, monkeypatch):
+    calls, _ = handled
+    monkeypatch.setitem(app.config, "JOBS_EAGER", True)
+    with app.test_request_context("/"):
+        job_id = job_queue.enqueue("test.echo", n=1)
+        other = job_queue.enqueue("test.echo", n=2)
+        db.session.commit()
+        response = app.process_response(Response("done"))
+        assert calls == []
+        response.close()
+    assert sorted(call["n"] for call in calls) == [1, 2]
+    assert _job(job_id) is None and _job(other) is None
+
+
+def test_jobs_stay_queued_without_eager_mode(app, handled):
+    calls, _ = handled
+    with app.test_request_context("/"):
+        job_id = job_queue.enqueue("test.echo", n=1)
+        db.session.commit()
+        app.process_response(Response("done")).close()
+    assert calls == []
+    assert _job(job_id).state == "queued"
@@ -0,0 +1,80 @@
+"""Keyset pagination cursors and the listings paged with them."""
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from models import db, Artist, Show, Venue
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from queries import venue_areas
+
+
+def _cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_round_trip():
+    columns = [Show.time, Show.id]
+    values = [datetime(2026, 5, 1, 20, 30), 42]
+    assert decode_cursor(encode_cursor(values), columns) == values
+    assert decode_cursor(encode_cursor(["Austin", None]), [Artist.city, Artist.state]) == ["Austin", None]
+
+
+@pytest.mark.parametrize("values", [
+    [{}, 1], ["Band", []], ["Band", "1"], ["Band", True], ["Band", 1.5], ["Band"], {"name": "Band"},
+])
+def test_values_of_the_wrong_type_are_rejected(values):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(_cursor(values), [Artist.name, Artist.id])
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", _cursor([[], 1]), _cursor(["yesterday", 1])])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, [Show.time, Show.id])
+
+
+@pytest.mark.parametrize("path", [
+    "/venues?after=W3t9LHt9XQ", "/artists?after=W3t9XQ", "/shows?after=W3t9LHt9XQ",
+    "/api/v1/artists?after=W3t9LHt9XQ", "/api/v1/shows?after=bm90IGpzb24",
+])
+def test_forged_cursors_are_bad_requests(client, counts, path):
+    assert client.get(path).status_code == 400
+
+
+def test_pages_cover_every_row_once(counts):
+    stmt = select(Artist.id, Artist.name)
+    columns = [Artist.name, Artist.id]
+    seen, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(stmt, columns, cursor, per_page=7)
+        seen += [row.id for row in rows]
+        if cursor is None:
+            break
+    expected = db.session.execute(select(Artist.id).order_by(Artist.name, Artist.id)).scalars().all()
+    assert seen == expected
+
+
+@pytest.mark.parametrize("per_page", [1, 3, 1000])
+def test_venue_areas_pages_cover_every_area_once(counts, per_page):
+    areas = db.session.execute(
+        select(Venue.state, Venue.city).group_by(Venue.state, Venue.city).order_by(Venue.state, Venue.city)
+    ).all()
+    seen, cursor = [], None
+    while True:
+        page, cursor = venue_areas(cursor, per_page)
+        assert len(page) <= per_page
+        seen += [(area["state"], area["city"]) for area in page]
+        if cursor is None:
+            break
+    assert seen == [tuple(area) for area in areas]
+
+
+def test_venue_areas_exact_last_page(counts):
+    total = db.session.scalar(select(func.count()).select_from(
+        select(Venue.state, Venue.city).group_by(Venue.state, Venue.city).subquery()
+    ))
+    page, cursor = venue_areas(None, total)
+    assert len(page) == total and cursor is None
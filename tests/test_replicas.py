@@ -0,0 +1,100 @@
+"""Routing of read-only views to a replica, with two SQLite files as stand-ins.
+
+The replica starts as a copy of the primary with venue 1 renamed, so a page
+shows which database it was read from.
+"""
+import shutil
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text, update
+
+import config
+from app import create_app
+from dataset import seed
+from models import db, Venue
+from replicas import replica_router
+from testing import count_queries
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    settings = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    settings.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{primary}",
+        DATABASE_REPLICA_URLS=[f"sqlite:///{replica}"],
+        REPLICA_LAG_CHECK_INTERVAL=0,
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+    )
+    # init_app registers the replica bind on the shared ``db``; keep it to this app.
+    monkeypatch.setattr(db, "metadatas", dict(db.metadatas))
+    app = create_app(SimpleNamespace(**settings))
+    monkeypatch.setattr(replica_router, "_lags", {})
+    with app.app_context():
+        seed(50)
+        db.session.remove()
+        db.engine.dispose()
+        shutil.copy(primary, replica)
+        with db.engines["replica_0"].begin() as conn:
+            conn.execute(update(Venue).where(Venue.id == 1).values(name="Replica Hall"))
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _venue_form(name):
+    return {
+        "name": name, "city": "Austin", "state": "TX", "address": "1 Main St", "phone": "5125550100",
+        "genres": ["Jazz"], "facebook_link": "https://www.facebook.com/fyyur",
+    }
+
+
+def test_read_only_views_read_from_the_replica(replicated):
+    client = replicated.test_client()
+    with count_queries(db.engines["replica_0"]) as replica, count_queries(db.engine) as primary:
+        response = client.get("/venues/1")
+    assert b"Replica Hall" in response.data
+    assert replica and not primary
+
+
+def test_writes_and_reads_after_them_go_to_the_primary(replicated):
+    client = replicated.test_client()
+    with count_queries(db.engines["replica_0"]) as replica:
+        response = client.post("/venues/1/edit", data=_venue_form("Renamed Hall"))
+        assert response.status_code == 302
+        # Read your writes: the replica would still show the old name.
+        page = client.get("/venues/1")
+    assert replica == []
+    assert b"Renamed Hall" in page.data
+    assert db.session.scalar(text('SELECT name FROM "Venue" WHERE id = 1')) == "Renamed Hall"
+
+    other = replicated.test_client()
+    assert b"Replica Hall" in other.get("/venues/1").data
+
+
+def test_dml_in_a_replica_request_goes_to_the_primary(replicated):
+    db.session.info["replica"] = "replica_0"
+    try:
+        assert db.session.get_bind(clause=update(Venue)) is db.engine
+        assert db.session.get_bind(clause=Venue.__table__.select()) is db.engines["replica_0"]
+    finally:
+        db.session.info.pop("replica")
+
+
+def test_dead_replica_falls_back_to_the_primary(replicated, tmp_path):
+    db.engines["replica_0"].dispose()
+    (tmp_path / "replica.db").unlink()
+    # A directory where the file was: SQLite can no longer open it.
+    (tmp_path / "replica.db").mkdir()
+
+    response = replicated.test_client().get("/venues/1")
+    assert response.status_code == 200
+    assert b"Replica Hall" not in response.data
+
+
+def test_lagging_replica_is_skipped(replicated, monkeypatch):
+    monkeypatch.setattr(replica_router, "lag_probe", lambda engine: 60.0)
+    assert b"Replica Hall" not in replicated.test_client().get("/venues/1").data
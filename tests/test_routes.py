@@ -0,0 +1,125 @@
+"""SQL statement budgets of every route, over the seeded catalogue.
+
+Relationships are ``lazy="raise"``, so a view missing a loading option
+fails outright; the budgets catch the other way of going wrong, a view
+that loads eagerly but issues more statements than it should. Responses
+are buffered inside the budget, so statements run while a body streams
+are counted too.
+"""
+import pytest
+from sqlalchemy import func, select
+
+from counters import check
+from models import db, Show, Venue
+from testing import assert_route_queries
+
+
+def _venue_form(name):
+    return {
+        "name": name, "city": "Austin", "state": "TX", "address": "1 Main St",
+        "phone": "5125550100", "genres": ["Jazz", "Blues"],
+        "facebook_link": "https://www.facebook.com/fyyur", "image_link": "", "website_link": "",
+        "seeking_description": "",
+    }
+
+
+def _artist_form(name):
+    return {
+        "name": name, "city": "Austin", "state": "TX", "phone": "5125550100", "genres": ["Jazz"],
+        "facebook_link": "https://www.facebook.com/fyyur", "image_link": "", "website_link": "",
+        "seeking_description": "",
+    }
+
+
+# (endpoint, path, budget)
+GETS = [
+    ("index", "/", 0),
+    ("venues.listing", "/venues", 1),
+    ("venues.show_venue", "/venues/1", 6),
+    ("venues.venue_shows", "/venues/1/shows/upcoming", 2),
+    ("venues.venue_shows", "/venues/1/shows/past", 2),
+    ("venues.create_venue_form", "/venues/create", 1),
+    ("venues.edit_venue", "/venues/1/edit", 3),
+    ("artists.listing", "/artists", 1),
+    ("artists.show_artist", "/artists/1", 6),
+    ("artists.artist_shows", "/artists/1/shows/upcoming", 2),
+    ("artists.artist_shows", "/artists/1/shows/past", 2),
+    ("artists.create_artist_form", "/artists/create", 1),
+    ("artists.edit_artist", "/artists/1/edit", 3),
+    ("shows.listing", "/shows", 2),
+    ("shows.listing", "/shows?from=2025-06-01&to=2025-06-30", 2),
+    ("shows.listing", "/shows?from=2025-06-01&city=Austin&genre=Jazz", 4),
+    ("shows.create_shows", "/shows/create", 0),
+    ("api.listing", "/api/v1/venues", 3),
+    ("api.listing", "/api/v1/artists", 3),
+    ("api.listing", "/api/v1/shows", 2),
+    ("api.listing", "/api/v1/shows?format=ndjson", 2),
+    ("metrics", "/metrics", 1),
+]
+
+
+@pytest.mark.parametrize("endpoint, path, budget", GETS, ids=[path for _, path, _ in GETS])
+def test_get_route(client, endpoint, path, budget):
+    response = assert_route_queries(client, path, budget, buffered=True)
+    assert response.status_code == 200
+
+
+def test_every_get_route_has_a_budget(app):
+    covered = {endpoint for endpoint, _, _ in GETS} | {"static"}
+    routes = {rule.endpoint for rule in app.url_map.iter_rules() if "GET" in rule.methods}
+    assert routes <= covered, routes - covered
+
+
+@pytest.mark.parametrize("path", ["/venues/search", "/artists/search"])
+def test_search(client, path):
+    response = assert_route_queries(client, path, 2, method="POST", data={"search_term": "hall"})
+    assert response.status_code == 200
+
+
+def test_create_venue(client):
+    response = assert_route_queries(client, "/venues/create", 3, method="POST", data=_venue_form("New Hall"))
+    assert response.status_code == 200
+    assert db.session.scalar(select(func.count()).where(Venue.name == "New Hall")) == 1
+
+
+def test_edit_venue(client):
+    response = assert_route_queries(client, "/venues/1/edit", 11, method="POST", data=_venue_form("Renamed Hall"))
+    assert response.status_code == 302
+    assert db.session.get(Venue, 1).name == "Renamed Hall"
+
+
+def test_create_artist(client):
+    response = assert_route_queries(client, "/artists/create", 3, method="POST", data=_artist_form("New Band"))
+    assert response.status_code == 200
+
+
+def test_edit_artist(client):
+    response = assert_route_queries(client, "/artists/1/edit", 8, method="POST", data=_artist_form("Renamed Band"))
+    assert response.status_code == 302
+
+
+def test_create_show_rejects_double_booking(client):
+    def book(artist_id, start_time):
+        data = {"venue_id": "3", "artist_id": str(artist_id), "start_time": start_time}
+        return assert_route_queries(client, "/shows/create", 10, method="POST", data=data)
+
+    shows = db.session.scalar(select(func.count()).select_from(Show))
+    assert book(3, "2029-01-01 20:00:00").status_code == 200
+    # Venue 3 is booked until 22:00 by the show above.
+    assert book(4, "2029-01-01 20:30:00").status_code == 200
+    assert db.session.scalar(select(func.count()).select_from(Show)) == shows + 1
+
+
+def test_delete_venue(client, counts):
+    venue_id = counts["venues"]
+    assert db.session.scalar(select(func.count()).where(Show.venue_id == venue_id))
+
+    response = assert_route_queries(client, f"/venues/{venue_id}", 15, method="DELETE")
+    assert response.status_code == 302
+    assert db.session.get(Venue, venue_id) is None
+    assert not db.session.scalar(select(func.count()).where(Show.venue_id == venue_id))
+    assert check() == []
+
+
+def test_delete_missing_venue(client):
+    assert client.delete("/venues/999999").status_code == 404
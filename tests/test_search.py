@@ -0,0 +1,23 @@
+"""In-process name index used off PostgreSQL."""
+from search import NameIndex
+
+
+def test_renames_and_removals_leave_no_stale_postings():
+    index = NameIndex([(1, "Blue Note"), (2, "The Velvet Lounge")])
+    index.add(1, "Jazz Club")
+    index.add(1, "Blue Notes")
+    index.remove(2)
+
+    fresh = NameIndex([(1, "Blue Notes")])
+    assert {gram: list(ids) for gram, ids in index.postings.items()} == {
+        gram: list(ids) for gram, ids in fresh.postings.items()
+    }
+    assert index.words == fresh.words
+    assert index.sorted_words == fresh.sorted_words
+
+
+def test_search_follows_renames():
+    index = NameIndex([(1, "Blue Note"), (2, "Blue Moon")])
+    index.add(1, "Jazz Club")
+    assert index.search("blue", 10) == [(2, "Blue Moon")]
+    assert index.search("azz", 10) == [(1, "Jazz Club")]
@@ -0,0 +1,251 @@
+"""Venue pages: the listing by area, search, detail pages and the forms."""
+import re
+from functools import partial
+
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy.orm import selectinload
+
+from asyncdb import async_db
+from cache import cached_page
+from forms import VenueForm
+from genres import genre_registry
+from httpcache import conditional_page
+from models import db, Venue, Show
+from queries import venue_areas, entity, entity_genres, show_counts, stored_show_counts, entity_shows
+from replicas import read_replica
+from search import search_names
+
+venues = Blueprint("venues", __name__, url_prefix="/venues")
+
+
+@venues.route("")
+@read_replica
+async def listing():
+    data, next_cursor = await async_db.run(
+        partial(venue_areas, request.args.get("after"), current_app.config["AREAS_PER_PAGE"])
+    )
+
+    return render_template("pages/venues.html", areas=data, next_cursor=next_cursor)
+
+
+@venues.route("/search", methods=["POST"])
+@read_replica
+async def search_venues():
+    search_term = request.form.get("search_term", "")
+    found_venues = await async_db.run(
+        partial(search_names, Venue, search_term, current_app.config["SEARCH_RESULT_LIMIT"])
+    )
+    counts = await async_db.run(
+        partial(stored_show_counts, Venue, [venue_id for venue_id, _ in found_venues])
+    )
+
+    data = []
+    for venue_id, name in found_venues:
+        data.append({
+            "id": venue_id,
+            "name": name,
+            "num_upcoming_shows": counts[venue_id]["upcoming"]
+        })
+
+    response = {
+        "count": len(data),
+        "data": data
+    }
+
+    return render_template(
+        "pages/search_venues.html",
+        results=response,
+        search_term=search_term,
+    )
+
+
+@venues.route("/<int:venue_id>")
+@read_replica
+@conditional_page(Venue)
+@cached_page(Venue)
+async def show_venue(venue_id):
+    limit = current_app.config["DETAIL_SHOWS_LIMIT"]
+    venue, genres, (upcoming_shows, upcoming_next), (past_shows, past_next), counts = await async_db.gather(
+        partial(entity, Venue, venue_id),
+        partial(entity_genres, Venue, venue_id),
+        partial(entity_shows, Show.venue_id, venue_id, True, limit=limit),
+        partial(entity_shows, Show.venue_id, venue_id, False, limit=limit),
+        partial(show_counts, Show.venue_id, [venue_id]),
+    )
+    if not venue:
+        abort(404)  # User typed url by him/herself
+    counts = counts[venue_id]
+
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talents,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": counts["past"],
+        "upcoming_shows_count": counts["upcoming"],
+        "past_shows_next": past_next and url_for(
+            "venues.venue_shows", venue_id=venue_id, when="past", after=past_next),
+        "upcoming_shows_next": upcoming_next and url_for(
+            "venues.venue_shows", venue_id=venue_id, when="upcoming", after=upcoming_next),
+    }
+
+    return render_template("pages/show_venue.html", venue=data)
+
+
+@venues.route("/<int:venue_id>/shows/<any(upcoming, past):when>")
+@read_replica
+@conditional_page(Venue)
+async def venue_shows(venue_id, when):
+    shows, next_cursor = await async_db.run(partial(
+        entity_shows, Show.venue_id, venue_id, when == "upcoming",
+        request.args.get("after"), current_app.config["DETAIL_SHOWS_LIMIT"]
+    ))
+    next_url = next_cursor and url_for("venues.venue_shows", venue_id=venue_id, when=when, after=next_cursor)
+
+    return render_template("pages/show_tiles.html", shows=shows, partner="artist", next_url=next_url)
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@venues.route("/create", methods=["GET"])
+def create_venue_form():
+    form = VenueForm()
+    return render_template("forms/new_venue.html", form=form)
+
+
+@venues.route("/create", methods=["POST"])
+def create_venue_submission():
+    form = VenueForm()
+    if not form.validate():
+        flash(form.errors)
+        return redirect(url_for("venues.create_venue_form"))
+
+    error = False
+    try:
+        new_venue = Venue(
+            name=form.name.data,
+            city=form.city.data,
+            state=form.state.data,
+            address=form.address.data,
+            phone=re.sub('\D', '', form.phone.data),
+            image_link=form.image_link.data,
+            facebook_link=form.facebook_link.data,
+            website_link=form.website_link.data,
+            seeking_talents=form.seeking_talent.data,
+            seeking_description=form.seeking_description.data,
+            genres=genre_registry.genres(form.genres.data)
+        )
+        db.session.add(new_venue)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if error:
+        flash("Error occurred while creating new venue" + request.form["name"])
+    else:
+        flash("Venue " + request.form["name"] + " was successfully listed!")
+
+    return render_template("pages/home.html")
+
+
+@venues.route("/<venue_id>", methods=["DELETE"])
+def delete_venue(venue_id):
+    venue = Venue.query.options(selectinload(Venue.shows)).filter_by(id=venue_id).one_or_none()
+    if not venue:
+        abort(404)
+
+    try:
+        db.session.delete(venue)
+        db.session.commit()
+    except:
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return redirect(url_for("index"))
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@venues.route("/<int:venue_id>/edit", methods=["GET"])
+def edit_venue(venue_id):
+    venue = Venue.query.options(selectinload(Venue.genres)).filter_by(id=venue_id).first()
+    if not venue:
+        abort(404)
+
+    form = VenueForm(obj=venue)
+    # The genres relationship holds Genre rows, the field their names.
+    form.genres.data = [genre.type for genre in venue.genres]
+    venue = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.type for genre in venue.genres],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talents,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+    }
+
+    return render_template("forms/edit_venue.html", form=form, venue=venue)
+
+
+@venues.route("/<int:venue_id>/edit", methods=["POST"])
+def edit_venue_submission(venue_id):
+    form = VenueForm()
+
+    if not form.validate():
+        flash("Error Occurred")
+        return redirect(url_for('index'))
+
+    flag = False
+    try:
+        genres = genre_registry.genres(form.genres.data)
+        venue = Venue.query.options(selectinload(Venue.genres)).filter_by(id=venue_id).one()
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.address = form.address.data
+        venue.phone = re.sub('\D', '', form.phone.data)
+        venue.genres = genres
+        venue.image_link = form.image_link.data
+        venue.facebook_link = form.facebook_link.data
+        venue.website_link = form.website_link.data
+        venue.seeking_talents = form.seeking_talent.data
+        venue.seeking_description = form.seeking_description.data
+
+        db.session.commit()
+    except:
+        db.session.rollback()
+        flag = True
+    finally:
+        db.session.close()
+
+    if flag:
+        flash("error while updating venue!")
+        return redirect(url_for("index"))
+    else:
+        flash("venue updated successfully!")
+        return redirect(url_for("venues.show_venue", venue_id=venue_id))